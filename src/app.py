@@ -3,11 +3,15 @@ import signal
 import logging
 
 from datetime import datetime
+from functools import partial
 
+import cache
 import factories
 
 from config import read_configuration, default_config_path
 from metrics import MetricsServer
+from notifications import SynchronizedNotificationManager
+from workers import WorkerPool, read_worker_count
 
 
 logging.basicConfig(format='%(asctime)s (%(name)s) %(funcName)s [%(levelname)s] %(message)s')
@@ -16,7 +20,7 @@ logging.getLogger().setLevel(logging.INFO)
 logger = logging.getLogger('app-main')
 
 
-def check(subdomain, public_ip, dns, ssl, notifications):
+def check_dns(subdomain, public_ip, dns, notifications):
     if dns.needs_update(subdomain, public_ip):
         try:
             dns_result = dns.update(subdomain, public_ip)
@@ -28,27 +32,171 @@ def check(subdomain, public_ip, dns, ssl, notifications):
 
     else:
         logger.info('No DNS update needed for %s' % subdomain)
-    
+
+
+def check_ssl(subdomain, ssl, notifications):
     if ssl.needs_update(subdomain):
         try:
             ssl_result = ssl.update(subdomain)
 
         except Exception as ex:
             ssl_result = 'Failed: %s' % ex
-            
+
         notifications.ssl_updated(subdomain, ssl_result)
 
     else:
         logger.info('No SSL update needed for %s' % subdomain)
 
 
-def check_all(discovery, dns, ssl, notifications):
+def check(subdomain, public_ip, dns, ssl, notifications):
+    check_dns(subdomain, public_ip, dns, notifications)
+    check_ssl(subdomain, ssl, notifications)
+
+
+def check_in_stages(subdomains, public_ip, dns, ssl, notifications, dns_workers, ssl_workers):
+    notifications = SynchronizedNotificationManager(notifications)
+
+    ssl_stage = WorkerPool(ssl_workers, name='ssl').start()
+    dns_stage = WorkerPool(dns_workers, name='dns').start()
+
+    def check_dns_then_queue_ssl(subdomain):
+        try:
+            check_dns(subdomain, public_ip, dns, notifications)
+
+        finally:
+            ssl_stage.submit(check_ssl, subdomain, ssl, notifications)
+
+    try:
+        for subdomain in subdomains:
+            dns_stage.submit(check_dns_then_queue_ssl, subdomain)
+
+    finally:
+        dns_stage.join()
+
+        logger.info('DNS checks finished, waiting for the SSL checks')
+
+        ssl_stage.join()
+
+
+def reconcile_dns(subdomains, public_ip, dns, notifications):
+    plan = dns.reconcile(subdomains, public_ip)
+
+    for subdomain in plan.unchanged:
+        logger.info('No DNS update needed for %s' % subdomain)
+
+    for subdomain, result in plan.results:
+        notifications.dns_updated(subdomain, result)
+
+
+def check_ssl_group(certificate, subdomains, ssl, notifications):
+    if ssl.needs_update_group(certificate, subdomains):
+        try:
+            ssl_result = ssl.update_group(certificate, subdomains)
+
+        except Exception as ex:
+            ssl_result = 'Failed: %s' % ex
+
+        notifications.certificate_updated(certificate, subdomains, ssl_result)
+
+    else:
+        logger.info('No SSL update needed for %s' % certificate)
+
+
+def check_dns_all(subdomains, public_ip, dns, notifications, workers=None):
+    run_all(
+        (partial(check_dns, subdomain, public_ip, dns) for subdomain in subdomains),
+        notifications, workers, name='dns'
+    )
+
+
+def check_ssl_all(subdomains, ssl, notifications, workers=None, groups=None):
+    if ssl.batch_updates:
+        if groups is None:
+            groups = ssl.group_subdomains(subdomains)
+
+        tasks = (partial(check_ssl_group, certificate, group, ssl) for certificate, group in groups)
+
+    else:
+        tasks = (partial(check_ssl, subdomain, ssl) for subdomain in subdomains)
+
+    run_all(tasks, notifications, workers, name='ssl')
+
+
+def run_all(tasks, notifications, workers=None, name='worker'):
+    if not workers:
+        for task in tasks:
+            task(notifications)
+
+        return
+
+    notifications = SynchronizedNotificationManager(notifications)
+
+    pool = WorkerPool(workers, name=name).start()
+
+    try:
+        for task in tasks:
+            pool.submit(task, notifications)
+
+    finally:
+        pool.join()
+
+
+def check_all(discovery, dns, ssl, notifications, subdomains=None, all_subdomains=None):
     public_ip = dns.get_current_public_ip()
 
-    logger.info('Starting checks with public IP: %s' % public_ip)
+    if subdomains is None:
+        logger.info('Starting checks with public IP: %s' % public_ip)
+
+        subdomains = discovery.iter_subdomains()
+        groups = None
+
+    else:
+        subdomains = list(subdomains)
+
+        logger.info('Starting checks for %s with public IP: %s' % (
+            ', '.join(subdomain.full for subdomain in subdomains), public_ip
+        ))
+
+        # schedulers keeping the discovered subdomains pass them in, so they are not discovered again
+        others = discovery.iter_subdomains() if all_subdomains is None else all_subdomains
+        groups = ssl.groups_including(subdomains, others) if ssl.batch_updates else None
 
-    for subdomain in discovery.iter_subdomains():
-        check(subdomain, public_ip, dns, ssl, notifications)
+    dns_workers = read_worker_count('DNS_WORKERS')
+    ssl_workers = read_worker_count('SSL_WORKERS')
+
+    if dns.supports_reconcile or ssl.batch_updates:
+        subdomains = list(subdomains)
+
+        if dns.supports_reconcile:
+            reconcile_dns(subdomains, public_ip, dns, notifications)
+
+        else:
+            check_dns_all(subdomains, public_ip, dns, notifications, workers=dns_workers)
+
+        check_ssl_all(subdomains, ssl, notifications, workers=ssl_workers, groups=groups)
+
+    elif dns_workers or ssl_workers:
+        check_in_stages(
+            subdomains, public_ip, dns, ssl, notifications,
+            dns_workers=dns_workers or 1, ssl_workers=ssl_workers or 1
+        )
+
+    else:
+        for subdomain in subdomains:
+            check(subdomain, public_ip, dns, ssl, notifications)
+
+
+def uses_async_engine():
+    return read_configuration('CHECK_ENGINE', default_config_path, 'threads').lower() == 'asyncio'
+
+
+def get_check_function():
+    if uses_async_engine():
+        from async_engine.engine import check_all as check_all_async
+
+        return check_all_async
+
+    return check_all
 
 
 def schedule(scheduler, notifications):
@@ -66,7 +214,7 @@ def schedule(scheduler, notifications):
         (app_version, app_build_time)
     )
 
-    scheduler.schedule(check_all, discovery, dns, ssl, notifications)
+    scheduler.schedule(get_check_function(), discovery, dns, ssl, notifications)
 
 
 def setup_signals(scheduler, notifications, metrics_server):
@@ -74,13 +222,22 @@ def setup_signals(scheduler, notifications, metrics_server):
         notifications.message('Application exiting')
         scheduler.cancel()
 
+        if uses_async_engine():
+            from async_engine.engine import shutdown
+
+            shutdown()
+
         if metrics_server:
             metrics_server.stop()
 
     signal.signal(signal.SIGINT, lambda *x: exit_app())
     signal.signal(signal.SIGTERM, lambda *x: exit_app())
 
-    signal.signal(signal.SIGHUP, lambda *x: scheduler.run_now())
+    def refresh_and_run():
+        cache.invalidate_all()
+        scheduler.run_now()
+
+    signal.signal(signal.SIGHUP, lambda *x: refresh_and_run())
 
 
 def setup_metrics():
@@ -0,0 +1,66 @@
+import abc
+
+
+class AsyncDNSManager(object):
+    supports_reconcile = False
+
+    @abc.abstractmethod
+    async def get_current_public_ip(self):
+        raise NotImplementedError('%s.get_current_public_ip not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    async def needs_update(self, subdomain, public_ip):
+        raise NotImplementedError('%s.needs_update not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    async def update(self, subdomain, public_ip):
+        raise NotImplementedError('%s.update not implemented' % type(self).__name__)
+
+    async def reconcile(self, subdomains, public_ip):
+        raise NotImplementedError('%s.reconcile not implemented' % type(self).__name__)
+
+
+class AsyncSSLManager(object):
+    batch_updates = False
+
+    @abc.abstractmethod
+    async def needs_update(self, subdomain):
+        raise NotImplementedError('%s.needs_update not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    async def update(self, subdomain):
+        raise NotImplementedError('%s.update not implemented' % type(self).__name__)
+
+    async def group_subdomains(self, subdomains):
+        return [(subdomain.full, [subdomain]) for subdomain in subdomains]
+
+    async def needs_update_group(self, certificate, subdomains):
+        for subdomain in subdomains:
+            if await self.needs_update(subdomain):
+                return True
+
+        return False
+
+    async def update_group(self, certificate, subdomains):
+        if len(subdomains) == 1:
+            return await self.update(subdomains[0])
+
+        raise NotImplementedError('%s.update_group not implemented' % type(self).__name__)
+
+
+class AsyncNotificationManager(object):
+    @abc.abstractmethod
+    async def dns_updated(self, subdomain, result):
+        raise NotImplementedError('%s.dns_updated not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    async def ssl_updated(self, subdomain, result):
+        raise NotImplementedError('%s.ssl_updated not implemented' % type(self).__name__)
+
+    async def certificate_updated(self, certificate, subdomains, result):
+        for subdomain in subdomains:
+            await self.ssl_updated(subdomain, result)
+
+    @abc.abstractmethod
+    async def message(self, text):
+        raise NotImplementedError('%s.message not implemented' % type(self).__name__)
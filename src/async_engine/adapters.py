@@ -0,0 +1,98 @@
+import asyncio
+import functools
+
+from async_engine import AsyncDNSManager, AsyncSSLManager, AsyncNotificationManager
+from notifications import SynchronizedNotificationManager
+
+
+# get_running_loop is only available from Python 3.7
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class ExecutorAdapter(object):
+    def __init__(self, delegate, executor=None):
+        self.delegate = delegate
+        self.executor = executor
+
+    async def _call(self, func, *args):
+        loop = _get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+
+class ExecutorDNSManager(ExecutorAdapter, AsyncDNSManager):
+    @property
+    def supports_reconcile(self):
+        return self.delegate.supports_reconcile
+
+    async def get_current_public_ip(self):
+        return await self._call(self.delegate.get_current_public_ip)
+
+    async def needs_update(self, subdomain, public_ip):
+        return await self._call(self.delegate.needs_update, subdomain, public_ip)
+
+    async def update(self, subdomain, public_ip):
+        return await self._call(self.delegate.update, subdomain, public_ip)
+
+    async def reconcile(self, subdomains, public_ip):
+        return await self._call(self.delegate.reconcile, subdomains, public_ip)
+
+
+class ExecutorSSLManager(ExecutorAdapter, AsyncSSLManager):
+    @property
+    def batch_updates(self):
+        return self.delegate.batch_updates
+
+    async def needs_update(self, subdomain):
+        return await self._call(self.delegate.needs_update, subdomain)
+
+    async def update(self, subdomain):
+        return await self._call(self.delegate.update, subdomain)
+
+    async def group_subdomains(self, subdomains):
+        return await self._call(self.delegate.group_subdomains, subdomains)
+
+    async def needs_update_group(self, certificate, subdomains):
+        return await self._call(self.delegate.needs_update_group, certificate, subdomains)
+
+    async def update_group(self, certificate, subdomains):
+        return await self._call(self.delegate.update_group, certificate, subdomains)
+
+
+class ExecutorNotificationManager(ExecutorAdapter, AsyncNotificationManager):
+    def __init__(self, delegate, executor=None):
+        super(ExecutorNotificationManager, self).__init__(
+            SynchronizedNotificationManager(delegate), executor
+        )
+
+    async def dns_updated(self, subdomain, result):
+        return await self._call(self.delegate.dns_updated, subdomain, result)
+
+    async def ssl_updated(self, subdomain, result):
+        return await self._call(self.delegate.ssl_updated, subdomain, result)
+
+    async def certificate_updated(self, certificate, subdomains, result):
+        return await self._call(self.delegate.certificate_updated, certificate, subdomains, result)
+
+    async def message(self, text):
+        return await self._call(self.delegate.message, text)
+
+
+def as_async_dns_manager(manager, executor=None):
+    if isinstance(manager, AsyncDNSManager):
+        return manager
+
+    return ExecutorDNSManager(manager, executor)
+
+
+def as_async_ssl_manager(manager, executor=None):
+    if isinstance(manager, AsyncSSLManager):
+        return manager
+
+    return ExecutorSSLManager(manager, executor)
+
+
+def as_async_notification_manager(manager, executor=None):
+    if isinstance(manager, AsyncNotificationManager):
+        return manager
+
+    return ExecutorNotificationManager(manager, executor)
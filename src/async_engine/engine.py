@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from async_engine.adapters import as_async_dns_manager, as_async_ssl_manager, as_async_notification_manager
+from config import read_configuration, default_config_path
+from workers import read_worker_count
+
+
+logger = logging.getLogger('async-engine')
+
+
+async def check_dns(subdomain, public_ip, dns, notifications):
+    if await dns.needs_update(subdomain, public_ip):
+        try:
+            dns_result = await dns.update(subdomain, public_ip)
+
+        except Exception as ex:
+            dns_result = 'Failed: %s' % ex
+
+        await notifications.dns_updated(subdomain, dns_result)
+
+    else:
+        logger.info('No DNS update needed for %s' % subdomain)
+
+
+async def check_ssl(subdomain, ssl, notifications):
+    if await ssl.needs_update(subdomain):
+        try:
+            ssl_result = await ssl.update(subdomain)
+
+        except Exception as ex:
+            ssl_result = 'Failed: %s' % ex
+
+        await notifications.ssl_updated(subdomain, ssl_result)
+
+    else:
+        logger.info('No SSL update needed for %s' % subdomain)
+
+
+async def check_ssl_group(certificate, subdomains, ssl, notifications):
+    if await ssl.needs_update_group(certificate, subdomains):
+        try:
+            ssl_result = await ssl.update_group(certificate, subdomains)
+
+        except Exception as ex:
+            ssl_result = 'Failed: %s' % ex
+
+        await notifications.certificate_updated(certificate, subdomains, ssl_result)
+
+    else:
+        logger.info('No SSL update needed for %s' % certificate)
+
+
+async def reconcile_dns(subdomains, public_ip, dns, notifications):
+    plan = await dns.reconcile(subdomains, public_ip)
+
+    for subdomain in plan.unchanged:
+        logger.info('No DNS update needed for %s' % subdomain)
+
+    for subdomain, result in plan.results:
+        await notifications.dns_updated(subdomain, result)
+
+
+async def check_all_async(subdomains, dns, ssl, notifications, dns_workers, ssl_workers, groups=None):
+    public_ip = await dns.get_current_public_ip()
+
+    logger.info('Starting checks with public IP: %s' % public_ip)
+
+    dns_slots = asyncio.Semaphore(dns_workers)
+    ssl_slots = asyncio.Semaphore(ssl_workers)
+
+    if dns.supports_reconcile:
+        await reconcile_dns(subdomains, public_ip, dns, notifications)
+
+    async def check(subdomain):
+        if not dns.supports_reconcile:
+            async with dns_slots:
+                await check_dns(subdomain, public_ip, dns, notifications)
+
+        if not ssl.batch_updates:
+            async with ssl_slots:
+                await check_ssl(subdomain, ssl, notifications)
+
+    async def check_group(certificate, group):
+        async with ssl_slots:
+            await check_ssl_group(certificate, group, ssl, notifications)
+
+    await gather_logging_errors(subdomains, (check(subdomain) for subdomain in subdomains))
+
+    if ssl.batch_updates:
+        if groups is None:
+            groups = await ssl.group_subdomains(subdomains)
+
+        await gather_logging_errors(
+            (certificate for certificate, _ in groups),
+            (check_group(certificate, group) for certificate, group in groups)
+        )
+
+
+async def gather_logging_errors(targets, checks):
+    results = await asyncio.gather(*checks, return_exceptions=True)
+
+    for target, result in zip(targets, results):
+        if isinstance(result, Exception):
+            logger.error('Failed to check %s' % target, exc_info=result)
+
+
+class EngineRunner(object):
+    def __init__(self, executor_workers):
+        self.executor_workers = executor_workers
+
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers)
+        self.loop = asyncio.new_event_loop()
+
+        self._thread = threading.Thread(target=self._run, name='async-engine')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coroutine):
+        # the checks may be started from multiple scheduler threads, they all share the same loop
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+        try:
+            return future.result()
+
+        except CancelledError:
+            logger.info('The checks were cancelled on shutdown')
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop).result()
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+        self.loop.close()
+        self.executor.shutdown(wait=True)
+
+    async def _cancel_tasks(self):
+        # all_tasks and current_task are only available on the asyncio module from Python 3.7
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+
+        tasks = [task for task in all_tasks() if task is not current_task()]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+
+    with _runner_lock:
+        if _runner is None:
+            _runner = EngineRunner(int(read_configuration(
+                'ASYNC_EXECUTOR_WORKERS', default_config_path, '10'
+            )))
+
+        return _runner
+
+
+def shutdown():
+    global _runner
+
+    with _runner_lock:
+        if _runner is not None:
+            _runner.close()
+            _runner = None
+
+
+def check_all(discovery, dns, ssl, notifications, subdomains=None, all_subdomains=None):
+    runner = get_runner()
+
+    dns_workers = read_worker_count('DNS_WORKERS') or runner.executor_workers
+    ssl_workers = read_worker_count('SSL_WORKERS') or runner.executor_workers
+
+    if subdomains is None:
+        subdomains = list(discovery.iter_subdomains())
+        groups = None
+
+    else:
+        subdomains = list(subdomains)
+        others = discovery.iter_subdomains() if all_subdomains is None else all_subdomains
+        groups = ssl.groups_including(subdomains, others) if ssl.batch_updates else None
+
+    runner.run(check_all_async(
+        subdomains,
+        as_async_dns_manager(dns, runner.executor),
+        as_async_ssl_manager(ssl, runner.executor),
+        as_async_notification_manager(notifications, runner.executor),
+        dns_workers=dns_workers, ssl_workers=ssl_workers, groups=groups
+    ))
@@ -0,0 +1,133 @@
+import json
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+
+from metrics import cache_hits, cache_misses, cache_expired, cache_evicted
+
+
+logger = logging.getLogger('cache')
+
+_caches = list()
+
+
+def invalidate_all():
+    for cache in list(_caches):
+        cache.clear()
+
+    logger.info('Invalidated %d caches' % len(_caches))
+
+
+class TTLCache(object):
+    def __init__(self, name, ttl, max_size=None, store=None):
+        self.name = name
+        self.ttl = float(ttl)
+        self.max_size = int(max_size) if max_size else None
+
+        self.store = store
+        self.namespace = 'cache:%s' % name
+
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+
+        _caches.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+
+            if item is not None:
+                expires_at, value = item
+
+                if expires_at > time.time():
+                    cache_hits.labels(self.name).inc()
+                    return value
+
+                del self._items[key]
+                self._forget(key)
+
+                cache_expired.labels(self.name).inc()
+
+            elif self._load(key):
+                cache_hits.labels(self.name).inc()
+                return self._items[key][1]
+
+            cache_misses.labels(self.name).inc()
+
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.time() + self.ttl, value)
+            self._persist(key)
+
+            while self.max_size and len(self._items) > self.max_size:
+                evicted, _ = self._items.popitem(last=False)
+                self._forget(evicted)
+
+                cache_evicted.labels(self.name).inc()
+
+    def replace(self, key, value):
+        with self._lock:
+            item = self._items.get(key)
+
+            if item is not None:
+                self._items[key] = (item[0], value)
+                self._persist(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._items.pop(key, None)
+            self._forget(key)
+
+            if item is not None:
+                return item[1]
+
+            return default
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+            if self.store is not None:
+                self.store.clear(self.namespace)
+
+    def _load(self, key):
+        if self.store is None:
+            return False
+
+        item = self.store.get(self.namespace, self._store_key(key))
+
+        if item is None:
+            return False
+
+        expires_at, value = item
+
+        if expires_at <= time.time():
+            self._forget(key)
+            return False
+
+        self._items[key] = (expires_at, value)
+        return True
+
+    def _persist(self, key):
+        if self.store is not None:
+            expires_at, value = self._items[key]
+            self.store.put(self.namespace, self._store_key(key), [expires_at, value])
+
+    def _forget(self, key):
+        if self.store is not None:
+            self.store.delete(self.namespace, self._store_key(key))
+
+    @staticmethod
+    def _store_key(key):
+        if isinstance(key, tuple):
+            key = list(key)
+
+        return json.dumps(key, sort_keys=True)
+
+    def __len__(self):
+        return len(self._items)
@@ -17,9 +17,10 @@ def read_configuration(key, path, default=None):
 
 
 class Subdomain(object):
-    def __init__(self, name, base=base_domain):
+    def __init__(self, name, base=base_domain, group=None):
         self.name = name
         self.base = base
+        self.group = group
 
     @property
     def full(self):
@@ -0,0 +1,134 @@
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+from datetime import datetime
+
+from docker.errors import NotFound
+
+from config import read_configuration
+from discovery.docker_labels import DockerLabelsDiscovery
+
+
+logger = logging.getLogger('docker-events-discovery')
+
+
+class EventDrivenDockerLabelsDiscovery(DockerLabelsDiscovery):
+    def __init__(self):
+        super(EventDrivenDockerLabelsDiscovery, self).__init__()
+
+        self.resync_interval = float(read_configuration(
+            'DOCKER_DISCOVERY_RESYNC', '/var/secrets/discovery', '3600'
+        ))
+
+        self.index = OrderedDict()
+
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._stream = None
+        self._thread = None
+        self._closed = False
+
+    def _iter_subdomains(self):
+        with self._lock:
+            if self._needs_sync():
+                self._sync()
+
+            snapshot = [subdomain for subdomains in self.index.values() for subdomain in subdomains]
+
+        for subdomain in snapshot:
+            yield subdomain
+
+    def _needs_sync(self):
+        if self._synced_at is None or self._thread is None or not self._thread.is_alive():
+            return True
+
+        return time.time() - self._synced_at > self.resync_interval
+
+    def _sync(self):
+        since = datetime.utcnow()
+
+        self.index.clear()
+
+        for key, labels in self._iter_labelled():
+            self._index(key, labels)
+
+        self._synced_at = time.time()
+
+        logger.info('Indexed %d Docker objects with domain labels' % len(self.index))
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._listen, args=(since,))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _index(self, key, labels):
+        subdomains = list(self._iter_labels(labels))
+
+        if subdomains:
+            self.index[key] = subdomains
+
+        else:
+            self.index.pop(key, None)
+
+    def _listen(self, since):
+        try:
+            self._stream = self.client.events(
+                decode=True, since=since, filters={'type': ['container', 'service']}
+            )
+
+            for event in self._stream:
+                if self._closed:
+                    break
+
+                if event:
+                    self.process_event(event)
+
+        except Exception as ex:
+            if not self._closed:
+                logger.error('Failed to process Docker events, the index will be rebuilt', exc_info=ex)
+
+        finally:
+            with self._lock:
+                self._synced_at = None
+
+    def process_event(self, event):
+        event_type, action, actor = map(event.get, ('Type', 'Action', 'Actor'))
+        object_id = (actor or dict()).get('ID')
+
+        if not object_id:
+            return
+
+        if event_type == 'container':
+            if action == 'start':
+                # container events carry the container labels as attributes
+                labels = actor.get('Attributes', dict())
+
+                with self._lock:
+                    self._index(('container', object_id), labels)
+
+            elif action in ('die', 'destroy'):
+                with self._lock:
+                    self.index.pop(('container', object_id), None)
+
+        elif event_type == 'service':
+            if action in ('create', 'update'):
+                try:
+                    labels = self.client.services.get(object_id).attrs['Spec'].get('Labels', dict())
+
+                except NotFound:
+                    labels = dict()
+
+                with self._lock:
+                    self._index(('service', object_id), labels)
+
+            elif action == 'remove':
+                with self._lock:
+                    self.index.pop(('service', object_id), None)
+
+    def close(self):
+        self._closed = True
+
+        if self._stream is not None and hasattr(self._stream, 'close'):
+            self._stream.close()
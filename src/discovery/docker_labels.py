@@ -10,34 +10,52 @@ class DockerLabelsDiscovery(Discovery):
         self.label_names = read_configuration(
             'DOCKER_DISCOVERY_LABEL', '/var/secrets/discovery', 'discovery.domain.name'
         ).split(',')
+        self.certificate_label_name = read_configuration(
+            'DOCKER_CERTIFICATE_LABEL', '/var/secrets/discovery', 'discovery.domain.certificate'
+        )
         self.default_domain = read_configuration(
             'DEFAULT_DOMAIN', default_config_path, base_domain
         )
 
     def _iter_subdomains(self):
-        if len(self.client.swarm.attrs) > 0:
-            for service in self.client.services.list():
-                labels = service.attrs['Spec'].get('Labels', dict())
+        for _, labels in self._iter_labelled():
+            for subdomain in self._iter_labels(labels):
+                yield subdomain
 
-                for subdomain in self._iter_labels(labels):
-                    yield subdomain
+    def _iter_labelled(self):
+        seen = set()
 
-        for container in self.client.containers.list():
-            for subdomain in self._iter_labels(container.labels):
-                yield subdomain
+        if len(self.client.swarm.attrs) > 0:
+            for label_name in self.label_names:
+                for service in self.client.services.list(filters={'label': label_name}):
+                    if ('service', service.id) not in seen:
+                        seen.add(('service', service.id))
+                        yield ('service', service.id), service.attrs['Spec'].get('Labels', dict())
+
+        for label_name in self.label_names:
+            # the sparse list form has the labels without inspecting each container
+            for container in self.client.containers.list(filters={'label': label_name}, sparse=True):
+                if ('container', container.id) not in seen:
+                    seen.add(('container', container.id))
+                    yield ('container', container.id), container.attrs.get('Labels') or dict()
+
+    def subdomains_from_labels(self, labels):
+        return list(self._iter_labels(labels))
 
     def _iter_labels(self, labels):
+        group = labels.get(self.certificate_label_name) or None
+
         for name, value in labels.items():
             if name in self.label_names:
                 for domain_name in value.split(','):
-                    yield self._to_subdomain(domain_name.strip())
+                    yield self._to_subdomain(domain_name.strip(), group)
 
-    def _to_subdomain(self, name):
+    def _to_subdomain(self, name, group=None):
         if name == self.default_domain:
-            return Subdomain('', self.default_domain)
+            return Subdomain('', self.default_domain, group)
 
         elif name.endswith(self.default_domain):
-            return Subdomain(name.replace('.%s' % self.default_domain, ''), self.default_domain)
+            return Subdomain(name.replace('.%s' % self.default_domain, ''), self.default_domain, group)
 
         else:
-            return Subdomain(name, self.default_domain)
+            return Subdomain(name, self.default_domain, group)
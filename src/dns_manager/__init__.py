@@ -1,7 +1,21 @@
 import abc
 
 
+class ReconciliationPlan(object):
+    def __init__(self, public_ip):
+        self.public_ip = public_ip
+        self.creates = list()
+        self.updates = list()
+        self.unchanged = list()
+        self.results = list()
+
+    def add_result(self, subdomain, result):
+        self.results.append((subdomain, result))
+
+
 class DNSManager(object):
+    supports_reconcile = False
+
     @abc.abstractmethod
     def get_current_public_ip(self):
         raise NotImplementedError('%s.get_current_public_ip not implemented' % type(self).__name__)
@@ -17,3 +31,23 @@ class DNSManager(object):
     def update(self, subdomain, public_ip):
         raise NotImplementedError('%s.update not implemented' % type(self).__name__)
 
+    def reconcile(self, subdomains, public_ip):
+        plan = ReconciliationPlan(public_ip)
+
+        for subdomain in subdomains:
+            if self.needs_update(subdomain, public_ip):
+                plan.updates.append(subdomain)
+
+            else:
+                plan.unchanged.append(subdomain)
+
+        for subdomain in plan.updates:
+            try:
+                result = self.update(subdomain, public_ip)
+
+            except Exception as ex:
+                result = 'Failed: %s' % ex
+
+            plan.add_result(subdomain, result)
+
+        return plan
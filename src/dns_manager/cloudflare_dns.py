@@ -1,10 +1,15 @@
 import logging
-import requests
 import CloudFlare
 
+from collections import OrderedDict
+
+import factories
+import http_session
+
+from cache import TTLCache
 from config import read_configuration
 from metrics import Counter
-from dns_manager import DNSManager
+from dns_manager import DNSManager, ReconciliationPlan
 
 
 logger = logging.getLogger('dns-cloudflare')
@@ -22,35 +27,121 @@ dns_records_failed = Counter(
     'Number of DNS records failed to create or update'
 )
 
+_MISSING = object()
+
 
 class CloudflareDNSManager(DNSManager):
-    def __init__(self):
-        self.cloudflare = CloudFlare.CloudFlare(
+    supports_reconcile = True
+
+    def __init__(self, cache_prefix='cloudflare'):
+        self.cloudflare = self._create_client()
+        # raw responses include the paging information for the listings
+        self.cloudflare_pages = self._create_client(raw=True)
+
+        self.public_ip_resolver = factories.get_public_ip_resolver()
+
+        self.lookup_by_name = read_configuration(
+            'CLOUDFLARE_LOOKUP_MODE', '/var/secrets/cloudflare', 'zone'
+        ).lower() == 'name'
+        self.page_size = int(read_configuration(
+            'CLOUDFLARE_PAGE_SIZE', '/var/secrets/cloudflare', '500'
+        ))
+
+        cache_ttl = read_configuration(
+            'CLOUDFLARE_CACHE_TTL', '/var/secrets/cloudflare', '600'
+        )
+        cache_size = read_configuration(
+            'CLOUDFLARE_CACHE_SIZE', '/var/secrets/cloudflare', '10000'
+        )
+
+        store = factories.get_state_store()
+
+        self._zones = TTLCache('%s_zones' % cache_prefix, cache_ttl, cache_size, store=store)
+        self._dns_records = TTLCache('%s_dns_records' % cache_prefix, cache_ttl, cache_size, store=store)
+
+        self._register_batch_endpoint()
+
+    @classmethod
+    def _create_client(cls, raw=False):
+        client = CloudFlare.CloudFlare(
             email=read_configuration('CLOUDFLARE_EMAIL', '/var/secrets/cloudflare'),
-            token=read_configuration('CLOUDFLARE_TOKEN', '/var/secrets/cloudflare')
+            token=read_configuration('CLOUDFLARE_TOKEN', '/var/secrets/cloudflare'),
+            raw=raw
         )
 
-        self._zones = dict()
-        self._dns_records = dict()
+        cls._use_shared_session(client)
 
-    def get_current_public_ip(self):
-        try:
-            response = requests.get('https://api.ipify.org')
+        return client
+
+    @staticmethod
+    def _use_shared_session(client):
+        network = getattr(getattr(client, '_base', None), 'network', None)
+
+        if network is not None and getattr(network, 'use_sessions', False):
+            network.session = http_session.borrow_session()
+
+        else:
+            logger.warning('Could not set up the shared HTTP session for the Cloudflare client')
 
-            if response.status_code // 100 == 2:
-                return response.text.strip()
+    def _register_batch_endpoint(self):
+        try:
+            if not hasattr(self.cloudflare.zones.dns_records, 'batch'):
+                self.cloudflare.add('AUTH', 'zones', 'dns_records', 'batch')
 
         except Exception as ex:
-            logger.error('Failed to find the Public IP address', exc_info=ex)
+            logger.warning('Batch DNS record changes are not available', exc_info=ex)
+
+    def get_current_public_ip(self):
+        return self.public_ip_resolver.get_public_ip()
+
+    def _iter_pages(self, endpoint, *args, **kwargs):
+        params = dict(kwargs.get('params', dict()))
+        params['per_page'] = kwargs.get('per_page', self.page_size)
+        params['page'] = 1
+
+        while True:
+            response = endpoint(*args, params=dict(params))
+
+            for item in response['result']:
+                yield item
+
+            # the API may return fewer items per page than requested, so only the paging information is reliable
+            result_info = response.get('result_info') or dict()
+            page = result_info.get('page', params['page'])
+
+            if page >= result_info.get('total_pages', 0):
+                break
+
+            params['page'] = page + 1
 
     def _get_zone(self, subdomain):
         try:
-            if not self._zones:
-                self._zones = {
-                    zone['name']: zone for zone in self.cloudflare.zones.get()
-                }
+            zone = self._zones.get(subdomain.base, _MISSING)
+
+            if zone is not _MISSING:
+                return zone
+
+            if self.lookup_by_name:
+                zone = next(self._iter_pages(
+                    self.cloudflare_pages.zones.get, params={'name': subdomain.base}, per_page=5
+                ), None)
+
+            else:
+                zone = None
 
-            return self._zones.get(subdomain.base)
+                for item in self._iter_pages(self.cloudflare_pages.zones.get, per_page=50):
+                    self._zones.put(item['name'], item)
+
+                    if item['name'] == subdomain.base:
+                        zone = item
+
+            if zone is None:
+                self._zones.put(subdomain.base, None)
+
+            elif self.lookup_by_name:
+                self._zones.put(subdomain.base, zone)
+
+            return zone
 
         except Exception as ex:
             logger.error('Failed to find the zone for %s' % subdomain.base, exc_info=ex)
@@ -62,18 +153,49 @@ class CloudflareDNSManager(DNSManager):
             if zone:
                 zone_id = zone['id']
 
-                if zone_id not in self._dns_records:
-                    self._dns_records[zone_id] = {
-                        record['name']: record
-                        for record in self.cloudflare.zones.dns_records.get(zone_id)
-                        if record['type'] == 'A'
-                    }
+                record = self._dns_records.get((zone_id, subdomain.full), _MISSING)
+
+                if record is not _MISSING:
+                    return record
+
+                if self.lookup_by_name:
+                    record = next(self._iter_dns_records(zone_id, name=subdomain.full), None)
 
-                return self._dns_records.get(zone_id, dict()).get(subdomain.full)
+                    self._dns_records.put((zone_id, subdomain.full), record)
+
+                    return record
+
+                # the marker of a listed zone means that names without a cached record do not exist
+                if self._dns_records.get(zone_id):
+                    return None
+
+                # the marker goes first, so it is evicted or expires before any of the records listed with it
+                self._dns_records.put(zone_id, True)
+
+                for record in self._iter_dns_records(zone_id):
+                    self._dns_records.put((zone_id, record['name']), record)
+
+                return self._dns_records.get((zone_id, subdomain.full))
 
         except Exception as ex:
             logger.error('Failed to find the DNS records for %s' % subdomain.base, exc_info=ex)
 
+    def _iter_dns_records(self, zone_id, **filters):
+        filters['type'] = 'A'
+
+        for record in self._iter_pages(self.cloudflare_pages.zones.dns_records.get, zone_id, params=filters):
+            if record['type'] == 'A':
+                yield record
+
+    def _cache_dns_record(self, zone_id, record):
+        self._dns_records.put((zone_id, record['name']), record)
+
+    def _invalidate_dns_record(self, zone_id, name):
+        self._dns_records.pop((zone_id, name))
+
+        if not self.lookup_by_name:
+            self._dns_records.pop(zone_id)
+
     def get_current_ip(self, subdomain):
         record = self._get_dns_record(subdomain)
 
@@ -81,18 +203,20 @@ class CloudflareDNSManager(DNSManager):
             return record.get('content')
 
     def _update_dns_record(self, subdomain, public_ip, record):
-        try:
-            self._dns_records.clear()
+        zone_id = record['zone_id']
 
+        try:
             record = self.cloudflare.zones.dns_records.put(
-                record['zone_id'], record['id'],
+                zone_id, record['id'],
                 data=dict(
                     name=subdomain.full, type='A',
                     content=public_ip, proxied=record.get('proxied', True)
                 )
             )
 
-            if record and record['content'] == public_ip and record['name'] == subdomain.full:
+            if self._is_expected_record(record, subdomain, public_ip):
+                self._cache_dns_record(zone_id, record)
+
                 dns_records_updated.inc()
 
                 return 'OK, updated [%s]' % public_ip
@@ -100,19 +224,21 @@ class CloudflareDNSManager(DNSManager):
         except Exception as ex:
             logger.error('Failed to update the DNS records for %s' % subdomain.full, exc_info=ex)
 
+        self._invalidate_dns_record(zone_id, subdomain.full)
+
         dns_records_failed.inc()
 
         return 'Failed to update'
 
     def _create_dns_record(self, subdomain, public_ip, zone):
         try:
-            self._dns_records.clear()
-
             record = self.cloudflare.zones.dns_records.post(
                 zone['id'], data=dict(name=subdomain.full, type='A', content=public_ip, proxied=True)
             )
 
-            if record and record['content'] == public_ip and record['name'] == subdomain.full:
+            if self._is_expected_record(record, subdomain, public_ip):
+                self._cache_dns_record(zone['id'], record)
+
                 dns_records_created.inc()
 
                 return 'OK, created [%s]' % public_ip
@@ -120,6 +246,8 @@ class CloudflareDNSManager(DNSManager):
         except Exception as ex:
             logger.error('Failed to create the DNS records for %s' % subdomain.full, exc_info=ex)
 
+        self._invalidate_dns_record(zone['id'], subdomain.full)
+
         dns_records_failed.inc()
 
         return 'Failed to create'
@@ -141,3 +269,136 @@ class CloudflareDNSManager(DNSManager):
                 return 'Failed to find zone'
 
             return self._create_dns_record(subdomain, public_ip, zone)
+
+    def create_txt_record(self, subdomain, name, content):
+        zone = self._get_zone(subdomain)
+
+        if not zone:
+            raise Exception('Failed to find the zone for %s' % subdomain.full)
+
+        return self.cloudflare.zones.dns_records.post(
+            zone['id'], data=dict(name=name, type='TXT', content=content, ttl=120)
+        )
+
+    def delete_txt_record(self, subdomain, record):
+        zone = self._get_zone(subdomain)
+
+        if zone:
+            self.cloudflare.zones.dns_records.delete(zone['id'], record['id'])
+
+    def reconcile(self, subdomains, public_ip):
+        if not public_ip:
+            return super(CloudflareDNSManager, self).reconcile(subdomains, public_ip)
+
+        plan = ReconciliationPlan(public_ip)
+        changes = OrderedDict()
+
+        for subdomain in subdomains:
+            zone = self._get_zone(subdomain)
+
+            if not zone:
+                plan.add_result(subdomain, 'Failed to find zone')
+                continue
+
+            record = self._get_dns_record(subdomain)
+
+            if record and record.get('content') == public_ip:
+                plan.unchanged.append(subdomain)
+                continue
+
+            zone, creates, updates = changes.setdefault(zone['id'], (zone, list(), list()))
+
+            if record:
+                plan.updates.append(subdomain)
+                updates.append((subdomain, record))
+
+            else:
+                plan.creates.append(subdomain)
+                creates.append(subdomain)
+
+        for zone, creates, updates in changes.values():
+            for subdomain, result in self._apply_changes(zone, creates, updates, public_ip):
+                plan.add_result(subdomain, result)
+
+        return plan
+
+    def _apply_changes(self, zone, creates, updates, public_ip):
+        batch = getattr(self.cloudflare.zones.dns_records, 'batch', None)
+
+        if batch is not None and len(creates) + len(updates) > 1:
+            try:
+                return self._apply_batch(batch, zone, creates, updates, public_ip)
+
+            except Exception as ex:
+                logger.warning(
+                    'Failed to apply batch DNS changes for %s, falling back to single changes' % zone.get('name'),
+                    exc_info=ex
+                )
+
+        results = list()
+
+        for subdomain in creates:
+            results.append((subdomain, self._create_dns_record(subdomain, public_ip, zone)))
+
+        for subdomain, record in updates:
+            results.append((subdomain, self._update_dns_record(subdomain, public_ip, record)))
+
+        return results
+
+    def _apply_batch(self, batch, zone, creates, updates, public_ip):
+        response = batch.post(
+            zone['id'], data=dict(
+                posts=[
+                    dict(name=subdomain.full, type='A', content=public_ip, proxied=True)
+                    for subdomain in creates
+                ],
+                puts=[
+                    dict(
+                        id=record['id'], name=subdomain.full, type='A',
+                        content=public_ip, proxied=record.get('proxied', True)
+                    )
+                    for subdomain, record in updates
+                ]
+            )
+        )
+
+        created = list(response.get('posts') or list())
+        updated = list(response.get('puts') or list())
+
+        results = list()
+
+        for index, subdomain in enumerate(creates):
+            record = created[index] if index < len(created) else None
+
+            if self._is_expected_record(record, subdomain, public_ip):
+                self._cache_dns_record(zone['id'], record)
+
+                dns_records_created.inc()
+                results.append((subdomain, 'OK, created [%s]' % public_ip))
+
+            else:
+                self._invalidate_dns_record(zone['id'], subdomain.full)
+
+                dns_records_failed.inc()
+                results.append((subdomain, 'Failed to create'))
+
+        for index, (subdomain, _) in enumerate(updates):
+            record = updated[index] if index < len(updated) else None
+
+            if self._is_expected_record(record, subdomain, public_ip):
+                self._cache_dns_record(zone['id'], record)
+
+                dns_records_updated.inc()
+                results.append((subdomain, 'OK, updated [%s]' % public_ip))
+
+            else:
+                self._invalidate_dns_record(zone['id'], subdomain.full)
+
+                dns_records_failed.inc()
+                results.append((subdomain, 'Failed to update'))
+
+        return results
+
+    @staticmethod
+    def _is_expected_record(record, subdomain, public_ip):
+        return record and record['content'] == public_ip and record['name'] == subdomain.full
@@ -2,12 +2,18 @@ from config import read_configuration, default_config_path
 from notifications import NotificationManager
 
 
+state_store_class = read_configuration(
+    'STATE_STORE_CLASS', default_config_path, 'state.memory.MemoryStateStore'
+)
 scheduler_class = read_configuration(
     'SCHEDULER_CLASS', default_config_path, 'scheduler.oneshot.OneShotScheduler'
 )
 discovery_class = read_configuration(
     'DISCOVERY_CLASS', default_config_path, 'discovery.noop.NoopDiscovery'
 )
+public_ip_resolver_class = read_configuration(
+    'PUBLIC_IP_RESOLVER_CLASS', default_config_path, 'public_ip.http_lookup.HttpPublicIPResolver'
+)
 dns_manager_class = read_configuration(
     'DNS_MANAGER_CLASS', default_config_path, 'dns_manager.noop.NoopDNSManager'
 )
@@ -47,6 +53,10 @@ def _instantiate_notification_manager():
         return _instantiate(notification_manager_class)
 
 
+def get_state_store():
+    return _state_store
+
+
 def get_scheduler():
     return _scheduler
 
@@ -55,6 +65,10 @@ def get_discovery():
     return _discovery
 
 
+def get_public_ip_resolver():
+    return _public_ip_resolver
+
+
 def get_dns_manager():
     return _dns_manager
 
@@ -67,7 +81,9 @@ def get_notification_manager():
     return _notification_manager
 
 
+_state_store = _instantiate(state_store_class)
 _notification_manager = _instantiate_notification_manager()
+_public_ip_resolver = _instantiate(public_ip_resolver_class)
 
 _scheduler, _discovery, _dns_manager, _ssl_manager = map(
     _instantiate, (
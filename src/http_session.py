@@ -0,0 +1,119 @@
+import time
+import logging
+import threading
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib3.util.retry import Retry
+except ImportError:
+    from requests.packages.urllib3.util.retry import Retry
+
+from config import read_configuration, default_config_path
+from metrics import http_requests_in_flight, http_request_duration, http_request_errors
+
+
+logger = logging.getLogger('http-session')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _parse_host_timeouts(value):
+    timeouts = dict()
+
+    for item in (value or '').split(','):
+        if '=' in item:
+            host, timeout = item.split('=', 1)
+            timeouts[host.strip()] = float(timeout)
+
+    return timeouts
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    def __init__(self, default_timeout, host_timeouts, **kwargs):
+        self.default_timeout = default_timeout
+        self.host_timeouts = host_timeouts
+
+        super(InstrumentedAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).hostname or 'unknown'
+
+        if host in self.host_timeouts:
+            kwargs['timeout'] = self.host_timeouts[host]
+
+        elif kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.default_timeout
+
+        http_requests_in_flight.labels(host).inc()
+        started = time.time()
+
+        try:
+            return super(InstrumentedAdapter, self).send(request, **kwargs)
+
+        except Exception:
+            http_request_errors.labels(host).inc()
+            raise
+
+        finally:
+            http_request_duration.labels(host).observe(time.time() - started)
+            http_requests_in_flight.labels(host).dec()
+
+
+class BorrowedSession(object):
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def close(self):
+        # clients may close their sessions when they are garbage collected, the shared one stays open
+        pass
+
+
+def create_session():
+    pool_size = int(read_configuration('HTTP_POOL_SIZE', default_config_path, '10'))
+
+    retries = Retry(
+        total=int(read_configuration('HTTP_RETRIES', default_config_path, '3')),
+        backoff_factor=float(read_configuration('HTTP_BACKOFF_SECONDS', default_config_path, '0.5')),
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False
+    )
+
+    adapter = InstrumentedAdapter(
+        default_timeout=float(read_configuration('HTTP_TIMEOUT', default_config_path, '10')),
+        host_timeouts=_parse_host_timeouts(
+            read_configuration('HTTP_HOST_TIMEOUTS', default_config_path)
+        ),
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+
+def get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+
+        return _session
+
+
+def borrow_session():
+    return BorrowedSession(get_session())
@@ -26,6 +26,36 @@ app_built_at = Gauge(
 )
 app_built_at.set(float(os.environ.get('BUILD_TIMESTAMP') or '0'))
 
+cache_hits = Counter(
+    'domain_automation_cache_hits', 'Number of cache lookups finding a valid item',
+    labelnames=('cache',)
+)
+cache_misses = Counter(
+    'domain_automation_cache_misses', 'Number of cache lookups not finding a valid item',
+    labelnames=('cache',)
+)
+cache_expired = Counter(
+    'domain_automation_cache_expired', 'Number of cache items dropped after their TTL',
+    labelnames=('cache',)
+)
+cache_evicted = Counter(
+    'domain_automation_cache_evicted', 'Number of cache items dropped to keep the size limit',
+    labelnames=('cache',)
+)
+
+http_requests_in_flight = Gauge(
+    'domain_automation_http_requests_in_flight', 'Number of pooled HTTP connections in use',
+    labelnames=('host',)
+)
+http_request_duration = Histogram(
+    'domain_automation_http_request_seconds', 'Duration of outgoing HTTP requests',
+    labelnames=('host',)
+)
+http_request_errors = Counter(
+    'domain_automation_http_request_errors', 'Number of outgoing HTTP requests failed without a response',
+    labelnames=('host',)
+)
+
 
 class _HttpServer(ThreadingMixIn, HTTPServer):
     pass
@@ -1,4 +1,5 @@
 import logging
+import threading
 
 
 logger = logging.getLogger('notifications')
@@ -32,7 +33,39 @@ class NotificationManager(object):
             with _ignore_errors():
                 delegate.ssl_updated(subdomain, result)
 
+    def certificate_updated(self, certificate, subdomains, result):
+        if not self.delegates:
+            for subdomain in subdomains:
+                with _ignore_errors():
+                    self.ssl_updated(subdomain, result)
+
+        for delegate in self.delegates:
+            with _ignore_errors():
+                delegate.certificate_updated(certificate, subdomains, result)
+
     def message(self, text):
         for delegate in self.delegates:
             with _ignore_errors():
                 delegate.message(text)
+
+
+class SynchronizedNotificationManager(NotificationManager):
+    def __init__(self, *delegates):
+        super(SynchronizedNotificationManager, self).__init__(*delegates)
+        self._lock = threading.Lock()
+
+    def dns_updated(self, subdomain, result):
+        with self._lock:
+            super(SynchronizedNotificationManager, self).dns_updated(subdomain, result)
+
+    def ssl_updated(self, subdomain, result):
+        with self._lock:
+            super(SynchronizedNotificationManager, self).ssl_updated(subdomain, result)
+
+    def certificate_updated(self, certificate, subdomains, result):
+        with self._lock:
+            super(SynchronizedNotificationManager, self).certificate_updated(certificate, subdomains, result)
+
+    def message(self, text):
+        with self._lock:
+            super(SynchronizedNotificationManager, self).message(text)
@@ -37,6 +37,12 @@ class DockerSignalNotification(NotificationManager):
         )
 
     def ssl_updated(self, subdomain, result):
+        self._signal(result)
+
+    def certificate_updated(self, certificate, subdomains, result):
+        self._signal(result)
+
+    def _signal(self, result):
         if not result or not result.startswith('OK'):
             return
 
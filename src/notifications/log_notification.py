@@ -1,6 +1,7 @@
 import logging
 
 from notifications import NotificationManager
+from ssl_manager import SSLResult
 
 
 logger = logging.getLogger('log-notification')
@@ -14,7 +15,13 @@ class LoggingNotificationManager(NotificationManager):
             logger.error('[DNS] %s : %s' % (subdomain.full, result))
 
     def ssl_updated(self, subdomain, result):
-        if 'failed' in result.lower():
+        if isinstance(result, SSLResult):
+            if result.status == SSLResult.FAILED:
+                logger.error('[SSL] %s : %s' % (subdomain.full, result.summary()))
+            else:
+                logger.info('[SSL] %s : %s' % (subdomain.full, result.summary()))
+
+        elif 'failed' in result.lower():
             logger.error('[SSL] %s : %s' % (subdomain.full, result))
         else:
             logger.info('[SSL] %s : %s' % (subdomain.full, result))
@@ -1,12 +1,12 @@
 import logging
 import threading
 
-from slack import WebClient
+import http_session
 
 from config import read_configuration
 from metrics import Counter
 from notifications import NotificationManager
-from ssl_manager import SSLManager
+from ssl_manager import SSLManager, SSLResult
 
 
 logger = logging.getLogger('slack-notification')
@@ -21,6 +21,31 @@ messages_failed = Counter(
 )
 
 
+class SlackClient(object):
+    def __init__(self, token, base_url='https://slack.com/api/'):
+        self.token = token
+        self.base_url = base_url
+
+    def api_call(self, method, **kwargs):
+        response = http_session.get_session().post(
+            self.base_url + method, json=kwargs,
+            headers={'Authorization': 'Bearer %s' % self.token}
+        )
+
+        try:
+            result = response.json()
+
+        except ValueError:
+            result = {'ok': False, 'error': response.text}
+
+        result['headers'] = response.headers
+
+        return result
+
+    def chat_postMessage(self, **kwargs):
+        return self.api_call('chat.postMessage', **kwargs)
+
+
 class SlackNotificationManager(NotificationManager):
     def __init__(self):
         super(SlackNotificationManager, self).__init__()
@@ -39,7 +64,7 @@ class SlackNotificationManager(NotificationManager):
             'SLACK_BOT_ICON', '/var/secrets/notifications'
         )
 
-        self.client = WebClient(token)
+        self.client = SlackClient(token)
 
     def send_update(self, update_type, subdomain, result):
         message = '`[%s update]` *%s* : %s' % (update_type, subdomain.full, result)
@@ -91,7 +116,11 @@ class SlackNotificationManager(NotificationManager):
         if result == SSLManager.RESULT_NOT_YET_DUE_FOR_RENEWAL:
             return
 
-        self.send_update('SSL', subdomain, result)
+        self.send_update('SSL', subdomain, _summary(result))
 
     def message(self, text):
         self.send_message(text)
+
+
+def _summary(result):
+    return result.summary() if isinstance(result, SSLResult) else result
@@ -0,0 +1,82 @@
+import abc
+import time
+import socket
+import logging
+import threading
+
+from config import read_configuration, default_config_path
+
+
+logger = logging.getLogger('public-ip')
+
+
+def is_ipv4_address(value):
+    if not value or value.count('.') != 3:
+        return False
+
+    try:
+        socket.inet_aton(value)
+        return True
+
+    except (socket.error, ValueError):
+        return False
+
+
+class StalePublicIPError(Exception):
+    pass
+
+
+class PublicIPResolver(object):
+    def __init__(self):
+        self.freshness = float(read_configuration(
+            'PUBLIC_IP_CACHE_SECONDS', default_config_path, '60'
+        ))
+        self.max_stale = float(read_configuration(
+            'PUBLIC_IP_MAX_STALE_SECONDS', default_config_path, '3600'
+        ))
+
+        import factories
+
+        self.store = factories.get_state_store()
+
+        self._last_address, self._last_resolved = self.store.get(
+            'public_ip', type(self).__name__, (None, 0)
+        )
+        self._lock = threading.Lock()
+
+    def get_public_ip(self):
+        with self._lock:
+            if self._last_address and time.time() - self._last_resolved < self.freshness:
+                return self._last_address
+
+            address = self._resolve()
+
+            if address:
+                self._last_address = address
+                self._last_resolved = time.time()
+
+                self.store.put(
+                    'public_ip', type(self).__name__, [self._last_address, self._last_resolved]
+                )
+
+            elif self._last_address:
+                age = time.time() - self._last_resolved
+
+                if age > self.max_stale:
+                    raise StalePublicIPError(
+                        'Failed to resolve the public IP address, the last known one is %d seconds old: %s' %
+                        (age, self._last_address)
+                    )
+
+                logger.warning(
+                    'Failed to resolve the public IP address, using the last known one: %s' %
+                    self._last_address
+                )
+
+                return self._last_address
+
+            return address
+
+    @abc.abstractmethod
+    def _resolve(self):
+        raise NotImplementedError('%s._resolve not implemented' % type(self).__name__)
@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+import http_session
+
+from config import read_configuration, default_config_path
+from metrics import Counter
+from public_ip import PublicIPResolver, is_ipv4_address
+
+
+logger = logging.getLogger('public-ip-http')
+
+lookups_failed = Counter(
+    'domain_automation_public_ip_http_failed',
+    'Number of failed public IP lookups',
+    labelnames=('provider',)
+)
+
+
+class HttpPublicIPResolver(PublicIPResolver):
+    def __init__(self):
+        super(HttpPublicIPResolver, self).__init__()
+
+        self.providers = list(
+            provider.strip() for provider in read_configuration(
+                'PUBLIC_IP_PROVIDERS', default_config_path, 'https://api.ipify.org'
+            ).split(',')
+            if provider.strip()
+        )
+        self.quorum = min(len(self.providers), int(read_configuration(
+            'PUBLIC_IP_QUORUM', default_config_path, '1'
+        )))
+        self.timeout = float(read_configuration(
+            'PUBLIC_IP_TIMEOUT', default_config_path, '5'
+        ))
+
+    def _resolve(self):
+        answers = Queue()
+
+        for provider in self.providers:
+            thread = threading.Thread(target=self._query, args=(provider, answers))
+            thread.setDaemon(True)
+            thread.start()
+
+        votes = dict()
+        deadline = time.time() + self.timeout
+
+        for _ in self.providers:
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                break
+
+            try:
+                address = answers.get(timeout=remaining)
+
+            except Empty:
+                break
+
+            if not address:
+                continue
+
+            votes[address] = votes.get(address, 0) + 1
+
+            if votes[address] >= self.quorum:
+                return address
+
+        logger.error(
+            'Failed to find a public IP address agreed by %d providers, answers: %s' %
+            (self.quorum, votes)
+        )
+
+    def _query(self, provider, answers):
+        address = None
+
+        try:
+            response = http_session.get_session().get(provider, timeout=self.timeout)
+
+            if response.status_code // 100 == 2:
+                address = response.text.strip()
+
+        except Exception as ex:
+            logger.warning('Failed to fetch the public IP address from %s' % provider, exc_info=ex)
+
+        if not is_ipv4_address(address):
+            lookups_failed.labels(provider).inc()
+            address = None
+
+        answers.put(address)
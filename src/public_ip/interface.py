@@ -0,0 +1,44 @@
+import socket
+import struct
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from config import read_configuration, default_config_path
+from public_ip import PublicIPResolver
+
+
+logger = logging.getLogger('public-ip-interface')
+
+SIOCGIFADDR = 0x8915
+
+
+class InterfacePublicIPResolver(PublicIPResolver):
+    def __init__(self):
+        super(InterfacePublicIPResolver, self).__init__()
+
+        self.interface = read_configuration(
+            'PUBLIC_IP_INTERFACE', default_config_path, 'eth0'
+        )
+
+    def _resolve(self):
+        if fcntl is None:
+            logger.error('Reading interface addresses is not supported on this platform')
+            return
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        try:
+            request = struct.pack('256s', self.interface[:15].encode('ascii'))
+            response = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)
+
+            return socket.inet_ntoa(response[20:24])
+
+        except (IOError, OSError) as ex:
+            logger.error('Failed to read the address of the %s interface' % self.interface, exc_info=ex)
+
+        finally:
+            sock.close()
@@ -0,0 +1,71 @@
+import shlex
+import logging
+import subprocess
+
+from config import read_configuration, default_config_path
+from public_ip import PublicIPResolver, is_ipv4_address
+
+
+logger = logging.getLogger('public-ip-local')
+
+
+def _find_address(text):
+    for item in text.split():
+        address = item.split('/')[0]
+
+        if is_ipv4_address(address):
+            return address
+
+
+class FilePublicIPResolver(PublicIPResolver):
+    def __init__(self):
+        super(FilePublicIPResolver, self).__init__()
+
+        self.path = read_configuration(
+            'PUBLIC_IP_FILE', default_config_path, '/var/run/public-ip'
+        )
+
+    def _resolve(self):
+        try:
+            with open(self.path) as source:
+                address = _find_address(source.read())
+
+            if not address:
+                logger.error('No IP address found in %s' % self.path)
+
+            return address
+
+        except (IOError, OSError) as ex:
+            logger.error('Failed to read the public IP address from %s' % self.path, exc_info=ex)
+
+
+class CommandPublicIPResolver(PublicIPResolver):
+    def __init__(self):
+        super(CommandPublicIPResolver, self).__init__()
+
+        self.command = read_configuration(
+            'PUBLIC_IP_COMMAND', default_config_path
+        )
+        self.timeout = float(read_configuration(
+            'PUBLIC_IP_TIMEOUT', default_config_path, '5'
+        ))
+
+    def _resolve(self):
+        if not self.command:
+            logger.error('The command to get the public IP address is not configured')
+            return
+
+        try:
+            output = subprocess.check_output(
+                shlex.split(self.command), timeout=self.timeout, universal_newlines=True
+            )
+
+            address = _find_address(output)
+
+            if not address:
+                logger.error('No IP address found in the output of: %s' % self.command)
+
+            return address
+
+        except Exception as ex:
+            logger.error('Failed to get the public IP address with: %s' % self.command, exc_info=ex)
@@ -0,0 +1,9 @@
+from public_ip import PublicIPResolver
+
+
+class NoopPublicIPResolver(PublicIPResolver):
+    def get_public_ip(self):
+        return None
+
+    def _resolve(self):
+        return None
@@ -0,0 +1,109 @@
+import os
+import socket
+import struct
+import logging
+
+from config import read_configuration, default_config_path
+from public_ip import PublicIPResolver
+
+
+logger = logging.getLogger('public-ip-stun')
+
+BINDING_REQUEST = 0x0001
+BINDING_RESPONSE = 0x0101
+MAGIC_COOKIE = 0x2112A442
+
+ATTR_MAPPED_ADDRESS = 0x0001
+ATTR_XOR_MAPPED_ADDRESS = 0x0020
+
+FAMILY_IPV4 = 0x01
+
+
+def _parse_address(attribute_type, value):
+    if len(value) < 8:
+        return
+
+    family, port = struct.unpack('!xBH', value[:4])
+
+    if family != FAMILY_IPV4:
+        return
+
+    address, = struct.unpack('!I', value[4:8])
+
+    if attribute_type == ATTR_XOR_MAPPED_ADDRESS:
+        address ^= MAGIC_COOKIE
+
+    return socket.inet_ntoa(struct.pack('!I', address))
+
+
+def parse_binding_response(data, transaction_id):
+    if len(data) < 20:
+        return
+
+    message_type, length, cookie = struct.unpack('!HHI', data[:8])
+
+    if message_type != BINDING_RESPONSE or cookie != MAGIC_COOKIE or data[8:20] != transaction_id:
+        return
+
+    mapped_address = None
+    position = 20
+    end = min(len(data), 20 + length)
+
+    while position + 4 <= end:
+        attribute_type, attribute_length = struct.unpack('!HH', data[position:position + 4])
+        value = data[position + 4:position + 4 + attribute_length]
+
+        if attribute_type == ATTR_XOR_MAPPED_ADDRESS:
+            return _parse_address(attribute_type, value)
+
+        elif attribute_type == ATTR_MAPPED_ADDRESS:
+            mapped_address = _parse_address(attribute_type, value)
+
+        # attributes are padded to 4 bytes
+        position += 4 + attribute_length + (-attribute_length % 4)
+
+    return mapped_address
+
+
+class StunPublicIPResolver(PublicIPResolver):
+    def __init__(self):
+        super(StunPublicIPResolver, self).__init__()
+
+        server = read_configuration(
+            'PUBLIC_IP_STUN_SERVER', default_config_path, 'stun.l.google.com:19302'
+        )
+
+        if ':' in server:
+            host, port = server.rsplit(':', 1)
+            self.server = (host, int(port))
+
+        else:
+            self.server = (server, 3478)
+
+        self.timeout = float(read_configuration(
+            'PUBLIC_IP_TIMEOUT', default_config_path, '5'
+        ))
+
+    def _resolve(self):
+        transaction_id = os.urandom(12)
+        request = struct.pack('!HHI', BINDING_REQUEST, 0, MAGIC_COOKIE) + transaction_id
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(self.timeout)
+
+        try:
+            sock.sendto(request, self.server)
+
+            while True:
+                data, _ = sock.recvfrom(2048)
+
+                address = parse_binding_response(data, transaction_id)
+
+                if address:
+                    return address
+
+        except (socket.error, socket.timeout) as ex:
+            logger.error('Failed to get the public IP address from %s:%d' % self.server, exc_info=ex)
+
+        finally:
+            sock.close()
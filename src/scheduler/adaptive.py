@@ -0,0 +1,242 @@
+import time
+import heapq
+import logging
+import threading
+
+from collections import OrderedDict
+from datetime import datetime
+
+import factories
+
+from config import read_configuration, default_config_path
+from notifications import NotificationManager
+from scheduler import Scheduler
+from ssl_manager import SSLResult
+
+
+logger = logging.getLogger('adaptive-scheduler')
+
+
+class FailureRecordingNotificationManager(NotificationManager):
+    def __init__(self, delegate, failed):
+        super(FailureRecordingNotificationManager, self).__init__(delegate)
+        self.failed = failed
+
+    def dns_updated(self, subdomain, result):
+        self._record(subdomain, result)
+        super(FailureRecordingNotificationManager, self).dns_updated(subdomain, result)
+
+    def ssl_updated(self, subdomain, result):
+        self._record(subdomain, result)
+        super(FailureRecordingNotificationManager, self).ssl_updated(subdomain, result)
+
+    def certificate_updated(self, certificate, subdomains, result):
+        for subdomain in subdomains:
+            self._record(subdomain, result)
+
+        super(FailureRecordingNotificationManager, self).certificate_updated(certificate, subdomains, result)
+
+    def _record(self, subdomain, result):
+        if getattr(result, 'status', None) == SSLResult.FAILED or str(result).startswith('Failed'):
+            self.failed.add(subdomain.full)
+
+
+class AdaptiveScheduler(Scheduler):
+    def __init__(self):
+        self.check_interval = float(read_configuration(
+            'SCHEDULER_CHECK_INTERVAL', default_config_path, '300'
+        ))
+        self.retry_delay = float(read_configuration(
+            'SCHEDULER_RETRY_DELAY', default_config_path, '60'
+        ))
+        self.max_backoff = float(read_configuration(
+            'SCHEDULER_MAX_BACKOFF', default_config_path, '3600'
+        ))
+        self.discovery_interval = float(read_configuration(
+            'SCHEDULER_DISCOVERY_INTERVAL', default_config_path, '300'
+        ))
+
+        self.job = None
+        self.cancelled = False
+
+        self.queue = list()
+        self.due = dict()
+        self.subdomains = dict()
+        self.failures = dict()
+        self.failed = set()
+        self.discovered_at = None
+
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._process)
+
+    def schedule(self, func, *args, **kwargs):
+        args = tuple(
+            FailureRecordingNotificationManager(arg, self.failed) if isinstance(arg, NotificationManager) else arg
+            for arg in args
+        )
+
+        self.job = (func, args, kwargs)
+        self._thread.start()
+
+    def run_now(self):
+        with self._condition:
+            self.discovered_at = None
+
+            for name in self.due:
+                self._set_due(name, 0)
+
+            self._condition.notify()
+
+    def cancel(self):
+        with self._condition:
+            self.cancelled = True
+            self._condition.notify()
+
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+
+    def _process(self):
+        while True:
+            with self._condition:
+                while not self.cancelled:
+                    remaining = self._next_wake_up() - time.time()
+
+                    if remaining <= 0:
+                        break
+
+                    self._condition.wait(remaining)
+
+                if self.cancelled:
+                    return
+
+                discover = self.discovered_at is None or \
+                    time.time() >= self.discovered_at + self.discovery_interval
+
+            try:
+                if discover:
+                    self._discover()
+
+                names = self._pop_due()
+
+                if names:
+                    self._check(names)
+
+            except Exception as ex:
+                logger.error('Failed to execute the scheduled checks', exc_info=ex)
+
+    def _next_wake_up(self):
+        if self.discovered_at is None:
+            return 0
+
+        next_discovery = self.discovered_at + self.discovery_interval
+
+        while self.queue and self.due.get(self.queue[0][1]) != self.queue[0][0]:
+            heapq.heappop(self.queue)
+
+        if self.queue:
+            return min(self.queue[0][0], next_discovery)
+
+        return next_discovery
+
+    def _set_due(self, name, due_at):
+        self.due[name] = due_at
+        heapq.heappush(self.queue, (due_at, name))
+
+    def _discover(self):
+        subdomains = OrderedDict(
+            (subdomain.full, subdomain) for subdomain in factories.get_discovery().iter_subdomains()
+        )
+
+        now = time.time()
+
+        with self._condition:
+            initial = self.discovered_at is None and not self.due
+
+            for name in list(self.due):
+                if name not in subdomains:
+                    del self.due[name]
+                    self.failures.pop(name, None)
+
+            new_names = [name for name in subdomains if name not in self.due]
+
+            for index, name in enumerate(new_names):
+                # spread the first checks evenly, newly discovered subdomains are checked right away
+                offset = self.check_interval * index / len(new_names) if initial else 0
+
+                self._set_due(name, now + offset)
+
+            self.subdomains = subdomains
+            self.discovered_at = now
+
+        if new_names:
+            logger.info('Scheduled checks for %d new subdomains' % len(new_names))
+
+    def _pop_due(self):
+        now = time.time()
+        names = list()
+
+        with self._condition:
+            while self.queue and self.queue[0][0] <= now:
+                due_at, name = heapq.heappop(self.queue)
+
+                if self.due.get(name) == due_at:
+                    del self.due[name]
+                    names.append(name)
+
+        return names
+
+    def _check(self, names):
+        subdomains = [self.subdomains[name] for name in names]
+        discovered = list(self.subdomains.values())
+
+        self.failed.clear()
+
+        func, args, kwargs = self.job
+
+        try:
+            func(*args, subdomains=subdomains, all_subdomains=discovered, **kwargs)
+
+        except Exception as ex:
+            logger.error('Failed to check %s' % ', '.join(names), exc_info=ex)
+
+            self.failed.update(names)
+
+        now = time.time()
+
+        with self._condition:
+            for subdomain in subdomains:
+                if subdomain.full in self.due or subdomain.full not in self.subdomains:
+                    continue
+
+                self._set_due(subdomain.full, now + self._next_delay(subdomain))
+
+    def _next_delay(self, subdomain):
+        if subdomain.full in self.failed:
+            failures = self.failures.get(subdomain.full, 0) + 1
+            self.failures[subdomain.full] = failures
+
+            delay = min(self.max_backoff, self.retry_delay * 2 ** (failures - 1))
+
+            logger.info('Retrying the checks for %s in %d seconds' % (subdomain.full, delay))
+
+            return delay
+
+        self.failures.pop(subdomain.full, None)
+
+        return min(self.check_interval, self._until_renewal(subdomain))
+
+    @staticmethod
+    def _until_renewal(subdomain):
+        ssl = factories.get_ssl_manager()
+
+        if not hasattr(ssl, 'get_certificate_expiry') or not hasattr(ssl, 'renewal_window'):
+            return float('inf')
+
+        expiry = ssl.get_certificate_expiry(subdomain)
+
+        if not expiry:
+            return float('inf')
+
+        until_renewal = (expiry - ssl.renewal_window - datetime.utcnow()).total_seconds()
+
+        return until_renewal if until_renewal > 0 else float('inf')
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+from config import read_configuration, default_config_path
+from scheduler.repeat import RepeatingScheduler
+
+
+class CronExpression(object):
+    FIELDS = (
+        ('minute', 0, 59),
+        ('hour', 0, 23),
+        ('day of month', 1, 31),
+        ('month', 1, 12),
+        ('day of week', 0, 7)
+    )
+
+    def __init__(self, expression):
+        self.expression = expression
+
+        fields = expression.split()
+
+        if len(fields) != len(self.FIELDS):
+            raise ValueError('Expected 5 fields in the cron expression: %s' % expression)
+
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(field, name, minimum, maximum)
+            for field, (name, minimum, maximum) in zip(fields, self.FIELDS)
+        )
+
+        # both 0 and 7 mean Sunday
+        if 7 in self.weekdays:
+            self.weekdays = self.weekdays | {0}
+
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def matches_day(self, moment):
+        day_matches = moment.day in self.days
+        weekday_matches = (moment.weekday() + 1) % 7 in self.weekdays
+
+        # when both are restricted, either of them matching is enough, like in cron
+        if not self.any_day and not self.any_weekday:
+            return day_matches or weekday_matches
+
+        return day_matches and weekday_matches
+
+    def next_after(self, moment):
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=5 * 366)
+
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = _first_of_next_month(moment)
+
+            elif not self.matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+
+            else:
+                return moment
+
+        raise ValueError('The cron expression never matches: %s' % self.expression)
+
+
+def _parse_field(field, name, minimum, maximum):
+    values = set()
+
+    for part in field.split(','):
+        step = 1
+
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = _parse_number(step, name)
+
+            if step < 1:
+                raise ValueError('Invalid step in the %s field: %s' % (name, field))
+
+        if part == '*':
+            start, end = minimum, maximum
+
+        elif '-' in part:
+            start, end = (_parse_number(value, name) for value in part.split('-', 1))
+
+        else:
+            start = _parse_number(part, name)
+            end = maximum if step > 1 else start
+
+        if start < minimum or end > maximum or start > end:
+            raise ValueError('Invalid range in the %s field: %s' % (name, field))
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+def _parse_number(value, name):
+    if not value.isdigit():
+        raise ValueError('Invalid value in the %s field: %s' % (name, value))
+
+    return int(value)
+
+
+def _first_of_next_month(moment):
+    if moment.month == 12:
+        return moment.replace(year=moment.year + 1, month=1, day=1, hour=0, minute=0)
+
+    return moment.replace(month=moment.month + 1, day=1, hour=0, minute=0)
+
+
+class CronScheduler(RepeatingScheduler):
+    def __init__(self):
+        super(CronScheduler, self).__init__()
+        self.expression = CronExpression(read_configuration(
+            'SCHEDULER_CRON', default_config_path, '*/5 * * * *'
+        ))
+
+    @property
+    def interval(self):
+        now = datetime.now()
+
+        # the timer may fire slightly early, this avoids running twice in the same minute
+        return (self.expression.next_after(now + timedelta(seconds=1)) - now).total_seconds()
@@ -1,4 +1,5 @@
 import abc
+import random
 import logging
 import threading
 
@@ -19,6 +20,9 @@ class RepeatingScheduler(Scheduler):
         self.immediate_start = read_configuration(
             'IMMEDIATE_START', default_config_path, 'no'
         ).lower() in ('yes', 'true', '1')
+        self.jitter = float(read_configuration(
+            'SCHEDULER_JITTER', default_config_path, '0'
+        ))
 
     def schedule(self, func, *args, **kwargs):
         self.job = (func, args, kwargs)
@@ -29,12 +33,24 @@ class RepeatingScheduler(Scheduler):
                     self._run()
 
                 else:
-                    self.timer = threading.Timer(self.interval, self._run)
+                    self.timer = threading.Timer(self._next_delay(), self._run)
                     self.timer.start()
 
     def run_now(self):
         self._run()
 
+    def run_partial(self, **kwargs):
+        with self.lock:
+            if self.cancelled or not self.job:
+                return
+
+            try:
+                func, args, job_kwargs = self.job
+                func(*args, **dict(job_kwargs, **kwargs))
+
+            except Exception as ex:
+                logger.error('Failed to execute the partial task', exc_info=ex)
+
     def _run(self):
         with self.lock:
             if self.cancelled:
@@ -55,7 +71,7 @@ class RepeatingScheduler(Scheduler):
 
         with self.lock:
             if not self.cancelled:
-                self.timer = threading.Timer(self.interval, self._run)
+                self.timer = threading.Timer(self._next_delay(), self._run)
                 self.timer.start()
 
     def cancel(self):
@@ -65,6 +81,12 @@ class RepeatingScheduler(Scheduler):
             if self.timer:
                 self.timer.cancel()
 
+    def _next_delay(self):
+        if self.jitter > 0:
+            return self.interval + random.uniform(0, self.jitter)
+
+        return self.interval
+
     @property
     @abc.abstractmethod
     def interval(self):
@@ -75,3 +97,15 @@ class FiveMinutesScheduler(RepeatingScheduler):
     @property
     def interval(self):
         return 5 * 60
+
+
+class IntervalScheduler(RepeatingScheduler):
+    def __init__(self):
+        super(IntervalScheduler, self).__init__()
+        self.seconds = float(read_configuration(
+            'SCHEDULER_INTERVAL', default_config_path, '300'
+        ))
+
+    @property
+    def interval(self):
+        return self.seconds
@@ -1,65 +1,246 @@
+import time
 import logging
 import threading
 
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime
 
 import docker
 
 import factories
 
+from config import read_configuration, default_config_path
 from scheduler.repeat import FiveMinutesScheduler
 
 
 logger = logging.getLogger('docker-scheduler')
 
 
+class DebouncedTrigger(object):
+    def __init__(self, func, debounce, max_delay):
+        self.func = func
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self.first_at = None
+        self.last_at = None
+        self.full_run = False
+        self.subdomains = OrderedDict()
+        self.cancelled = False
+
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._process)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def trigger(self, subdomains=None):
+        with self._condition:
+            now = time.time()
+
+            if self.first_at is None:
+                self.first_at = now
+
+            self.last_at = now
+
+            if subdomains is None:
+                self.full_run = True
+
+            else:
+                for subdomain in subdomains:
+                    self.subdomains.setdefault(subdomain.full, subdomain)
+
+            self._condition.notify()
+
+    def _process(self):
+        while True:
+            with self._condition:
+                while not self.cancelled:
+                    if self.first_at is None:
+                        self._condition.wait()
+                        continue
+
+                    due_at = min(self.last_at + self.debounce, self.first_at + self.max_delay)
+                    remaining = due_at - time.time()
+
+                    if remaining <= 0:
+                        break
+
+                    self._condition.wait(remaining)
+
+                if self.cancelled:
+                    return
+
+                subdomains = None if self.full_run else list(self.subdomains.values())
+
+                self.first_at = self.last_at = None
+                self.full_run = False
+                self.subdomains.clear()
+
+            try:
+                self.func(subdomains)
+
+            except Exception as ex:
+                logger.error('Failed to execute the triggered task', exc_info=ex)
+
+    def cancel(self):
+        with self._condition:
+            self.cancelled = True
+            self._condition.notify()
+
+        if self._thread.is_alive():
+            self._thread.join(timeout=10)
+
+
 class DockerAwareScheduler(FiveMinutesScheduler):
+    event_filters = {
+        'type': ['service', 'container'],
+        'event': ['create', 'update', 'start']
+    }
+
     def __init__(self):
         super(DockerAwareScheduler, self).__init__()
         self.notifications = factories.get_notification_manager()
         self.client = docker.from_env()
         self.thread = threading.Thread(target=self.listen_for_events)
+        self.trigger = DebouncedTrigger(
+            self._run_triggered,
+            debounce=float(read_configuration(
+                'DOCKER_EVENTS_DEBOUNCE', default_config_path, '5'
+            )),
+            max_delay=float(read_configuration(
+                'DOCKER_EVENTS_MAX_DELAY', default_config_path, '30'
+            ))
+        )
+        self.label_names = read_configuration(
+            'DOCKER_DISCOVERY_LABEL', '/var/secrets/discovery', 'discovery.domain.name'
+        ).split(',')
+        self.max_backoff = 60
+
+        self._stopped = threading.Event()
+        self._stream = None
 
     def schedule(self, func, *args, **kwargs):
         super(DockerAwareScheduler, self).schedule(func, *args, **kwargs)
+        self.trigger.start()
         self.thread.start()
 
     def listen_for_events(self):
         since = datetime.utcnow()
+        last_seen = 0
+        failures = 0
 
         while not self.cancelled:
-            until = datetime.utcnow() + timedelta(seconds=5)
+            try:
+                self._stream = self.client.events(decode=True, since=since, filters=self.event_filters)
 
-            self.process_events(since=since, until=until)
+                for event in self._stream:
+                    if self.cancelled:
+                        break
 
-            since = until
+                    if not event:
+                        continue
+
+                    failures = 0
+
+                    # the stream resumes from the second of the last event, skip the ones already seen
+                    if event.get('timeNano'):
+                        if event['timeNano'] <= last_seen:
+                            continue
+
+                        last_seen = event['timeNano']
+                        since = event.get('time') or since
+
+                    self.process_event(event)
+
+            except Exception as ex:
+                if self.cancelled:
+                    break
+
+                logger.warning('The Docker event stream failed: %s' % ex)
 
-    def process_events(self, since, until):
-        for event in self.client.events(decode=True, since=since, until=until):
             if self.cancelled:
                 break
 
-            if not event:
-                continue
+            failures += 1
+            delay = min(self.max_backoff, 2 ** (failures - 1))
 
-            scope, action, event_type, actor = map(
-                event.get, ('scope', 'Action', 'Type', 'Actor')
-            )
+            logger.info('Reconnecting to the Docker event stream in %d seconds' % delay)
 
-            if (scope, event_type, action) != ('swarm', 'service', 'create'):
-                continue
+            self._stopped.wait(delay)
 
-            if actor:
-                name = actor.get('Attributes', dict()).get('name', 'unknown')
+    def process_event(self, event):
+        action, event_type, actor = map(event.get, ('Action', 'Type', 'Actor'))
+        attributes = (actor or dict()).get('Attributes', dict())
+        name = attributes.get('name', 'unknown')
+
+        if event_type == 'service' and action in ('create', 'update'):
+            if action == 'create':
+                self.notifications.message('Service created: %s' % name)
 
             else:
-                name = 'unknown'
+                logger.info('Service updated: %s' % name)
+
+            labels = self._service_labels(actor.get('ID'))
+
+        elif event_type == 'container' and action == 'start':
+            if not any(label in attributes for label in self.label_names):
+                return
+
+            logger.info('Container started: %s' % name)
+
+            # container events carry the container labels as attributes
+            labels = attributes
+
+        else:
+            return
 
-            self.notifications.message('Service created: %s' % name)
+        subdomains = self._subdomains_from_labels(labels)
 
+        if subdomains is not None and not subdomains:
+            logger.info('No subdomains to check for %s' % name)
+            return
+
+        self.trigger.trigger(subdomains)
+
+    def _service_labels(self, service_id):
+        if not service_id:
+            return
+
+        try:
+            return self.client.services.get(service_id).attrs['Spec'].get('Labels', dict())
+
+        except Exception as ex:
+            logger.warning('Failed to get the labels of the service %s: %s' % (service_id, ex))
+
+    @staticmethod
+    def _subdomains_from_labels(labels):
+        discovery = factories.get_discovery()
+
+        if labels is None or not hasattr(discovery, 'subdomains_from_labels'):
+            return
+
+        return discovery.subdomains_from_labels(labels)
+
+    def _run_triggered(self, subdomains):
+        if subdomains is None:
             self._run()
 
+        else:
+            self.run_partial(subdomains=subdomains)
+
     def cancel(self):
         super(DockerAwareScheduler, self).cancel()
+        self._stopped.set()
+
+        if self._stream is not None and hasattr(self._stream, 'close'):
+            try:
+                self._stream.close()
+
+            except Exception as ex:
+                logger.debug('Failed to close the Docker event stream: %s' % ex)
+
+        self.trigger.cancel()
         self.thread.join(timeout=10)
         self.client.api.close()
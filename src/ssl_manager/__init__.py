@@ -1,9 +1,41 @@
 import abc
 
 
+class SSLResult(str):
+    NEW = 'new'
+    RENEWED = 'renewed'
+    UPDATED = 'updated'
+    NOT_DUE = 'not-due'
+    FAILED = 'failed'
+    UNKNOWN = 'unknown'
+
+    def __new__(cls, text, status=UNKNOWN, certificate=None, names=(), expiry=None, duration=None):
+        result = super(SSLResult, cls).__new__(cls, text)
+
+        result.status = status
+        result.certificate = certificate
+        result.names = tuple(names)
+        result.expiry = expiry
+        result.duration = duration
+
+        return result
+
+    @property
+    def successful(self):
+        return self.status in (self.NEW, self.RENEWED, self.UPDATED)
+
+    def summary(self):
+        if self.expiry and self.successful:
+            return '%s (expires on %s)' % (self, self.expiry.strftime('%Y-%m-%d'))
+
+        return str(self)
+
+
 class SSLManager(object):
     RESULT_NOT_YET_DUE_FOR_RENEWAL = 'Not yet due for renewal'
 
+    batch_updates = False
+
     @abc.abstractmethod
     def needs_update(self, subdomain):
         raise NotImplementedError('%s.needs_update not implemented' % type(self).__name__)
@@ -12,3 +44,24 @@ class SSLManager(object):
     def update(self, subdomain):
         raise NotImplementedError('%s.update not implemented' % type(self).__name__)
 
+    def group_subdomains(self, subdomains):
+        return [(subdomain.full, [subdomain]) for subdomain in subdomains]
+
+    def groups_including(self, subdomains, others):
+        names = set(subdomain.full for subdomain in subdomains)
+        everything = list(subdomains) + [other for other in others if other.full not in names]
+
+        # the other subdomains on the same certificates have to be requested again with them
+        return [
+            (certificate, group) for certificate, group in self.group_subdomains(everything)
+            if any(subdomain.full in names for subdomain in group)
+        ]
+
+    def needs_update_group(self, certificate, subdomains):
+        return any(self.needs_update(subdomain) for subdomain in subdomains)
+
+    def update_group(self, certificate, subdomains):
+        if len(subdomains) == 1:
+            return self.update(subdomains[0])
+
+        raise NotImplementedError('%s.update_group not implemented' % type(self).__name__)
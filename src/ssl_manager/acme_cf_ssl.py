@@ -0,0 +1,314 @@
+import os
+import time
+import logging
+import threading
+
+from datetime import datetime, timedelta
+
+import josepy
+
+from acme import challenges, client, crypto_util, errors, messages
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+import factories
+import http_session
+
+from config import Subdomain, read_configuration
+from dns_manager.cloudflare_dns import CloudflareDNSManager
+from metrics import Counter
+from ssl_manager import SSLManager, SSLResult
+from ssl_manager.certificates import CertificateReader, load_certificate
+from ssl_manager.propagation import PropagationChecker
+from state import StateMapping
+
+
+logger = logging.getLogger('ssl-acme-cloudflare')
+
+ssl_certificates_new = Counter(
+    'domain_automation_ssl_acme_cf_new',
+    'Number of new SSL certificates requested'
+)
+ssl_certificates_renewed = Counter(
+    'domain_automation_ssl_acme_cf_renewed',
+    'Number of SSL certificates renewed'
+)
+ssl_certificates_failed = Counter(
+    'domain_automation_ssl_acme_cf_failed',
+    'Number of failing SSL certificate updates'
+)
+
+
+class AcmeCloudflareSSLManager(SSLManager):
+    def __init__(self):
+        super(AcmeCloudflareSSLManager, self).__init__()
+
+        self.directory_url = read_configuration(
+            'ACME_DIRECTORY_URL', '/var/secrets/acme', 'https://acme-v02.api.letsencrypt.org/directory'
+        )
+        self.email = read_configuration(
+            'ACME_EMAIL', '/var/secrets/acme',
+            read_configuration('CLOUDFLARE_EMAIL', '/var/secrets/cloudflare')
+        )
+        self.account_key_path = read_configuration(
+            'ACME_ACCOUNT_KEY', '/var/secrets/acme', '/var/lib/domain-automation/acme/account.pem'
+        )
+        self.certificates_dir = read_configuration(
+            'ACME_CERTIFICATES_DIR', '/var/secrets/acme', '/var/lib/domain-automation/certificates'
+        )
+        self.verify_ssl = read_configuration(
+            'ACME_VERIFY_SSL', '/var/secrets/acme', 'yes'
+        ).lower() in ('yes', 'true', '1')
+        self.timeout = int(read_configuration(
+            'ACME_TIMEOUT', '/var/secrets/acme', '300'
+        ))
+        self.renewal_window = timedelta(days=float(read_configuration(
+            'ACME_RENEWAL_DAYS', '/var/secrets/acme', '30'
+        )))
+        self.dns_propagation_seconds = float(read_configuration(
+            'DNS_PROPAGATION_SECONDS', '/var/secrets/acme', '30'
+        ))
+
+        self.dns = factories.get_dns_manager()
+
+        if not isinstance(self.dns, CloudflareDNSManager):
+            # separate caches, so they do not share the persisted entries with another Cloudflare manager
+            self.dns = CloudflareDNSManager(cache_prefix='acme_cloudflare')
+        self.propagation = None
+
+        propagation_check = read_configuration(
+            'ACME_PROPAGATION_CHECK', '/var/secrets/acme', 'yes'
+        ).lower() in ('yes', 'true', '1')
+
+        if propagation_check:
+            resolver = read_configuration(
+                'ACME_PROPAGATION_RESOLVER', '/var/secrets/acme', '1.1.1.1'
+            )
+
+            if ':' in resolver:
+                host, port = resolver.rsplit(':', 1)
+                self.propagation = PropagationChecker((host, int(port)))
+
+            else:
+                self.propagation = PropagationChecker((resolver, 53))
+
+        self.last_run = StateMapping(
+            factories.get_state_store(), 'acme_last_run',
+            encode=lambda value: time.mktime(value.timetuple()) + value.microsecond / 1e6,
+            decode=datetime.fromtimestamp
+        )
+
+        self._certificates = CertificateReader()
+        self._account_key = None
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def needs_update(self, subdomain):
+        return self.needs_update_group(subdomain.full, [subdomain])
+
+    def needs_update_group(self, certificate, subdomains):
+        names = sorted(subdomain.full for subdomain in subdomains)
+        expiry, covered_names = self._certificates.read(self._certificate_path(certificate, 'cert.pem'))
+
+        if expiry and expiry - datetime.utcnow() > self.renewal_window:
+            if set(names).issubset(covered_names):
+                return False
+
+        last_run = self.last_run.get(','.join(names), datetime.fromtimestamp(0))
+        return datetime.now() - last_run > timedelta(days=0.5)
+
+    def get_certificate_expiry(self, subdomain):
+        expiry, _ = self._certificates.read(self._certificate_path(subdomain.full, 'cert.pem'))
+        return expiry
+
+    def update(self, subdomain):
+        return self.update_group(subdomain.full, [subdomain])
+
+    def update_group(self, certificate, subdomains):
+        names = sorted(subdomain.full for subdomain in subdomains)
+        started = time.time()
+
+        logger.info('Processing SSL certificates for %s ...' % ', '.join(names))
+
+        try:
+            renewal = os.path.exists(self._certificate_path(certificate, 'cert.pem'))
+
+            fullchain_pem, key_pem = self._issue(names, subdomains)
+
+            self._save(certificate, fullchain_pem, key_pem)
+
+        except Exception as ex:
+            logger.error('Failed to get a certificate for %s' % ', '.join(names), exc_info=ex)
+
+            ssl_certificates_failed.inc()
+
+            return SSLResult(
+                'Failed: %s' % ex, status=SSLResult.FAILED, certificate=certificate,
+                names=names, duration=time.time() - started
+            )
+
+        self.last_run[','.join(names)] = datetime.now()
+
+        expiry, issued_names = load_certificate(fullchain_pem.encode())
+
+        if renewal:
+            ssl_certificates_renewed.inc()
+            text, status = 'OK, renewed', SSLResult.RENEWED
+
+        else:
+            ssl_certificates_new.inc()
+            text, status = 'OK, new certificate', SSLResult.NEW
+
+        return SSLResult(
+            text, status=status, certificate=certificate, names=issued_names,
+            expiry=expiry, duration=time.time() - started
+        )
+
+    def _issue(self, names, subdomains):
+        acme_client = self._get_client()
+
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        key_pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+
+        order = acme_client.new_order(crypto_util.make_csr(key_pem, names))
+
+        owners = dict((subdomain.full, subdomain) for subdomain in subdomains)
+        pending = list()
+        records = list()
+
+        try:
+            for authorization in order.authorizations:
+                if authorization.body.status == messages.STATUS_VALID:
+                    continue
+
+                domain = authorization.body.identifier.value
+                challenge = self._find_dns_challenge(authorization)
+                response, validation = challenge.response_and_validation(self._account_key)
+
+                owner = owners.get(domain) or Subdomain('', domain)
+
+                records.append((owner, self.dns.create_txt_record(
+                    owner, challenge.validation_domain_name(domain), validation
+                )))
+                pending.append((challenge, response))
+
+            if pending:
+                self._wait_for_propagation(records)
+
+            for challenge, response in pending:
+                acme_client.answer_challenge(challenge, response)
+
+            order = acme_client.poll_and_finalize(
+                order, deadline=datetime.now() + timedelta(seconds=self.timeout)
+            )
+
+        finally:
+            for owner, record in records:
+                try:
+                    self.dns.delete_txt_record(owner, record)
+
+                except Exception as ex:
+                    logger.warning('Failed to remove the challenge record for %s' % owner, exc_info=ex)
+
+        return order.fullchain_pem, key_pem.decode()
+
+    def _wait_for_propagation(self, records):
+        if self.propagation is None:
+            time.sleep(self.dns_propagation_seconds)
+            return
+
+        started = time.time()
+
+        visible = self.propagation.wait_for(
+            [(owner.base, record['name'], record['content']) for owner, record in records],
+            self.dns_propagation_seconds
+        )
+
+        if visible:
+            logger.info('The challenge records are visible after %.1f seconds' % (time.time() - started))
+
+        else:
+            logger.warning(
+                'The challenge records are not visible on all nameservers after %d seconds, continuing anyway' %
+                self.dns_propagation_seconds
+            )
+
+    @staticmethod
+    def _find_dns_challenge(authorization):
+        for challenge in authorization.body.challenges:
+            if isinstance(challenge.chall, challenges.DNS01):
+                return challenge
+
+        raise Exception('No DNS challenge offered for %s' % authorization.body.identifier.value)
+
+    def _get_client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._account_key = josepy.JWKRSA(key=self._load_account_key())
+
+                network = client.ClientNetwork(
+                    self._account_key, verify_ssl=self.verify_ssl, user_agent='domain-automation'
+                )
+                network.session = http_session.get_session()
+
+                acme_client = client.ClientV2(
+                    client.ClientV2.get_directory(self.directory_url, network), net=network
+                )
+
+                try:
+                    acme_client.new_account(messages.NewRegistration.from_data(
+                        email=self.email, terms_of_service_agreed=True
+                    ))
+
+                except errors.ConflictError as ex:
+                    acme_client.query_registration(
+                        messages.RegistrationResource(uri=ex.location, body=messages.Registration())
+                    )
+
+                self._client = acme_client
+
+            return self._client
+
+    def _load_account_key(self):
+        if os.path.exists(self.account_key_path):
+            with open(self.account_key_path, 'rb') as key_file:
+                return serialization.load_pem_private_key(key_file.read(), None, default_backend())
+
+        logger.info('Generating a new ACME account key at %s' % self.account_key_path)
+
+        key = rsa.generate_private_key(65537, 2048, default_backend())
+
+        _write_file(self.account_key_path, key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode(), mode=0o600)
+
+        return key
+
+    def _certificate_path(self, certificate, filename):
+        return os.path.join(self.certificates_dir, certificate, filename)
+
+    def _save(self, certificate, fullchain_pem, key_pem):
+        end_marker = '-----END CERTIFICATE-----'
+        cert_pem = fullchain_pem[:fullchain_pem.index(end_marker) + len(end_marker)] + '\n'
+
+        _write_file(self._certificate_path(certificate, 'privkey.pem'), key_pem, mode=0o600)
+        _write_file(self._certificate_path(certificate, 'fullchain.pem'), fullchain_pem)
+        _write_file(self._certificate_path(certificate, 'cert.pem'), cert_pem)
+
+
+def _write_file(path, content, mode=0o644):
+    directory = os.path.dirname(path)
+
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    temporary_path = '%s.tmp' % path
+
+    with open(temporary_path, 'w') as target:
+        target.write(content)
+
+    os.chmod(temporary_path, mode)
+    os.rename(temporary_path, path)
@@ -1,12 +1,21 @@
 import os
+import time
 import logging
+import itertools
+import threading
 import subprocess
 
 from datetime import datetime, timedelta
+from collections import OrderedDict
+
+import factories
 
 from config import read_configuration
-from metrics import Counter
-from ssl_manager import SSLManager
+from metrics import Counter, Histogram
+from ssl_manager import SSLManager, SSLResult
+from ssl_manager.certbot_output import CertbotOutputParser
+from ssl_manager.certificates import CertificateReader
+from state import StateMapping
 
 
 logger = logging.getLogger('ssl-certbot-cloudflare')
@@ -27,13 +36,15 @@ ssl_certificates_unknown = Counter(
     'domain_automation_ssl_certbot_cf_unknown',
     'Number of SSL certificate updates with unknown result'
 )
+ssl_certbot_duration = Histogram(
+    'domain_automation_ssl_certbot_cf_duration_seconds',
+    'Duration of the certbot runs', ['status'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600)
+)
 
 
 class CertbotCloudflareSSLManager(SSLManager):
-    MSG_NEW_CERT = 'Obtaining a new certificate'
-    MSG_RENEW_CERT = 'Renewing an existing certificate'
-    MSG_SUCCESSFUL = 'Congratulations!'
-    MSG_NOT_YET_DUE = 'not yet due for renewal'
+    MAX_NAMES_PER_CERTIFICATE = 100
 
     def __init__(self):
         super(CertbotCloudflareSSLManager, self).__init__()
@@ -55,100 +66,294 @@ class CertbotCloudflareSSLManager(SSLManager):
             'CERTBOT_STAGING', '/var/secrets/certbot', default='no'
         ).lower() in ('yes', 'true', '1')
 
-        self.last_run = dict()
+        self.config_dir = read_configuration(
+            'CERTBOT_CONFIG_DIR', '/var/secrets/certbot', '/etc/letsencrypt'
+        )
+        self.renewal_window = timedelta(days=float(read_configuration(
+            'CERTBOT_RENEWAL_DAYS', '/var/secrets/certbot', '30'
+        )))
+
+        self.use_batches = read_configuration(
+            'CERTBOT_BATCH', '/var/secrets/certbot', default='no'
+        ).lower() in ('yes', 'true', '1')
+        self.use_wildcards = read_configuration(
+            'CERTBOT_WILDCARD', '/var/secrets/certbot', default='no'
+        ).lower() in ('yes', 'true', '1')
+        self.batch_size = min(int(read_configuration(
+            'CERTBOT_BATCH_SIZE', '/var/secrets/certbot', str(self.MAX_NAMES_PER_CERTIFICATE)
+        )), self.MAX_NAMES_PER_CERTIFICATE)
+
+        store = factories.get_state_store()
+
+        self.last_run = StateMapping(
+            store, 'certbot_last_run',
+            encode=lambda value: time.mktime(value.timetuple()) + value.microsecond / 1e6,
+            decode=datetime.fromtimestamp
+        )
+        self.last_result = StateMapping(store, 'certbot_last_result')
+        self._certificates = CertificateReader()
+        self._certificate_names = StateMapping(store, 'certbot_certificate_names')
 
     def needs_update(self, subdomain):
-        elapsed = datetime.now() - self.last_run.get(subdomain.full, datetime.fromtimestamp(0))
-        return elapsed > timedelta(days=0.5)
+        return self.needs_update_group(self._certificate_name(subdomain), [subdomain])
 
-    def update(self, subdomain):
-        try:
-            with open('.cloudflare.ini', 'w') as cloudflare_config:
-                cloudflare_config.write('dns_cloudflare_email = %s\n' % self.cf_email)
-                cloudflare_config.write('dns_cloudflare_api_key = %s\n' % self.cf_token)
-
-            os.chmod('.cloudflare.ini', 0o400)
-
-            logger.info('Processing SSL certificates for %s ...' % subdomain.full)
-
-            command = [
-                    'certbot', 'certonly', '-n', '--keep',
-                    '-d', subdomain.full,
-                    '--dns-cloudflare',
-                    '--dns-cloudflare-credentials', '.cloudflare.ini',
-                    '--dns-cloudflare-propagation-seconds', str(self.dns_propagation_seconds),
-                    '--email', self.certbot_email, '--agree-tos'
-                ]
-
-            if self.use_staging:
-                command.append('--staging')
-
-            result = self.subprocess_run(
-                command,
-                timeout=self.certbot_timeout, universal_newlines=True,
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
+    @property
+    def batch_updates(self):
+        return self.use_batches or self.use_wildcards
+
+    def needs_update_group(self, certificate, subdomains):
+        names = self._requested_names(certificate, subdomains)
+        expiry, covered_names = self._read_certificate(certificate)
+
+        if expiry and not self._is_due(expiry):
+            if set(names).issubset(covered_names):
+                return False
+
+        last_run = self.last_run.get(','.join(names), datetime.fromtimestamp(0))
+        return datetime.now() - last_run > timedelta(days=0.5)
+
+    def _is_due(self, expiry):
+        return expiry - datetime.utcnow() <= self.renewal_window
+
+    def get_certificate_expiry(self, subdomain):
+        expiry, _ = self._read_certificate(self._certificate_name(subdomain))
+        return expiry
+
+    def _certificate_name(self, subdomain):
+        if self.use_wildcards and self._is_covered_by_wildcard(subdomain):
+            return subdomain.base
+
+        return self._certificate_names.get(subdomain.full, subdomain.full)
+
+    def _read_certificate(self, certificate_name):
+        return self._certificates.read(
+            os.path.join(self.config_dir, 'live', certificate_name, 'cert.pem')
+        )
 
-            if result.returncode != 0:
-                if result.stdout:
-                    logger.info(result.stdout)
+    @staticmethod
+    def _is_covered_by_wildcard(subdomain):
+        return '.' not in subdomain.name
 
-                if result.stderr:
-                    logger.error(result.stderr)
+    def _requested_names(self, certificate, subdomains):
+        if self.use_wildcards and certificate == subdomains[0].base:
+            if all(self._is_covered_by_wildcard(subdomain) for subdomain in subdomains):
+                return [certificate, '*.%s' % certificate]
 
-                ssl_certificates_failed.inc()
+        return sorted(subdomain.full for subdomain in subdomains)
 
-                return 'Failed with exit code: %s' % result.returncode
+    def group_subdomains(self, subdomains):
+        if self.use_wildcards:
+            return self._group_by_wildcards(subdomains)
 
-            self.last_run[subdomain.full] = datetime.now()
+        if not self.use_batches:
+            return super(CertbotCloudflareSSLManager, self).group_subdomains(subdomains)
 
-            if result.stdout:
-                logger.debug(result.stdout)
+        return self._group_in_batches(subdomains)
 
-            if result.stderr:
-                logger.debug(result.stderr)
+    def _group_by_wildcards(self, subdomains):
+        groups = OrderedDict()
+        remaining = list()
 
-            if self.MSG_SUCCESSFUL in result.stdout:
-                if self.MSG_NEW_CERT in result.stdout or self.MSG_NEW_CERT in result.stderr:
-                    ssl_certificates_new.inc()
-                    return 'OK, new certificate'
+        for subdomain in subdomains:
+            if self._is_covered_by_wildcard(subdomain):
+                groups.setdefault(subdomain.base, list()).append(subdomain)
 
-                elif self.MSG_RENEW_CERT in result.stdout or self.MSG_RENEW_CERT in result.stderr:
-                    ssl_certificates_renewed.inc()
-                    return 'OK, renewed'
+            else:
+                remaining.append(subdomain)
+
+        certificates = list(groups.items())
+
+        if self.use_batches:
+            certificates.extend(self._group_in_batches(remaining, suffix='-names'))
+
+        else:
+            certificates.extend(
+                super(CertbotCloudflareSSLManager, self).group_subdomains(remaining)
+            )
+
+        return certificates
+
+    def _group_in_batches(self, subdomains, suffix=''):
+        groups = OrderedDict()
+
+        for subdomain in subdomains:
+            groups.setdefault(subdomain.group or subdomain.base + suffix, list()).append(subdomain)
+
+        certificates = list()
+
+        for key, members in groups.items():
+            certificates.extend(self._assign_batches(key, sorted(members, key=lambda item: item.full)))
 
-                else:
-                    ssl_certificates_unknown.inc()
-                    return 'OK'
+        return certificates
 
-            elif self.MSG_NOT_YET_DUE in result.stdout:
-                return self.RESULT_NOT_YET_DUE_FOR_RENEWAL
+    def _assign_batches(self, key, members):
+        chunks = dict()
+        unassigned = list()
+
+        # names stay on their certificates, so adding or removing one does not change the others
+        for subdomain in members:
+            index = self._batch_index(key, self._certificate_names.get(subdomain.full))
+
+            if index and len(chunks.setdefault(index, list())) < self.batch_size:
+                chunks[index].append(subdomain)
 
             else:
-                ssl_certificates_unknown.inc()
-                return 'Unknown'
+                unassigned.append(subdomain)
+
+        for subdomain in unassigned:
+            index = next((index for index in sorted(chunks) if len(chunks[index]) < self.batch_size), None)
+
+            if index is None:
+                index = next(index for index in itertools.count(1) if index not in chunks)
+                chunks[index] = list()
+
+            chunks[index].append(subdomain)
+
+        certificates = list()
+
+        for index in sorted(chunks):
+            certificate = key if index == 1 else '%s-%d' % (key, index)
+            chunk = sorted(chunks[index], key=lambda item: item.full)
+
+            for subdomain in chunk:
+                if self._certificate_names.get(subdomain.full) != certificate:
+                    self._certificate_names[subdomain.full] = certificate
+
+            certificates.append((certificate, chunk))
+
+        return certificates
+
+    @staticmethod
+    def _batch_index(key, certificate):
+        if certificate == key:
+            return 1
+
+        if certificate and certificate.startswith(key + '-'):
+            suffix = certificate[len(key) + 1:]
+
+            if suffix.isdigit() and int(suffix) > 1:
+                return int(suffix)
+
+    def update(self, subdomain):
+        return self._update([subdomain.full])
+
+    def update_group(self, certificate, subdomains):
+        if not self.batch_updates:
+            return super(CertbotCloudflareSSLManager, self).update_group(certificate, subdomains)
+
+        return self._update(self._requested_names(certificate, subdomains), certificate)
+
+    def _update(self, names, certificate=None):
+        result = self._run_certbot(names, certificate)
+
+        self.last_result[','.join(names)] = result
+
+        return result
+
+    def _run_certbot(self, names, certificate=None):
+        try:
+            self._write_credentials('.cloudflare.ini')
+
+            logger.info('Processing SSL certificates for %s ...' % ', '.join(names))
+
+            return self._execute(self._certbot_command(names, certificate, '.cloudflare.ini'), names, certificate)
 
         finally:
             if os.path.exists('.cloudflare.ini'):
                 os.remove('.cloudflare.ini')
 
-    def subprocess_run(self, command, **kwargs):
-        if hasattr(subprocess, 'run'):
-            return subprocess.run(command, **kwargs)
+    def _write_credentials(self, path):
+        with open(path, 'w') as cloudflare_config:
+            cloudflare_config.write('dns_cloudflare_email = %s\n' % self.cf_email)
+            cloudflare_config.write('dns_cloudflare_api_key = %s\n' % self.cf_token)
+
+        os.chmod(path, 0o400)
+
+    def _certbot_command(self, names, certificate, credentials_path):
+        expiry, covered_names = self._read_certificate(certificate or names[0])
+
+        # certbot would keep certificates outside of its own renewal window, which may differ from ours
+        if expiry and self._is_due(expiry) and set(names).issubset(covered_names):
+            command = ['certbot', 'certonly', '-n', '--force-renewal']
 
         else:
-            del kwargs['timeout']
+            command = ['certbot', 'certonly', '-n', '--keep']
+
+        if certificate:
+            command.extend(['--cert-name', certificate])
+
+        for name in names:
+            command.extend(['-d', name])
+
+        command.extend([
+            '--dns-cloudflare',
+            '--dns-cloudflare-credentials', credentials_path,
+            '--dns-cloudflare-propagation-seconds', str(self.dns_propagation_seconds),
+            '--email', self.certbot_email, '--agree-tos'
+        ])
+
+        if self.use_staging:
+            command.append('--staging')
 
-            process = subprocess.Popen(command, **kwargs)
+        return command
 
-            returncode = process.wait()
-            stdout, stderr = process.communicate()
+    def _execute(self, command, names, certificate=None):
+        parser = CertbotOutputParser(certificate or names[0], names)
 
-            class ProcessResult(object):
-                def __init__(self, returncode, stdout, stderr):
-                    self.returncode = returncode
-                    self.stdout = stdout
-                    self.stderr = stderr
+        def process_line(line):
+            logger.debug(line.rstrip())
+            parser.feed(line)
 
-            return ProcessResult(returncode, stdout, stderr)
+        started = time.time()
 
+        returncode = self.stream_process(command, self.certbot_timeout, process_line)
+
+        result = parser.result(returncode, duration=time.time() - started)
+
+        ssl_certbot_duration.labels(result.status).observe(result.duration)
+
+        if result.status == SSLResult.FAILED:
+            logger.error(
+                'certbot failed for %s, the last lines of its output:\n%s' %
+                (', '.join(names), '\n'.join(parser.lines))
+            )
+
+            ssl_certificates_failed.inc()
+
+            return result
+
+        self.last_run[','.join(names)] = datetime.now()
+
+        if result.status == SSLResult.NEW:
+            ssl_certificates_new.inc()
+
+        elif result.status == SSLResult.RENEWED:
+            ssl_certificates_renewed.inc()
+
+        elif result.status != SSLResult.NOT_DUE:
+            ssl_certificates_unknown.inc()
+
+        return result
+
+    def stream_process(self, command, timeout, process_line):
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True
+        )
+
+        def kill():
+            logger.warning('Stopping certbot after %d seconds' % timeout)
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.setDaemon(True)
+        timer.start()
+
+        try:
+            for line in iter(process.stdout.readline, ''):
+                process_line(line)
+
+            return process.wait()
+
+        finally:
+            timer.cancel()
+            process.stdout.close()
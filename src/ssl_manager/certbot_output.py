@@ -0,0 +1,92 @@
+import re
+
+from collections import deque
+from datetime import datetime
+
+from ssl_manager import SSLManager, SSLResult
+
+
+class CertbotOutputParser(object):
+    NEW_CERTIFICATE = ('Obtaining a new certificate', 'Requesting a certificate for')
+    RENEWED_CERTIFICATE = ('Renewing an existing certificate',)
+    SUCCESSFUL = ('Congratulations!', 'Successfully received certificate')
+    NOT_YET_DUE = ('not yet due for renewal',)
+
+    CERTIFICATE_PATH = re.compile(r'(/\S+/(?:fullchain|cert)\.pem)')
+    EXPIRY_DATE = re.compile(r'(?:expires|expire) on (\d{4}-\d{2}-\d{2})')
+
+    def __init__(self, certificate=None, names=(), history=50):
+        self.certificate = certificate
+        self.names = tuple(names)
+
+        self.kind = None
+        self.successful = False
+        self.not_yet_due = False
+        self.certificate_path = None
+        self.expiry = None
+
+        self.lines = deque(maxlen=history)
+
+    @property
+    def finished(self):
+        if self.not_yet_due:
+            return True
+
+        return self.successful and self.certificate_path is not None and self.expiry is not None
+
+    def feed(self, line):
+        line = line.rstrip('\r\n')
+
+        self.lines.append(line)
+
+        if self.finished:
+            return
+
+        if self.kind is None:
+            if any(marker in line for marker in self.NEW_CERTIFICATE):
+                self.kind = SSLResult.NEW
+
+            elif any(marker in line for marker in self.RENEWED_CERTIFICATE):
+                self.kind = SSLResult.RENEWED
+
+        if any(marker in line for marker in self.SUCCESSFUL):
+            self.successful = True
+
+        elif any(marker in line for marker in self.NOT_YET_DUE):
+            self.not_yet_due = True
+
+        if self.successful or self.kind:
+            path = self.CERTIFICATE_PATH.search(line)
+
+            if path and self.certificate_path is None:
+                self.certificate_path = path.group(1)
+
+            expiry = self.EXPIRY_DATE.search(line)
+
+            if expiry:
+                self.expiry = datetime.strptime(expiry.group(1), '%Y-%m-%d')
+
+    def result(self, returncode, duration=None):
+        details = dict(
+            certificate=self.certificate_path or self.certificate, names=self.names,
+            expiry=self.expiry, duration=duration
+        )
+
+        if returncode != 0:
+            return SSLResult('Failed with exit code: %s' % returncode, status=SSLResult.FAILED, **details)
+
+        if self.successful:
+            if self.kind == SSLResult.NEW:
+                return SSLResult('OK, new certificate', status=SSLResult.NEW, **details)
+
+            elif self.kind == SSLResult.RENEWED:
+                return SSLResult('OK, renewed', status=SSLResult.RENEWED, **details)
+
+            else:
+                return SSLResult('OK', status=SSLResult.UPDATED, **details)
+
+        elif self.not_yet_due:
+            return SSLResult(SSLManager.RESULT_NOT_YET_DUE_FOR_RENEWAL, status=SSLResult.NOT_DUE, **details)
+
+        else:
+            return SSLResult('Unknown', status=SSLResult.UNKNOWN, **details)
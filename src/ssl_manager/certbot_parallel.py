@@ -0,0 +1,152 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+from config import read_configuration
+from ssl_manager import SSLResult
+from ssl_manager.certbot_cf_ssl import CertbotCloudflareSSLManager
+
+
+logger = logging.getLogger('ssl-certbot-parallel')
+
+
+class ParallelCertbotCloudflareSSLManager(CertbotCloudflareSSLManager):
+    def __init__(self):
+        super(ParallelCertbotCloudflareSSLManager, self).__init__()
+
+        self.parallel_runs = max(1, int(read_configuration(
+            'CERTBOT_PARALLEL_RUNS', '/var/secrets/certbot', '4'
+        )))
+
+        self._slots = threading.BoundedSemaphore(self.parallel_runs)
+        self._config_lock = threading.Lock()
+        self._account_lock = threading.Lock()
+
+    def _run_certbot(self, names, certificate=None):
+        with self._slots:
+            if not self._has_account():
+                # the first run registers the ACME account, the others wait for it to avoid registering their own
+                with self._account_lock:
+                    if not self._has_account():
+                        return self._run_isolated(names, certificate or names[0])
+
+            return self._run_isolated(names, certificate or names[0])
+
+    def _has_account(self):
+        with self._config_lock:
+            return bool(_list_accounts(self.config_dir))
+
+    def _run_isolated(self, names, lineage):
+        run_dir = tempfile.mkdtemp(prefix='certbot-')
+
+        try:
+            credentials_path = os.path.join(run_dir, 'cloudflare.ini')
+            config_dir = os.path.join(run_dir, 'config')
+
+            self._write_credentials(credentials_path)
+
+            with self._config_lock:
+                self._copy_lineage(self.config_dir, config_dir, lineage)
+
+            logger.info('Processing SSL certificates for %s ...' % ', '.join(names))
+
+            command = self._certbot_command(names, lineage, credentials_path)
+            command.extend([
+                '--config-dir', config_dir,
+                '--work-dir', os.path.join(run_dir, 'work'),
+                '--logs-dir', os.path.join(run_dir, 'logs')
+            ])
+
+            result = self._execute(command, names, lineage)
+
+            if result.status != SSLResult.FAILED:
+                with self._config_lock:
+                    self._merge_lineage(config_dir, self.config_dir, lineage)
+
+            return result
+
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    @staticmethod
+    def _copy_lineage(source, target, lineage):
+        os.makedirs(os.path.join(target, 'renewal'))
+
+        for folder in ('accounts', os.path.join('live', lineage), os.path.join('archive', lineage)):
+            if os.path.isdir(os.path.join(source, folder)):
+                shutil.copytree(os.path.join(source, folder), os.path.join(target, folder), symlinks=True)
+
+        renewal = os.path.join('renewal', '%s.conf' % lineage)
+
+        if os.path.isfile(os.path.join(source, renewal)):
+            _copy_renewal_config(os.path.join(source, renewal), os.path.join(target, renewal), source, target)
+
+    @staticmethod
+    def _merge_lineage(source, target, lineage):
+        for folder in ('live', 'archive'):
+            if os.path.isdir(os.path.join(source, folder, lineage)):
+                _replace_tree(os.path.join(source, folder, lineage), os.path.join(target, folder, lineage))
+
+        renewal = os.path.join('renewal', '%s.conf' % lineage)
+
+        if os.path.isfile(os.path.join(source, renewal)):
+            if not os.path.isdir(os.path.join(target, 'renewal')):
+                os.makedirs(os.path.join(target, 'renewal'))
+
+            _copy_renewal_config(os.path.join(source, renewal), os.path.join(target, renewal), source, target)
+
+        existing = _list_accounts(target)
+
+        for server, accounts in _list_accounts(source).items():
+            # keep a single account per server, certbot would ask to choose between multiple ones
+            if server not in existing:
+                account = os.path.join('accounts', server, accounts[0])
+                shutil.copytree(os.path.join(source, account), os.path.join(target, account), symlinks=True)
+
+
+def _list_accounts(config_dir):
+    accounts = dict()
+    accounts_dir = os.path.join(config_dir, 'accounts')
+
+    for root, folders, files in os.walk(accounts_dir):
+        if 'regr.json' in files:
+            server = os.path.relpath(os.path.dirname(root), accounts_dir)
+            accounts.setdefault(server, list()).append(os.path.basename(root))
+
+    return accounts
+
+
+def _copy_renewal_config(source_path, target_path, source_dir, target_dir):
+    with open(source_path) as source_file:
+        content = source_file.read()
+
+    temporary_path = '%s.tmp' % target_path
+
+    with open(temporary_path, 'w') as target_file:
+        target_file.write(content.replace(
+            os.path.join(os.path.abspath(source_dir), ''), os.path.join(os.path.abspath(target_dir), '')
+        ))
+
+    os.rename(temporary_path, target_path)
+
+
+def _replace_tree(source, target):
+    parent = os.path.dirname(target)
+
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+
+    incoming = '%s.incoming' % target
+    outgoing = '%s.outgoing' % target
+
+    shutil.copytree(source, incoming, symlinks=True)
+
+    if os.path.isdir(target):
+        os.rename(target, outgoing)
+
+    os.rename(incoming, target)
+
+    shutil.rmtree(outgoing, ignore_errors=True)
+
@@ -0,0 +1,67 @@
+import os
+import logging
+import threading
+
+from cryptography import x509
+from cryptography.x509.oid import ExtensionOID, NameOID
+from cryptography.hazmat.backends import default_backend
+
+
+logger = logging.getLogger('ssl-certificates')
+
+
+def load_certificate(data):
+    certificate = x509.load_pem_x509_certificate(data, default_backend())
+
+    expiry = getattr(certificate, 'not_valid_after_utc', None)
+
+    if expiry:
+        expiry = expiry.replace(tzinfo=None)
+
+    else:
+        expiry = certificate.not_valid_after
+
+    try:
+        names = certificate.extensions.get_extension_for_oid(
+            ExtensionOID.SUBJECT_ALTERNATIVE_NAME
+        ).value.get_values_for_type(x509.DNSName)
+
+    except x509.ExtensionNotFound:
+        names = [
+            attribute.value for attribute in
+            certificate.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+        ]
+
+    return expiry, tuple(names)
+
+
+class CertificateReader(object):
+    def __init__(self):
+        self._cache = dict()
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        try:
+            modified = os.path.getmtime(path)
+
+        except OSError:
+            return None, ()
+
+        with self._lock:
+            cached = self._cache.get(path)
+
+        if cached and cached[0] == modified:
+            return cached[1]
+
+        try:
+            with open(path, 'rb') as cert_file:
+                details = load_certificate(cert_file.read())
+
+        except Exception as ex:
+            logger.warning('Failed to read the certificate from %s' % path, exc_info=ex)
+            return None, ()
+
+        with self._lock:
+            self._cache[path] = (modified, details)
+
+        return details
@@ -0,0 +1,257 @@
+import os
+import time
+import socket
+import struct
+import logging
+
+
+logger = logging.getLogger('ssl-propagation')
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_TXT = 16
+
+CLASS_IN = 1
+
+FLAG_RESPONSE = 0x8000
+FLAG_TRUNCATED = 0x0200
+FLAG_RECURSION_DESIRED = 0x0100
+
+RCODE_NAME_ERROR = 3
+
+
+class DNSError(Exception):
+    pass
+
+
+def build_query(query_id, name, record_type, recursive=True):
+    flags = FLAG_RECURSION_DESIRED if recursive else 0
+    header = struct.pack('!HHHHHH', query_id, flags, 1, 0, 0, 0)
+
+    question = b''.join(
+        struct.pack('!B', len(label)) + label.encode('ascii')
+        for label in name.rstrip('.').split('.') if label
+    )
+
+    return header + question + b'\x00' + struct.pack('!HH', record_type, CLASS_IN)
+
+
+def read_name(data, position):
+    labels = list()
+    end = None
+
+    # compression pointers may only point backwards, this also guards against loops
+    for _ in range(128):
+        length = _byte(data, position)
+
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = position + 2
+
+            position = struct.unpack('!H', data[position:position + 2])[0] & 0x3FFF
+
+        elif length == 0:
+            return '.'.join(labels), end if end is not None else position + 1
+
+        else:
+            labels.append(data[position + 1:position + 1 + length].decode('ascii'))
+            position += 1 + length
+
+    raise DNSError('Too many labels or compression pointers in the name')
+
+
+def parse_response(data, query_id):
+    if len(data) < 12:
+        return
+
+    response_id, flags, questions, answers = struct.unpack('!HHHH', data[:8])
+
+    if response_id != query_id or not flags & FLAG_RESPONSE:
+        return
+
+    position = 12
+
+    for _ in range(questions):
+        _, position = read_name(data, position)
+        position += 4
+
+    records = list()
+
+    for _ in range(answers):
+        name, position = read_name(data, position)
+        record_type, record_class, _, length = struct.unpack('!HHIH', data[position:position + 10])
+        position += 10
+
+        if record_class == CLASS_IN:
+            records.append((name, record_type, _decode_record(data, position, length, record_type)))
+
+        position += length
+
+    return flags & 0x000F, bool(flags & FLAG_TRUNCATED), records
+
+
+def _decode_record(data, position, length, record_type):
+    if record_type == TYPE_A:
+        return socket.inet_ntoa(data[position:position + 4])
+
+    elif record_type == TYPE_NS:
+        return read_name(data, position)[0]
+
+    elif record_type == TYPE_TXT:
+        strings = list()
+        end = position + length
+
+        while position < end:
+            size = _byte(data, position)
+            strings.append(data[position + 1:position + 1 + size].decode('utf-8', 'replace'))
+            position += 1 + size
+
+        return ''.join(strings)
+
+
+def _byte(data, position):
+    return struct.unpack('!B', data[position:position + 1])[0]
+
+
+def _receive(sock, size):
+    data = b''
+
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+
+        if not chunk:
+            raise DNSError('The connection was closed before the response was received')
+
+        data += chunk
+
+    return data
+
+
+class DNSClient(object):
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+
+    def query(self, server, name, record_type, recursive=True, deadline=None):
+        end = time.time() + self.timeout
+
+        if deadline is not None:
+            end = min(end, deadline)
+
+        query_id = struct.unpack('!H', os.urandom(2))[0]
+        query = build_query(query_id, name, record_type, recursive)
+
+        rcode, truncated, records = self._query_udp(server, query, query_id, end)
+
+        if truncated:
+            # the answer did not fit into a UDP response, the complete one is only available over TCP
+            rcode, truncated, records = self._query_tcp(server, query, query_id, end)
+
+        if rcode == RCODE_NAME_ERROR:
+            return list()
+
+        elif rcode != 0:
+            raise DNSError('Query for %s failed with response code %d' % (name, rcode))
+
+        return [value for _, found_type, value in records if found_type == record_type]
+
+    @staticmethod
+    def _query_udp(server, query, query_id, end):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        try:
+            sock.settimeout(_remaining(end))
+            sock.sendto(query, server)
+
+            while True:
+                sock.settimeout(_remaining(end))
+
+                data, _ = sock.recvfrom(4096)
+
+                response = parse_response(data, query_id)
+
+                if response:
+                    return response
+
+        finally:
+            sock.close()
+
+    @staticmethod
+    def _query_tcp(server, query, query_id, end):
+        sock = socket.create_connection(server, _remaining(end))
+
+        try:
+            sock.sendall(struct.pack('!H', len(query)) + query)
+
+            length = struct.unpack('!H', _receive(sock, 2))[0]
+            response = parse_response(_receive(sock, length), query_id)
+
+        finally:
+            sock.close()
+
+        if not response:
+            raise DNSError('Invalid response received over TCP')
+
+        return response
+
+
+def _remaining(end):
+    remaining = end - time.time()
+
+    if remaining <= 0:
+        raise socket.timeout('The DNS query timed out')
+
+    return remaining
+
+
+class PropagationChecker(object):
+    def __init__(self, resolver, nameserver_port=53, interval=1.0, client=None):
+        self.resolver = resolver
+        self.nameserver_port = nameserver_port
+        self.interval = interval
+        self.client = client or DNSClient()
+
+        self._nameservers = dict()
+
+    def nameservers(self, zone, deadline=None):
+        if zone not in self._nameservers:
+            addresses = list()
+
+            for hostname in self.client.query(self.resolver, zone, TYPE_NS, deadline=deadline):
+                for address in self.client.query(self.resolver, hostname, TYPE_A, deadline=deadline):
+                    addresses.append((address, self.nameserver_port))
+
+            if not addresses:
+                raise DNSError('No nameservers found for %s' % zone)
+
+            self._nameservers[zone] = addresses
+
+        return self._nameservers[zone]
+
+    def is_visible(self, zone, name, value, deadline=None):
+        try:
+            return all(
+                value in self.client.query(nameserver, name, TYPE_TXT, recursive=False, deadline=deadline)
+                for nameserver in self.nameservers(zone, deadline)
+            )
+
+        except (socket.error, socket.timeout, DNSError) as ex:
+            logger.debug('Failed to check the %s record: %s' % (name, ex))
+            return False
+
+    def wait_for(self, records, timeout):
+        # the queries are limited to the deadline as well, so the wait never runs past the timeout
+        deadline = time.time() + timeout
+        pending = list(records)
+
+        while True:
+            pending = [record for record in pending if not self.is_visible(*record, deadline=deadline)]
+
+            if not pending:
+                return True
+
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                return False
+
+            time.sleep(min(self.interval, remaining))
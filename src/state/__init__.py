@@ -0,0 +1,58 @@
+import abc
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+class StateStore(object):
+    @abc.abstractmethod
+    def get(self, namespace, key, default=None):
+        raise NotImplementedError('%s.get not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    def put(self, namespace, key, value):
+        raise NotImplementedError('%s.put not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    def delete(self, namespace, key):
+        raise NotImplementedError('%s.delete not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    def items(self, namespace):
+        raise NotImplementedError('%s.items not implemented' % type(self).__name__)
+
+    @abc.abstractmethod
+    def clear(self, namespace):
+        raise NotImplementedError('%s.clear not implemented' % type(self).__name__)
+
+
+class StateMapping(MutableMapping):
+    def __init__(self, store, namespace, encode=None, decode=None):
+        self.store = store
+        self.namespace = namespace
+
+        self._encode = encode or (lambda value: value)
+        self._decode = decode or (lambda value: value)
+
+        self._items = dict(
+            (key, self._decode(value)) for key, value in store.items(namespace)
+        )
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __setitem__(self, key, value):
+        self.store.put(self.namespace, key, self._encode(value))
+        self._items[key] = value
+
+    def __delitem__(self, key):
+        del self._items[key]
+        self.store.delete(self.namespace, key)
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,29 @@
+import threading
+
+from state import StateStore
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self):
+        self._namespaces = dict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            return self._namespaces.get(namespace, dict()).get(key, default)
+
+    def put(self, namespace, key, value):
+        with self._lock:
+            self._namespaces.setdefault(namespace, dict())[key] = value
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._namespaces.get(namespace, dict()).pop(key, None)
+
+    def items(self, namespace):
+        with self._lock:
+            return list(self._namespaces.get(namespace, dict()).items())
+
+    def clear(self, namespace):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
@@ -0,0 +1,75 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+from config import read_configuration, default_config_path
+from state import StateStore
+
+
+logger = logging.getLogger('state-sqlite')
+
+
+class SqliteStateStore(StateStore):
+    def __init__(self):
+        self.path = read_configuration(
+            'STATE_DATABASE', default_config_path, '/var/lib/domain-automation/state.db'
+        )
+
+        directory = os.path.dirname(self.path)
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS state ('
+                ' namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,'
+                ' PRIMARY KEY (namespace, key))'
+            )
+
+        logger.info('Using the state database at %s' % self.path)
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM state WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+
+        if row is None:
+            return default
+
+        return json.loads(row[0])
+
+    def put(self, namespace, key, value):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)',
+                (namespace, key, json.dumps(value))
+            )
+
+    def delete(self, namespace, key):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM state WHERE namespace = ? AND key = ?', (namespace, key)
+            )
+
+    def items(self, namespace):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT key, value FROM state WHERE namespace = ?', (namespace,)
+            ).fetchall()
+
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def clear(self, namespace):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM state WHERE namespace = ?', (namespace,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,67 @@
+import logging
+import threading
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from config import read_configuration, default_config_path
+
+
+logger = logging.getLogger('workers')
+
+
+def read_worker_count(key):
+    value = read_configuration(key, default_config_path)
+
+    if value:
+        return max(1, int(value))
+
+
+class WorkerPool(object):
+    def __init__(self, size, name='worker'):
+        self.size = max(1, int(size))
+        self.name = name
+
+        self._queue = Queue()
+        self._threads = list()
+
+    def start(self):
+        for index in range(self.size):
+            thread = threading.Thread(
+                target=self._work, name='%s-%d' % (self.name, index + 1)
+            )
+            thread.setDaemon(True)
+            thread.start()
+
+            self._threads.append(thread)
+
+        return self
+
+    def submit(self, func, *args, **kwargs):
+        self._queue.put((func, args, kwargs))
+
+    def join(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+        del self._threads[:]
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+
+            if item is None:
+                break
+
+            func, args, kwargs = item
+
+            try:
+                func(*args, **kwargs)
+
+            except Exception as ex:
+                logger.error('Failed to execute a task in the %s pool' % self.name, exc_info=ex)
@@ -0,0 +1,291 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta
+
+import josepy
+import requests
+
+from acme import challenges, messages
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+import factories
+
+from config import Subdomain
+from dns_manager.cloudflare_dns import CloudflareDNSManager
+from state.memory import MemoryStateStore
+from ssl_manager import SSLResult
+from ssl_manager import acme_cf_ssl
+
+
+def _self_signed(names, expires_in=timedelta(days=90)):
+    key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, names[0])])
+
+    certificate = x509.CertificateBuilder() \
+        .subject_name(subject).issuer_name(subject) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(datetime.utcnow() - timedelta(days=1)) \
+        .not_valid_after(datetime.utcnow() + expires_in) \
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(n) for n in names]), critical=False) \
+        .sign(key, hashes.SHA256(), default_backend())
+
+    return certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class MockAcmeClient(object):
+    def __init__(self):
+        self.orders = list()
+        self.answered = list()
+        self.fail_with = None
+
+    def new_order(self, csr_pem):
+        csr = x509.load_pem_x509_csr(csr_pem, default_backend())
+        names = csr.extensions.get_extension_for_class(
+            x509.SubjectAlternativeName
+        ).value.get_values_for_type(x509.DNSName)
+
+        authorizations = list()
+
+        for index, name in enumerate(names):
+            authorizations.append(messages.AuthorizationResource(
+                uri='http://acme/authz/%d' % index,
+                body=messages.Authorization(
+                    identifier=messages.Identifier(typ=messages.IDENTIFIER_FQDN, value=name),
+                    status=messages.STATUS_PENDING,
+                    challenges=[
+                        messages.ChallengeBody(
+                            chall=challenges.HTTP01(token=b'h' * 32),
+                            uri='http://acme/chall/http/%d' % index, status=messages.STATUS_PENDING
+                        ),
+                        messages.ChallengeBody(
+                            chall=challenges.DNS01(token=b'd' * 32),
+                            uri='http://acme/chall/dns/%d' % index, status=messages.STATUS_PENDING
+                        )
+                    ]
+                )
+            ))
+
+        self.orders.append(names)
+
+        return messages.OrderResource(
+            uri='http://acme/order/1', body=messages.Order(), authorizations=authorizations, csr_pem=csr_pem
+        )
+
+    def answer_challenge(self, challenge, response):
+        self.answered.append((challenge.uri, response))
+
+    def poll_and_finalize(self, order, deadline=None):
+        if self.fail_with:
+            raise self.fail_with
+
+        names = [authorization.body.identifier.value for authorization in order.authorizations]
+
+        return order.update(fullchain_pem=_self_signed(names) + _self_signed(['Intermediate']))
+
+
+class MockDNSManager(object):
+    def __init__(self):
+        self.records = dict()
+        self.removed = list()
+
+    def create_txt_record(self, subdomain, name, content):
+        record = {'id': 'txt-%d' % len(self.records), 'name': name, 'content': content, 'zone': subdomain.base}
+        self.records[record['id']] = record
+        return record
+
+    def delete_txt_record(self, subdomain, record):
+        self.removed.append(self.records.pop(record['id']))
+
+
+class MockPropagationChecker(object):
+    def __init__(self):
+        self.checked = list()
+
+    def wait_for(self, records, timeout):
+        self.checked.append((records, timeout))
+        return True
+
+
+class AcmeCloudflareSSLManagerTest(unittest.TestCase):
+    def setUp(self):
+        os.environ['CLOUDFLARE_EMAIL'] = 'unittest@cf.com'
+        os.environ['CLOUDFLARE_TOKEN'] = 'cf001234'
+        os.environ['DNS_PROPAGATION_SECONDS'] = '0'
+
+        self.directory = tempfile.mkdtemp()
+        os.environ['ACME_CERTIFICATES_DIR'] = os.path.join(self.directory, 'certificates')
+        os.environ['ACME_ACCOUNT_KEY'] = os.path.join(self.directory, 'acme', 'account.pem')
+
+        self.original_get_state_store = factories.get_state_store
+        factories.get_state_store = lambda: MemoryStateStore()
+
+        self.manager = acme_cf_ssl.AcmeCloudflareSSLManager()
+        self.manager.dns = MockDNSManager()
+        self.manager.propagation = MockPropagationChecker()
+
+        self.acme = MockAcmeClient()
+        self.manager._client = self.acme
+        self.manager._account_key = josepy.JWKRSA(key=rsa.generate_private_key(65537, 2048, default_backend()))
+
+    def tearDown(self):
+        for key in ('CLOUDFLARE_EMAIL', 'CLOUDFLARE_TOKEN', 'DNS_PROPAGATION_SECONDS',
+                    'ACME_CERTIFICATES_DIR', 'ACME_ACCOUNT_KEY'):
+            os.environ.pop(key, None)
+
+        shutil.rmtree(self.directory)
+
+        factories.get_state_store = self.original_get_state_store
+
+    def test_shared_dns_manager(self):
+        dns = CloudflareDNSManager()
+
+        original_get_dns_manager = factories.get_dns_manager
+        factories.get_dns_manager = lambda: dns
+
+        try:
+            self.assertIs(acme_cf_ssl.AcmeCloudflareSSLManager().dns, dns)
+
+            factories.get_dns_manager = lambda: MockDNSManager()
+
+            separate = acme_cf_ssl.AcmeCloudflareSSLManager().dns
+
+            self.assertIsInstance(separate, CloudflareDNSManager)
+            self.assertNotEqual(separate._zones.namespace, dns._zones.namespace)
+            self.assertNotEqual(separate._dns_records.namespace, dns._dns_records.namespace)
+
+        finally:
+            factories.get_dns_manager = original_get_dns_manager
+
+    def test_new_certificate(self):
+        subdomain = Subdomain('www', 'unit.test')
+
+        self.assertTrue(self.manager.needs_update(subdomain))
+
+        result = self.manager.update(subdomain)
+
+        self.assertEqual(result, 'OK, new certificate')
+        self.assertIsInstance(result, SSLResult)
+        self.assertEqual(result.status, SSLResult.NEW)
+        self.assertTrue(result.successful)
+        self.assertEqual(result.certificate, 'www.unit.test')
+        self.assertEqual(result.names, ('www.unit.test',))
+        self.assertGreater(result.expiry, datetime.utcnow() + timedelta(days=89))
+        self.assertIsNotNone(result.duration)
+
+        self.assertEqual(self.acme.orders, [['www.unit.test']])
+        self.assertEqual([uri for uri, _ in self.acme.answered], ['http://acme/chall/dns/0'])
+
+        self.assertEqual(len(self.manager.dns.removed), 1)
+        self.assertEqual(self.manager.dns.removed[0]['name'], '_acme-challenge.www.unit.test')
+        self.assertEqual(self.manager.dns.removed[0]['zone'], 'unit.test')
+        self.assertEqual(self.manager.dns.records, dict())
+
+        self.assertEqual(self.manager.propagation.checked, [(
+            [('unit.test', '_acme-challenge.www.unit.test', self.manager.dns.removed[0]['content'])], 0
+        )])
+
+        certificate_dir = os.path.join(self.directory, 'certificates', 'www.unit.test')
+
+        for filename in ('cert.pem', 'fullchain.pem', 'privkey.pem'):
+            self.assertTrue(os.path.exists(os.path.join(certificate_dir, filename)))
+
+        self.assertEqual(os.stat(os.path.join(certificate_dir, 'privkey.pem')).st_mode & 0o777, 0o600)
+
+        with open(os.path.join(certificate_dir, 'cert.pem')) as cert_file:
+            self.assertEqual(cert_file.read().count('BEGIN CERTIFICATE'), 1)
+
+        self.assertFalse(self.manager.needs_update(subdomain))
+        self.assertIsNotNone(self.manager.get_certificate_expiry(subdomain))
+
+    def test_renewed_certificate(self):
+        subdomain = Subdomain('renew', 'unit.test')
+
+        self.manager.update(subdomain)
+        self.manager.last_run.clear()
+
+        self.manager.renewal_window = timedelta(days=100)
+
+        self.assertTrue(self.manager.needs_update(subdomain))
+
+        result = self.manager.update(subdomain)
+
+        self.assertEqual(result, 'OK, renewed')
+        self.assertEqual(result.status, SSLResult.RENEWED)
+
+    def test_multiple_names(self):
+        subdomains = [Subdomain('www', 'unit.test'), Subdomain('api', 'unit.test')]
+
+        result = self.manager.update_group('unit.test', subdomains)
+
+        self.assertEqual(result.names, ('api.unit.test', 'www.unit.test'))
+        self.assertEqual(len(self.acme.answered), 2)
+        self.assertEqual(len(self.manager.dns.removed), 2)
+
+    def test_failure(self):
+        self.acme.fail_with = Exception('Validation failed')
+
+        result = self.manager.update(Subdomain('failing', 'unit.test'))
+
+        self.assertEqual(result, 'Failed: Validation failed')
+        self.assertEqual(result.status, SSLResult.FAILED)
+        self.assertFalse(result.successful)
+
+        self.assertEqual(self.manager.dns.records, dict())
+        self.assertTrue(self.manager.needs_update(Subdomain('failing', 'unit.test')))
+
+
+class ChallengeTestServerDNS(object):
+    def __init__(self, url):
+        self.url = url
+
+    def create_txt_record(self, subdomain, name, content):
+        requests.post('%s/set-txt' % self.url, json={'host': '%s.' % name, 'value': content}).raise_for_status()
+        return {'name': name, 'content': content}
+
+    def delete_txt_record(self, subdomain, record):
+        requests.post('%s/clear-txt' % self.url, json={'host': '%s.' % record['name']}).raise_for_status()
+
+
+@unittest.skipUnless(os.environ.get('PEBBLE_DIRECTORY_URL'), 'Pebble is not available')
+class PebbleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        os.environ['CLOUDFLARE_EMAIL'] = 'unittest@cf.com'
+        os.environ['DNS_PROPAGATION_SECONDS'] = '0'
+        os.environ['ACME_DIRECTORY_URL'] = os.environ['PEBBLE_DIRECTORY_URL']
+        os.environ['ACME_VERIFY_SSL'] = 'no'
+        os.environ['ACME_PROPAGATION_CHECK'] = 'no'
+        os.environ['ACME_CERTIFICATES_DIR'] = os.path.join(self.directory, 'certificates')
+        os.environ['ACME_ACCOUNT_KEY'] = os.path.join(self.directory, 'acme', 'account.pem')
+
+    def tearDown(self):
+        for key in ('CLOUDFLARE_EMAIL', 'DNS_PROPAGATION_SECONDS', 'ACME_DIRECTORY_URL',
+                    'ACME_VERIFY_SSL', 'ACME_PROPAGATION_CHECK', 'ACME_CERTIFICATES_DIR', 'ACME_ACCOUNT_KEY'):
+            os.environ.pop(key, None)
+
+        shutil.rmtree(self.directory)
+
+    def test_issue_certificate(self):
+        manager = acme_cf_ssl.AcmeCloudflareSSLManager()
+        manager.dns = ChallengeTestServerDNS(
+            os.environ.get('PEBBLE_CHALLTESTSRV_URL', 'http://localhost:8055')
+        )
+
+        result = manager.update_group('pebble.test', [Subdomain('www', 'pebble.test'), Subdomain('', 'pebble.test')])
+
+        self.assertEqual(result.status, SSLResult.NEW)
+        self.assertEqual(sorted(result.names), ['pebble.test', 'www.pebble.test'])
+
+        restarted = acme_cf_ssl.AcmeCloudflareSSLManager()
+        restarted.dns = manager.dns
+
+        self.assertEqual(restarted.update(Subdomain('api', 'pebble.test')).status, SSLResult.NEW)
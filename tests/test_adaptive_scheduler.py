@@ -0,0 +1,242 @@
+import time
+import unittest
+
+from datetime import datetime, timedelta
+
+import app
+import factories
+
+from config import Subdomain
+from discovery import Discovery
+from notifications import NotificationManager
+from scheduler.adaptive import AdaptiveScheduler
+from ssl_manager import SSLManager
+
+import test_app
+
+
+class MockDiscovery(Discovery):
+    def __init__(self, *names):
+        self.subdomains = [Subdomain(name, 'adaptive.test') for name in names]
+
+    def _iter_subdomains(self):
+        return iter(self.subdomains)
+
+
+class MockSSLManager(SSLManager):
+    def __init__(self):
+        self.renewal_window = timedelta(days=30)
+        self.expiry = dict()
+
+    def get_certificate_expiry(self, subdomain):
+        return self.expiry.get(subdomain.full)
+
+
+class MockNotificationManager(NotificationManager):
+    def __init__(self):
+        super(MockNotificationManager, self).__init__()
+        self.events = list()
+
+    def dns_updated(self, subdomain, result):
+        self.events.append((subdomain.full, result))
+
+
+class AdaptiveSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.discovery = MockDiscovery('www', 'api')
+        self.ssl = MockSSLManager()
+        self.notifications = MockNotificationManager()
+
+        self.original_get_discovery = factories.get_discovery
+        self.original_get_ssl_manager = factories.get_ssl_manager
+        factories.get_discovery = lambda: self.discovery
+        factories.get_ssl_manager = lambda: self.ssl
+
+        self.scheduler = AdaptiveScheduler()
+        self.scheduler.check_interval = 0.2
+        self.scheduler.retry_delay = 0.05
+        self.scheduler.max_backoff = 0.15
+        self.scheduler.discovery_interval = 60
+
+        self.runs = list()
+        self.failing = set()
+
+    def tearDown(self):
+        self.scheduler.cancel()
+
+        factories.get_discovery = self.original_get_discovery
+        factories.get_ssl_manager = self.original_get_ssl_manager
+
+    def _check(self, discovery, notifications, subdomains=None, all_subdomains=None):
+        self.runs.append((time.time(), [subdomain.full for subdomain in subdomains]))
+        self.all_subdomains = [subdomain.full for subdomain in all_subdomains]
+
+        for subdomain in subdomains:
+            if subdomain.full in self.failing:
+                notifications.dns_updated(subdomain, 'Failed: testing')
+
+            else:
+                notifications.dns_updated(subdomain, 'OK')
+
+    def _checked(self, name):
+        return [at for at, names in self.runs if name in names]
+
+    def test_spreads_the_first_checks(self):
+        self.scheduler.schedule(self._check, self.discovery, self.notifications)
+
+        time.sleep(0.15)
+
+        self.assertEqual([names for _, names in self.runs], [['www.adaptive.test'], ['api.adaptive.test']])
+        self.assertGreaterEqual(self.runs[1][0] - self.runs[0][0], 0.08)
+
+        time.sleep(0.4)
+
+        self.assertEqual(len(self._checked('www.adaptive.test')), 3)
+        self.assertEqual(len(self._checked('api.adaptive.test')), 3)
+
+        self.assertIn(('www.adaptive.test', 'OK'), self.notifications.events)
+
+    def test_failures_back_off(self):
+        self.discovery.subdomains = [Subdomain('failing', 'adaptive.test')]
+        self.failing.add('failing.adaptive.test')
+
+        self.scheduler.check_interval = 60
+        self.scheduler.schedule(self._check, self.discovery, self.notifications)
+
+        time.sleep(0.4)
+
+        checks = self._checked('failing.adaptive.test')
+        delays = [later - earlier for earlier, later in zip(checks, checks[1:])]
+
+        self.assertEqual(len(checks), 4)
+        self.assertAlmostEqual(delays[0], 0.05, delta=0.03)
+        self.assertAlmostEqual(delays[1], 0.1, delta=0.03)
+        self.assertAlmostEqual(delays[2], 0.15, delta=0.03)
+        self.assertEqual(self.scheduler.failures['failing.adaptive.test'], 4)
+
+        self.failing.clear()
+        self.scheduler.run_now()
+
+        time.sleep(0.05)
+
+        self.assertNotIn('failing.adaptive.test', self.scheduler.failures)
+
+    def test_certificate_renewal_due(self):
+        self.discovery.subdomains = [Subdomain('expiring', 'adaptive.test')]
+        self.ssl.expiry['expiring.adaptive.test'] = datetime.utcnow() + timedelta(days=30, seconds=0.2)
+
+        self.scheduler.check_interval = 60
+        self.scheduler.schedule(self._check, self.discovery, self.notifications)
+
+        time.sleep(0.4)
+
+        self.assertEqual(len(self._checked('expiring.adaptive.test')), 2)
+
+    def test_discovery_changes(self):
+        self.scheduler.check_interval = 60
+        self.scheduler.discovery_interval = 0.1
+        self.scheduler.schedule(self._check, self.discovery, self.notifications)
+
+        time.sleep(0.05)
+
+        self.discovery.subdomains = [Subdomain('www', 'adaptive.test'), Subdomain('new', 'adaptive.test')]
+
+        time.sleep(0.15)
+
+        self.assertEqual(len(self._checked('new.adaptive.test')), 1)
+        self.assertEqual(self.all_subdomains, ['www.adaptive.test', 'new.adaptive.test'])
+        self.assertNotIn('api.adaptive.test', self.scheduler.due)
+        self.assertIn('www.adaptive.test', self.scheduler.due)
+
+    def test_run_now(self):
+        self.scheduler.check_interval = 60
+        self.scheduler.schedule(self._check, self.discovery, self.notifications)
+
+        time.sleep(0.05)
+
+        self.assertEqual(len(self.runs), 1)
+
+        self.scheduler.run_now()
+
+        time.sleep(0.05)
+
+        self.assertEqual(len(self._checked('www.adaptive.test')), 2)
+        self.assertEqual(len(self._checked('api.adaptive.test')), 1)
+
+    def test_cancel(self):
+        self.scheduler.schedule(self._check, self.discovery, self.notifications)
+
+        self.scheduler.cancel()
+
+        self.assertFalse(self.scheduler._thread.is_alive())
+
+
+class AdaptiveSchedulerAppTest(unittest.TestCase):
+    def setUp(self):
+        self.discovery = test_app.MockDiscovery('www', 'test')
+        self.notifications = test_app.MockNotificationManager()
+        self.scheduler = AdaptiveScheduler()
+        self.scheduler.check_interval = 60
+
+        self.originals = dict(
+            (name, getattr(factories, name)) for name in (
+                'get_scheduler', 'get_discovery', 'get_dns_manager',
+                'get_ssl_manager', 'get_notification_manager'
+            )
+        )
+
+        factories.get_scheduler = lambda: self.scheduler
+        factories.get_discovery = lambda: self.discovery
+        factories.get_dns_manager = lambda: test_app.MockDNSManager()
+        factories.get_ssl_manager = lambda: test_app.MockSSLManager()
+        factories.get_notification_manager = lambda: self.notifications
+
+        self.original_signal = app.signal.signal
+        app.signal.signal = lambda *args: None
+
+    def tearDown(self):
+        self.scheduler.cancel()
+
+        app.signal.signal = self.original_signal
+
+        for name, original in self.originals.items():
+            setattr(factories, name, original)
+
+    def test_main(self):
+        app.main()
+
+        # the processing thread has to keep the application running after main() returns
+        self.assertTrue(self.scheduler._thread.is_alive())
+        self.assertFalse(self.scheduler._thread.daemon)
+
+        time.sleep(0.1)
+
+        self.assertIn(('DNS', 'www', 'OK'), self.notifications.events)
+        self.assertIn(('SSL', 'www', 'Updated'), self.notifications.events)
+        self.assertNotIn(('DNS', 'test', 'OK'), self.notifications.events)
+
+        self.scheduler.cancel()
+
+        self.assertFalse(self.scheduler._thread.is_alive())
+
+    def test_batched_checks_reuse_the_discovered_subdomains(self):
+        class BatchingSSLManager(test_app.MockSSLManager):
+            batch_updates = True
+
+        factories.get_ssl_manager = lambda: BatchingSSLManager()
+
+        discoveries = list()
+        original_iter_subdomains = self.discovery._iter_subdomains
+
+        def counting_iter_subdomains():
+            discoveries.append(time.time())
+            return original_iter_subdomains()
+
+        self.discovery._iter_subdomains = counting_iter_subdomains
+
+        app.main()
+
+        time.sleep(0.1)
+
+        self.assertIn(('SSL', 'www', 'Updated'), self.notifications.events)
+        self.assertEqual(len(discoveries), 1)
@@ -1,11 +1,13 @@
 import os
 import time
 import socket
+import threading
 import unittest
 
 import requests
 
 import app
+import cache
 import factories
 
 from datetime import datetime
@@ -135,6 +137,23 @@ class AppTest(unittest.TestCase):
 
         self.assertIn(('Message', 'Application exiting'), self.notifications.events)
 
+    def test_refresh_on_sighup(self):
+        signals = dict()
+
+        def mock_signal(signal, func):
+            signals[signal] = func
+
+        app.signal.signal = mock_signal
+
+        app.main()
+
+        items = cache.TTLCache('unittest_app', ttl=60)
+        items.put('key', 'value')
+
+        signals[app.signal.SIGHUP](app.signal.SIGHUP)
+
+        self.assertIsNone(items.get('key'))
+
     def test_skip_dns_update(self):
         class WWWUpdatingDNSManager(MockDNSManager):
             def get_current_ip(self, subdomain):
@@ -289,6 +308,262 @@ class AppTest(unittest.TestCase):
         self.assertEqual(len(messages), 1)
         self.assertIn('Application starting', messages[0])
 
+    def test_concurrent_checks(self):
+        os.environ['DNS_WORKERS'] = '4'
+        os.environ['SSL_WORKERS'] = '2'
+
+        self.addCleanup(os.environ.pop, 'DNS_WORKERS', None)
+        self.addCleanup(os.environ.pop, 'SSL_WORKERS', None)
+
+        self.discovery = MockDiscovery(*('sub%d' % idx for idx in range(20)))
+
+        app.main()
+
+        current_ip = self.dns.get_current_public_ip()
+
+        for subdomain in self.discovery.subdomains:
+            self.assertEqual(subdomain.current_ip, current_ip)
+            self.assertGreater(subdomain.cert_update, 0)
+
+            self.assertIn(('DNS', subdomain.name, 'OK'), self.notifications.events)
+            self.assertIn(('SSL', subdomain.name, 'Updated'), self.notifications.events)
+
+        self.assertEqual(len(self.notifications.events), 41)
+
+    def test_concurrency_limits(self):
+        os.environ['DNS_WORKERS'] = '3'
+        os.environ['SSL_WORKERS'] = '1'
+
+        self.addCleanup(os.environ.pop, 'DNS_WORKERS', None)
+        self.addCleanup(os.environ.pop, 'SSL_WORKERS', None)
+
+        lock = threading.Lock()
+        running = {'DNS': 0, 'SSL': 0}
+        peaks = {'DNS': 0, 'SSL': 0}
+
+        def track(kind, func):
+            with lock:
+                running[kind] += 1
+                peaks[kind] = max(peaks[kind], running[kind])
+
+            try:
+                time.sleep(0.01)
+                return func()
+
+            finally:
+                with lock:
+                    running[kind] -= 1
+
+        class TrackingDNSManager(MockDNSManager):
+            def update(self, subdomain, public_ip):
+                parent = super(TrackingDNSManager, self)
+                return track('DNS', lambda: parent.update(subdomain, public_ip))
+
+        class TrackingSSLManager(MockSSLManager):
+            def update(self, subdomain):
+                parent = super(TrackingSSLManager, self)
+                return track('SSL', lambda: parent.update(subdomain))
+
+        self.discovery = MockDiscovery(*('sub%d' % idx for idx in range(12)))
+        self.dns = TrackingDNSManager()
+        self.ssl = TrackingSSLManager()
+
+        app.main()
+
+        self.assertLessEqual(peaks['DNS'], 3)
+        self.assertEqual(peaks['SSL'], 1)
+        self.assertEqual(len(self.notifications.events), 25)
+
+    def test_dns_stage_does_not_wait_for_ssl(self):
+        os.environ['DNS_WORKERS'] = '1'
+        os.environ['SSL_WORKERS'] = '1'
+
+        self.addCleanup(os.environ.pop, 'DNS_WORKERS', None)
+        self.addCleanup(os.environ.pop, 'SSL_WORKERS', None)
+
+        class SlowSSLManager(MockSSLManager):
+            def update(self, subdomain):
+                time.sleep(0.05)
+                return super(SlowSSLManager, self).update(subdomain)
+
+        self.discovery = MockDiscovery(*('sub%d' % idx for idx in range(5)))
+        self.ssl = SlowSSLManager()
+
+        app.main()
+
+        event_types = list(event[0] for event in self.notifications.events)
+
+        self.assertEqual(event_types.count('DNS'), 5)
+        self.assertEqual(event_types.count('SSL'), 5)
+        self.assertEqual(event_types[1:6], ['DNS'] * 5)
+
+    def test_concurrent_notifications_with_errors(self):
+        os.environ['SSL_WORKERS'] = '2'
+
+        self.addCleanup(os.environ.pop, 'SSL_WORKERS', None)
+
+        class FailingSSLManager(MockSSLManager):
+            def update(self, subdomain):
+                raise Exception('SSL update failed')
+
+        self.ssl = FailingSSLManager()
+
+        app.main()
+
+        self.assertIn(('DNS', 'www', 'OK'), self.notifications.events)
+        self.assertIn(('DNS', 'test', 'OK'), self.notifications.events)
+        self.assertIn(('SSL', 'www', 'Failed: SSL update failed'), self.notifications.events)
+        self.assertIn(('SSL', 'test', 'Failed: SSL update failed'), self.notifications.events)
+
+    def test_batch_dns_reconciliation(self):
+        reconciled = list()
+
+        class ReconcilingDNSManager(MockDNSManager):
+            supports_reconcile = True
+
+            def get_current_ip(self, subdomain):
+                if subdomain.name == 'www':
+                    return '9.8.7.6'
+                else:
+                    return '1.2.3.4'
+
+            def reconcile(self, subdomains, public_ip):
+                reconciled.append(list(s.name for s in subdomains))
+                return super(ReconcilingDNSManager, self).reconcile(subdomains, public_ip)
+
+        self.dns = ReconcilingDNSManager()
+
+        app.main()
+
+        self.assertEqual(reconciled, [['www', 'test']])
+
+        self.assertIn(('DNS', 'www', 'OK'), self.notifications.events)
+        self.assertNotIn(('DNS', 'test', 'OK'), self.notifications.events)
+        self.assertIn(('SSL', 'www', 'Updated'), self.notifications.events)
+        self.assertIn(('SSL', 'test', 'Updated'), self.notifications.events)
+        self.assertEqual(len(self.notifications.events), 4)
+
+    def test_default_reconciliation_plan(self):
+        class FailingDNSManager(MockDNSManager):
+            def get_current_ip(self, subdomain):
+                if subdomain.name == 'test':
+                    return '1.2.3.4'
+                else:
+                    return subdomain.current_ip
+
+            def update(self, subdomain, public_ip):
+                if subdomain.name == 'fail':
+                    raise Exception('oops')
+                else:
+                    return super(FailingDNSManager, self).update(subdomain, public_ip)
+
+        discovery = MockDiscovery('www', 'test', 'fail')
+
+        plan = FailingDNSManager().reconcile(discovery.subdomains, '1.2.3.4')
+
+        self.assertEqual(list(s.name for s in plan.updates), ['www', 'fail'])
+        self.assertEqual(list(s.name for s in plan.unchanged), ['test'])
+        self.assertEqual(plan.creates, [])
+        self.assertEqual(
+            list((s.name, result) for s, result in plan.results),
+            [('www', 'OK'), ('fail', 'Failed: oops')]
+        )
+
+    def test_batch_ssl_updates(self):
+        groups = list()
+
+        class BatchingSSLManager(MockSSLManager):
+            batch_updates = True
+
+            def group_subdomains(self, subdomains):
+                return [('certificate', list(subdomains))]
+
+            def needs_update_group(self, certificate, subdomains):
+                return True
+
+            def update_group(self, certificate, subdomains):
+                groups.append((certificate, list(s.name for s in subdomains)))
+                return 'Batched'
+
+        class RecordingNotificationManager(MockNotificationManager):
+            def certificate_updated(self, certificate, subdomains, result):
+                self.events.append(('CERT', certificate, result))
+                super(RecordingNotificationManager, self).certificate_updated(certificate, subdomains, result)
+
+        self.ssl = BatchingSSLManager()
+        self.notifications = RecordingNotificationManager()
+
+        app.main()
+
+        self.assertEqual(groups, [('certificate', ['www', 'test'])])
+
+        self.assertIn(('DNS', 'www', 'OK'), self.notifications.events)
+        self.assertIn(('DNS', 'test', 'OK'), self.notifications.events)
+        self.assertIn(('CERT', 'certificate', 'Batched'), self.notifications.events)
+        self.assertIn(('SSL', 'www', 'Batched'), self.notifications.events)
+        self.assertIn(('SSL', 'test', 'Batched'), self.notifications.events)
+        self.assertEqual(len(self.notifications.events), 6)
+
+    def test_partial_check(self):
+        checked = list()
+
+        class TrackingSSLManager(MockSSLManager):
+            def update(self, subdomain):
+                checked.append(subdomain.name)
+                return super(TrackingSSLManager, self).update(subdomain)
+
+        app.check_all(
+            self.discovery, self.dns, TrackingSSLManager(), self.notifications,
+            subdomains=[self.discovery.subdomains[1]]
+        )
+
+        self.assertEqual(checked, ['test'])
+        self.assertEqual(self.notifications.events, [('DNS', 'test', 'OK'), ('SSL', 'test', 'Updated')])
+        self.assertEqual(self.discovery.subdomains[0].current_ip, '1.1.1.1')
+
+    def test_partial_check_with_batches(self):
+        groups = list()
+
+        class BatchingSSLManager(MockSSLManager):
+            batch_updates = True
+
+            def group_subdomains(self, subdomains):
+                by_name = sorted(subdomains, key=lambda s: s.name)
+                return [('first', by_name[:2]), ('second', by_name[2:])]
+
+            def update_group(self, certificate, subdomains):
+                groups.append((certificate, sorted(s.name for s in subdomains)))
+                return 'Batched'
+
+        discovery = MockDiscovery('aaa', 'bbb', 'ccc')
+        new_subdomain = MockSubdomain('abc', 'unit.test')
+
+        app.check_all(discovery, self.dns, BatchingSSLManager(), self.notifications, subdomains=[new_subdomain])
+
+        self.assertEqual(groups, [('first', ['aaa', 'abc'])])
+        self.assertIn(('DNS', 'abc', 'OK'), self.notifications.events)
+        self.assertNotIn(('DNS', 'aaa', 'OK'), self.notifications.events)
+
+    def test_batch_ssl_notifications_with_delegates(self):
+        events = list()
+
+        class RecordingNotificationManager(NotificationManager):
+            def ssl_updated(self, subdomain, result):
+                events.append(('SSL', subdomain.name, result))
+
+        class SignallingNotificationManager(RecordingNotificationManager):
+            def certificate_updated(self, certificate, subdomains, result):
+                events.append(('CERT', certificate, result))
+
+        notifications = NotificationManager(
+            RecordingNotificationManager(), SignallingNotificationManager()
+        )
+
+        discovery = MockDiscovery('www', 'test')
+        notifications.certificate_updated('unit.test', discovery.subdomains, 'OK')
+
+        self.assertEqual(events, [('SSL', 'www', 'OK'), ('SSL', 'test', 'OK'), ('CERT', 'unit.test', 'OK')])
+
     def test_metrics(self):
         port = self._get_free_tcp_port()
 
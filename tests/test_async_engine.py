@@ -0,0 +1,263 @@
+import os
+import time
+import asyncio
+import threading
+import unittest
+
+import app
+
+from async_engine import AsyncDNSManager
+from async_engine.adapters import as_async_dns_manager, ExecutorDNSManager
+from async_engine.engine import check_all, get_runner, shutdown
+from dns_manager import ReconciliationPlan
+
+from test_app import MockDiscovery, MockDNSManager, MockSSLManager, MockNotificationManager
+
+
+class NativeAsyncDNSManager(AsyncDNSManager):
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def get_current_public_ip(self):
+        return '1.2.3.4'
+
+    async def needs_update(self, subdomain, public_ip):
+        return subdomain.current_ip != public_ip
+
+    async def update(self, subdomain, public_ip):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+
+        try:
+            await asyncio.sleep(0.01)
+            subdomain.current_ip = public_ip
+            return 'OK'
+
+        finally:
+            self.running -= 1
+
+
+class AsyncEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.discovery = MockDiscovery('www', 'test')
+        self.dns = MockDNSManager()
+        self.ssl = MockSSLManager()
+        self.notifications = MockNotificationManager()
+
+    def tearDown(self):
+        os.environ.pop('DNS_WORKERS', None)
+        os.environ.pop('SSL_WORKERS', None)
+        os.environ.pop('CHECK_ENGINE', None)
+        os.environ.pop('ASYNC_EXECUTOR_WORKERS', None)
+
+        shutdown()
+
+    def test_check_all(self):
+        check_all(self.discovery, self.dns, self.ssl, self.notifications)
+
+        for subdomain in self.discovery.subdomains:
+            self.assertEqual(subdomain.current_ip, '1.2.3.4')
+            self.assertGreater(subdomain.cert_update, 0)
+
+        self.assertEqual(len(self.notifications.events), 4)
+        self.assertIn(('DNS', 'www', 'OK'), self.notifications.events)
+        self.assertIn(('SSL', 'test', 'Updated'), self.notifications.events)
+
+    def test_failures_are_reported(self):
+        class FailingDNSManager(MockDNSManager):
+            def update(self, subdomain, public_ip):
+                raise Exception('DNS failure')
+
+        class FailingSSLManager(MockSSLManager):
+            def needs_update(self, subdomain):
+                if subdomain.name == 'www':
+                    raise Exception('Unexpected')
+
+                return True
+
+        check_all(self.discovery, FailingDNSManager(), FailingSSLManager(), self.notifications)
+
+        self.assertIn(('DNS', 'www', 'Failed: DNS failure'), self.notifications.events)
+        self.assertIn(('DNS', 'test', 'Failed: DNS failure'), self.notifications.events)
+        self.assertIn(('SSL', 'test', 'Updated'), self.notifications.events)
+        self.assertNotIn(('SSL', 'www', 'Updated'), self.notifications.events)
+
+    def test_concurrency_limits(self):
+        os.environ['DNS_WORKERS'] = '3'
+        os.environ['SSL_WORKERS'] = '1'
+
+        lock = threading.Lock()
+        running = {'SSL': 0}
+        peaks = {'SSL': 0}
+
+        class TrackingSSLManager(MockSSLManager):
+            def update(self, subdomain):
+                with lock:
+                    running['SSL'] += 1
+                    peaks['SSL'] = max(peaks['SSL'], running['SSL'])
+
+                try:
+                    time.sleep(0.01)
+                    return super(TrackingSSLManager, self).update(subdomain)
+
+                finally:
+                    with lock:
+                        running['SSL'] -= 1
+
+        self.discovery = MockDiscovery(*('sub%d' % idx for idx in range(12)))
+        dns = NativeAsyncDNSManager()
+
+        check_all(self.discovery, dns, TrackingSSLManager(), self.notifications)
+
+        self.assertEqual(dns.peak, 3)
+        self.assertEqual(peaks['SSL'], 1)
+        self.assertEqual(len(self.notifications.events), 24)
+
+    def test_default_limits_follow_the_executor(self):
+        os.environ['ASYNC_EXECUTOR_WORKERS'] = '4'
+
+        lock = threading.Lock()
+        running = {'SSL': 0}
+        peaks = {'SSL': 0}
+
+        class TrackingSSLManager(MockSSLManager):
+            def update(self, subdomain):
+                with lock:
+                    running['SSL'] += 1
+                    peaks['SSL'] = max(peaks['SSL'], running['SSL'])
+
+                try:
+                    time.sleep(0.05)
+                    return super(TrackingSSLManager, self).update(subdomain)
+
+                finally:
+                    with lock:
+                        running['SSL'] -= 1
+
+        self.discovery = MockDiscovery(*('sub%d' % idx for idx in range(12)))
+
+        check_all(self.discovery, NativeAsyncDNSManager(), TrackingSSLManager(), self.notifications)
+
+        self.assertEqual(peaks['SSL'], 4)
+        self.assertEqual(len(self.notifications.events), 24)
+
+    def test_runner_is_reused(self):
+        check_all(self.discovery, self.dns, self.ssl, self.notifications)
+
+        runner = get_runner()
+
+        check_all(self.discovery, self.dns, self.ssl, self.notifications)
+
+        self.assertIs(get_runner(), runner)
+        self.assertTrue(runner.loop.is_running())
+        self.assertEqual(runner.executor.submit(lambda: 'still open').result(), 'still open')
+
+        shutdown()
+
+        self.assertTrue(runner.loop.is_closed())
+        self.assertIsNot(get_runner(), runner)
+
+    def test_shutdown_cancels_running_checks(self):
+        class SlowDNSManager(NativeAsyncDNSManager):
+            async def update(self, subdomain, public_ip):
+                await asyncio.sleep(30)
+
+        thread = threading.Thread(
+            target=check_all, args=(self.discovery, SlowDNSManager(), self.ssl, self.notifications)
+        )
+        thread.start()
+
+        time.sleep(0.1)
+
+        runner = get_runner()
+
+        shutdown()
+
+        thread.join(timeout=5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(runner.loop.is_closed())
+
+    def test_shutdown_on_exit(self):
+        os.environ['CHECK_ENGINE'] = 'asyncio'
+
+        signals = dict()
+        original_signal = app.signal.signal
+        app.signal.signal = lambda signal, func: signals.__setitem__(signal, func)
+
+        class MockScheduler(object):
+            def cancel(self):
+                pass
+
+        try:
+            app.setup_signals(MockScheduler(), self.notifications, None)
+
+        finally:
+            app.signal.signal = original_signal
+
+        check_all(self.discovery, self.dns, self.ssl, self.notifications)
+
+        runner = get_runner()
+
+        signals[app.signal.SIGTERM](app.signal.SIGTERM)
+
+        self.assertTrue(runner.loop.is_closed())
+        self.assertIn(('Message', 'Application exiting'), self.notifications.events)
+
+    def test_reconciliation(self):
+        class ReconcilingDNSManager(MockDNSManager):
+            supports_reconcile = True
+
+            def reconcile(self, subdomains, public_ip):
+                plan = ReconciliationPlan(public_ip)
+
+                for subdomain in subdomains:
+                    plan.add_result(subdomain, 'Batched')
+
+                return plan
+
+        check_all(self.discovery, ReconcilingDNSManager(), self.ssl, self.notifications)
+
+        self.assertIn(('DNS', 'www', 'Batched'), self.notifications.events)
+        self.assertIn(('DNS', 'test', 'Batched'), self.notifications.events)
+        self.assertEqual(len(self.notifications.events), 4)
+
+    def test_batch_ssl_updates(self):
+        class BatchingSSLManager(MockSSLManager):
+            batch_updates = True
+
+            def group_subdomains(self, subdomains):
+                return [('certificate', list(subdomains))]
+
+            def update_group(self, certificate, subdomains):
+                return 'Batched %d' % len(subdomains)
+
+        check_all(self.discovery, self.dns, BatchingSSLManager(), self.notifications)
+
+        self.assertIn(('DNS', 'www', 'OK'), self.notifications.events)
+        self.assertIn(('SSL', 'www', 'Batched 2'), self.notifications.events)
+        self.assertIn(('SSL', 'test', 'Batched 2'), self.notifications.events)
+        self.assertEqual(len(self.notifications.events), 4)
+
+    def test_partial_check(self):
+        check_all(
+            self.discovery, self.dns, self.ssl, self.notifications,
+            subdomains=[self.discovery.subdomains[0]]
+        )
+
+        self.assertEqual(sorted(self.notifications.events), [('DNS', 'www', 'OK'), ('SSL', 'www', 'Updated')])
+        self.assertEqual(self.discovery.subdomains[1].current_ip, '1.1.1.1')
+
+    def test_adapters(self):
+        self.assertIsInstance(as_async_dns_manager(self.dns), ExecutorDNSManager)
+
+        native = NativeAsyncDNSManager()
+        self.assertIs(as_async_dns_manager(native), native)
+
+    def test_engine_selection(self):
+        self.assertIs(app.get_check_function(), app.check_all)
+
+        os.environ['CHECK_ENGINE'] = 'asyncio'
+
+        self.assertIs(app.get_check_function(), check_all)
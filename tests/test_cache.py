@@ -0,0 +1,119 @@
+import unittest
+
+import cache
+
+from state.memory import MemoryStateStore
+
+from metrics import cache_hits, cache_misses, cache_expired, cache_evicted
+
+
+class MockTime(object):
+    def __init__(self):
+        self.current = 1000.0
+
+    def time(self):
+        return self.current
+
+
+class TTLCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.original_time = cache.time
+        self.clock = MockTime()
+        cache.time = self.clock
+
+    def tearDown(self):
+        cache.time = self.original_time
+
+    def test_get_and_put(self):
+        items = cache.TTLCache('unittest_basic', ttl=60)
+
+        self.assertIsNone(items.get('key'))
+        self.assertEqual(items.get('key', 'default'), 'default')
+
+        items.put('key', 'value')
+        items.put('empty', None)
+
+        self.assertEqual(items.get('key'), 'value')
+        self.assertIsNone(items.get('empty', 'default'))
+        self.assertEqual(len(items), 2)
+
+        self.assertEqual(items.pop('key'), 'value')
+        self.assertIsNone(items.get('key'))
+
+    def test_expiry(self):
+        items = cache.TTLCache('unittest_expiry', ttl=60)
+
+        items.put('key', 'value')
+
+        self.clock.current += 59
+
+        self.assertEqual(items.get('key'), 'value')
+
+        self.clock.current += 1
+
+        self.assertIsNone(items.get('key'))
+        self.assertEqual(len(items), 0)
+
+        self.assertEqual(self._metric(cache_hits, 'unittest_expiry'), 1)
+        self.assertEqual(self._metric(cache_misses, 'unittest_expiry'), 1)
+        self.assertEqual(self._metric(cache_expired, 'unittest_expiry'), 1)
+
+    def test_size_limit(self):
+        items = cache.TTLCache('unittest_size', ttl=60, max_size=3)
+
+        for idx in range(5):
+            items.put('key-%d' % idx, idx)
+
+        self.assertEqual(len(items), 3)
+        self.assertIsNone(items.get('key-0'))
+        self.assertIsNone(items.get('key-1'))
+        self.assertEqual(items.get('key-4'), 4)
+
+        self.assertEqual(self._metric(cache_evicted, 'unittest_size'), 2)
+
+    def test_invalidate_all(self):
+        first = cache.TTLCache('unittest_first', ttl=60)
+        second = cache.TTLCache('unittest_second', ttl=60)
+
+        first.put('key', 1)
+        second.put('key', 2)
+
+        cache.invalidate_all()
+
+        self.assertIsNone(first.get('key'))
+        self.assertIsNone(second.get('key'))
+
+    @staticmethod
+    def _metric(counter, name):
+        return counter.labels(name)._value.get()
+
+    def test_persistence(self):
+        store = MemoryStateStore()
+
+        items = cache.TTLCache('unittest_persistent', ttl=60, store=store)
+        items.put(('zone', 'name'), {'id': 'x'})
+        items.put('other', 'value')
+
+        restarted = cache.TTLCache('unittest_persistent', ttl=60, store=store)
+
+        self.assertEqual(restarted.get(('zone', 'name')), {'id': 'x'})
+
+        restarted.replace(('zone', 'name'), {'id': 'y'})
+        restarted.pop('other')
+
+        restarted = cache.TTLCache('unittest_persistent', ttl=60, store=store)
+
+        self.assertEqual(restarted.get(('zone', 'name')), {'id': 'y'})
+        self.assertIsNone(restarted.get('other'))
+
+        self.clock.current += 60
+
+        restarted = cache.TTLCache('unittest_persistent', ttl=60, store=store)
+
+        self.assertIsNone(restarted.get(('zone', 'name')))
+        self.assertEqual(store.items('cache:unittest_persistent'), [])
+
+        items.put('key', 'value')
+        items.clear()
+
+        self.assertEqual(store.items('cache:unittest_persistent'), [])
@@ -1,10 +1,20 @@
 import os
+import shutil
+import tempfile
 import unittest
-import subprocess
 
 from datetime import datetime, timedelta
 
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+import factories
+
 from config import Subdomain
+from state.memory import MemoryStateStore
 from ssl_manager.certbot_cf_ssl import CertbotCloudflareSSLManager
 
 
@@ -25,19 +35,65 @@ class CertbotCloudflareSSLManagerTest(unittest.TestCase):
         os.environ['CLOUDFLARE_TOKEN'] = 'cf001234'
         os.environ['CERTBOT_STAGING'] = 'no'
 
+        self.config_dir = tempfile.mkdtemp()
+        os.environ['CERTBOT_CONFIG_DIR'] = self.config_dir
+
+        self.original_get_state_store = factories.get_state_store
+        self.store = MemoryStateStore()
+        factories.get_state_store = lambda: self.store
+
         self.manager = CertbotCloudflareSSLManager()
-        self.manager.subprocess_run = self._mock_subprocess_run
+        self.manager.stream_process = self._mock_stream_process
 
-    def _mock_subprocess_run(self, popen_args, **kwargs):
+    def _mock_stream_process(self, command, timeout, process_line):
         result = self.mock_result
-        result.args = popen_args
-        result.kwargs = kwargs
-        return result
-    
+        result.args = command
+        result.kwargs = dict(timeout=timeout)
+
+        for line in (result.stderr + '\n' + result.stdout).splitlines(True):
+            process_line(line)
+
+        return result.returncode
+
     def tearDown(self):
         del os.environ['CLOUDFLARE_EMAIL']
         del os.environ['CLOUDFLARE_TOKEN']
         del os.environ['CERTBOT_STAGING']
+        del os.environ['CERTBOT_CONFIG_DIR']
+
+        shutil.rmtree(self.config_dir)
+
+        factories.get_state_store = self.original_get_state_store
+
+    def _write_certificate(self, name, expires_in, alt_names=None):
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])
+
+        builder = x509.CertificateBuilder() \
+            .subject_name(subject).issuer_name(subject) \
+            .public_key(key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(datetime.utcnow() - timedelta(days=1)) \
+            .not_valid_after(datetime.utcnow() + expires_in)
+
+        if alt_names:
+            builder = builder.add_extension(
+                x509.SubjectAlternativeName([x509.DNSName(alt) for alt in alt_names]), critical=False
+            )
+
+        certificate = builder.sign(key, hashes.SHA256(), default_backend())
+
+        live_dir = os.path.join(self.config_dir, 'live', name)
+
+        if not os.path.exists(live_dir):
+            os.makedirs(live_dir)
+
+        path = os.path.join(live_dir, 'cert.pem')
+
+        with open(path, 'wb') as cert_file:
+            cert_file.write(certificate.public_bytes(serialization.Encoding.PEM))
+
+        os.utime(path, (0, expires_in.total_seconds()))
 
     def test_new_certificate(self):
         self.mock_result.stdout = 'Congratulations! It worked!'
@@ -55,9 +111,7 @@ class CertbotCloudflareSSLManagerTest(unittest.TestCase):
         self.assertIn('--dns-cloudflare-propagation-seconds 30', ' '.join(self.mock_result.args))
 
         self.assertIn(('timeout', 120), self.mock_result.kwargs.items())
-        self.assertIn(('stdout', subprocess.PIPE), self.mock_result.kwargs.items())
-        self.assertIn(('stderr', subprocess.PIPE), self.mock_result.kwargs.items())
-        
+
         self.assertNotIn('--staging', self.mock_result.args)
 
     def test_existing_certificate(self):
@@ -128,3 +182,224 @@ class CertbotCloudflareSSLManagerTest(unittest.TestCase):
 
         self.assertEqual(result, 'Failed with exit code: 1')
 
+    def test_certificate_expiry(self):
+        valid = Subdomain('valid', 'unit.test')
+        expiring = Subdomain('expiring', 'unit.test')
+        missing = Subdomain('missing', 'unit.test')
+
+        self._write_certificate(valid.full, timedelta(days=60))
+        self._write_certificate(expiring.full, timedelta(days=10))
+
+        expiry = self.manager.get_certificate_expiry(valid)
+
+        self.assertIsNotNone(expiry)
+        self.assertGreater(expiry, datetime.utcnow() + timedelta(days=59))
+        self.assertIsNone(self.manager.get_certificate_expiry(missing))
+
+        self.assertFalse(self.manager.needs_update(valid))
+        self.assertTrue(self.manager.needs_update(expiring))
+        self.assertTrue(self.manager.needs_update(missing))
+
+    def test_renewal_window(self):
+        subdomain = Subdomain('window', 'unit.test')
+
+        self._write_certificate(subdomain.full, timedelta(days=20))
+
+        self.assertTrue(self.manager.needs_update(subdomain))
+
+        self.manager.renewal_window = timedelta(days=14)
+
+        self.assertFalse(self.manager.needs_update(subdomain))
+
+    def test_forced_renewal_inside_renewal_window(self):
+        self.mock_result.stdout = 'Congratulations! It worked!'
+        self.mock_result.stderr = 'Renewing an existing certificate'
+
+        subdomain = Subdomain('forced', 'unit.test')
+
+        self._write_certificate(subdomain.full, timedelta(days=45), [subdomain.full])
+
+        self.assertFalse(self.manager.needs_update(subdomain))
+
+        self.manager.renewal_window = timedelta(days=60)
+
+        self.assertTrue(self.manager.needs_update(subdomain))
+        self.assertEqual(self.manager.update(subdomain), 'OK, renewed')
+
+        self.assertIn('certbot certonly -n --force-renewal', ' '.join(self.mock_result.args))
+        self.assertNotIn('--keep', self.mock_result.args)
+
+    def test_throttle_inside_renewal_window(self):
+        self.mock_result.stdout = 'Maybe Certbot got updated'
+        subdomain = Subdomain('throttled', 'unit.test')
+
+        self._write_certificate(subdomain.full, timedelta(days=5))
+
+        self.assertTrue(self.manager.needs_update(subdomain))
+        self.manager.update(subdomain)
+        self.assertFalse(self.manager.needs_update(subdomain))
+
+    def test_renewed_certificate_is_reloaded(self):
+        subdomain = Subdomain('renewed', 'unit.test')
+
+        self._write_certificate(subdomain.full, timedelta(days=5))
+        self.assertTrue(self.manager.needs_update(subdomain))
+
+        self._write_certificate(subdomain.full, timedelta(days=90))
+        self.assertFalse(self.manager.needs_update(subdomain))
+
+    def test_state_survives_restarts(self):
+        self.mock_result.stdout = 'Maybe Certbot got updated'
+        subdomain = Subdomain('restarted', 'unit.test')
+
+        self.assertTrue(self.manager.needs_update(subdomain))
+        self.manager.update(subdomain)
+
+        restarted = CertbotCloudflareSSLManager()
+
+        self.assertFalse(restarted.needs_update(subdomain))
+        self.assertEqual(restarted.last_result.get(subdomain.full), 'Unknown')
+
+    def test_batch_groups(self):
+        self.manager.use_batches = True
+        self.manager.batch_size = 2
+
+        subdomains = [
+            Subdomain('www', 'first.test'), Subdomain('api', 'first.test'),
+            Subdomain('docs', 'first.test'), Subdomain('www', 'second.test'),
+            Subdomain('one', 'second.test', group='labelled'),
+            Subdomain('two', 'first.test', group='labelled')
+        ]
+
+        groups = self.manager.group_subdomains(subdomains)
+
+        self.assertEqual(
+            [(certificate, [s.full for s in members]) for certificate, members in groups], [
+                ('first.test', ['api.first.test', 'docs.first.test']),
+                ('first.test-2', ['www.first.test']),
+                ('second.test', ['www.second.test']),
+                ('labelled', ['one.second.test', 'two.first.test'])
+            ]
+        )
+
+    def test_batch_membership_is_stable(self):
+        self.manager.use_batches = True
+        self.manager.batch_size = 2
+
+        def grouped(names):
+            groups = self.manager.group_subdomains([Subdomain(name, 'stable.test') for name in names])
+            return [(certificate, [s.name for s in members]) for certificate, members in groups]
+
+        self.assertEqual(grouped(['a', 'b', 'c', 'd']), [
+            ('stable.test', ['a', 'b']), ('stable.test-2', ['c', 'd'])
+        ])
+
+        self.assertEqual(grouped(['a', 'aa', 'b', 'c', 'd']), [
+            ('stable.test', ['a', 'b']), ('stable.test-2', ['c', 'd']), ('stable.test-3', ['aa'])
+        ])
+
+        self.assertEqual(grouped(['aa', 'b', 'c', 'd', 'e']), [
+            ('stable.test', ['b', 'e']), ('stable.test-2', ['c', 'd']), ('stable.test-3', ['aa'])
+        ])
+
+        restarted = CertbotCloudflareSSLManager()
+
+        self.assertEqual(restarted._certificate_name(Subdomain('c', 'stable.test')), 'stable.test-2')
+
+        restarted.use_batches = True
+        restarted.batch_size = 2
+
+        groups = restarted.group_subdomains([Subdomain(name, 'stable.test') for name in ('d', 'aa', 'f')])
+
+        self.assertEqual([(certificate, [s.name for s in members]) for certificate, members in groups], [
+            ('stable.test-2', ['d', 'f']), ('stable.test-3', ['aa'])
+        ])
+
+    def test_batch_size_is_limited(self):
+        os.environ['CERTBOT_BATCH_SIZE'] = '500'
+        self.addCleanup(os.environ.pop, 'CERTBOT_BATCH_SIZE')
+
+        self.assertEqual(CertbotCloudflareSSLManager().batch_size, 100)
+
+    def test_batch_update(self):
+        self.mock_result.stdout = 'Congratulations! It worked!'
+        self.mock_result.stderr = 'Obtaining a new certificate'
+
+        self.manager.use_batches = True
+
+        subdomains = [Subdomain('www', 'batch.test'), Subdomain('api', 'batch.test')]
+        (certificate, members), = self.manager.group_subdomains(subdomains)
+
+        self.assertTrue(self.manager.needs_update_group(certificate, members))
+
+        result = self.manager.update_group(certificate, members)
+
+        self.assertEqual(result, 'OK, new certificate')
+        self.assertIn(
+            '-n --keep --cert-name batch.test -d api.batch.test -d www.batch.test',
+            ' '.join(self.mock_result.args)
+        )
+
+        self.assertFalse(self.manager.needs_update_group(certificate, members))
+
+        self._write_certificate(certificate, timedelta(days=90), ['api.batch.test', 'www.batch.test'])
+
+        self.assertFalse(self.manager.needs_update_group(certificate, members))
+        self.assertFalse(self.manager.needs_update(subdomains[0]))
+        self.assertIsNotNone(self.manager.get_certificate_expiry(subdomains[0]))
+
+        extended = subdomains + [Subdomain('new', 'batch.test')]
+        (certificate, members), = self.manager.group_subdomains(extended)
+
+        self.assertTrue(self.manager.needs_update_group(certificate, members))
+
+    def test_wildcard_groups(self):
+        self.manager.use_wildcards = True
+
+        subdomains = [
+            Subdomain('www', 'first.test'), Subdomain('', 'first.test'),
+            Subdomain('deep.api', 'first.test'), Subdomain('www', 'second.test')
+        ]
+
+        groups = self.manager.group_subdomains(subdomains)
+
+        self.assertEqual(
+            [(certificate, [s.full for s in members]) for certificate, members in groups], [
+                ('first.test', ['www.first.test', 'first.test']),
+                ('second.test', ['www.second.test']),
+                ('deep.api.first.test', ['deep.api.first.test'])
+            ]
+        )
+
+        self.manager.use_batches = True
+
+        groups = self.manager.group_subdomains(subdomains)
+
+        self.assertEqual(
+            [certificate for certificate, _ in groups],
+            ['first.test', 'second.test', 'first.test-names']
+        )
+
+    def test_wildcard_update(self):
+        self.mock_result.stdout = 'Congratulations! It worked!'
+        self.mock_result.stderr = 'Obtaining a new certificate'
+
+        self.manager.use_wildcards = True
+
+        subdomains = [Subdomain('www', 'wildcard.test'), Subdomain('api', 'wildcard.test')]
+        (certificate, members), = self.manager.group_subdomains(subdomains)
+
+        self.assertTrue(self.manager.needs_update_group(certificate, members))
+        self.assertEqual(self.manager.update_group(certificate, members), 'OK, new certificate')
+        self.assertIn(
+            '--cert-name wildcard.test -d wildcard.test -d *.wildcard.test',
+            ' '.join(self.mock_result.args)
+        )
+
+        self._write_certificate(certificate, timedelta(days=90), ['wildcard.test', '*.wildcard.test'])
+
+        self.assertFalse(self.manager.needs_update(Subdomain('new', 'wildcard.test')))
+        self.assertFalse(self.manager.needs_update_group(
+            certificate, members + [Subdomain('other', 'wildcard.test')]
+        ))
+        self.assertIsNotNone(self.manager.get_certificate_expiry(Subdomain('new', 'wildcard.test')))
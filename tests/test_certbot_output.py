@@ -0,0 +1,119 @@
+import unittest
+
+from datetime import datetime
+
+from ssl_manager import SSLResult
+from ssl_manager.certbot_output import CertbotOutputParser
+
+
+CERTBOT_0_X_NEW = '''Saving debug log to /var/log/letsencrypt/letsencrypt.log
+Plugins selected: Authenticator dns-cloudflare, Installer None
+Obtaining a new certificate
+Performing the following challenges:
+dns-01 challenge for www.unit.test
+Waiting 30 seconds for DNS changes to propagate
+Waiting for verification...
+Cleaning up challenges
+
+IMPORTANT NOTES:
+ - Congratulations! Your certificate and chain have been saved at:
+   /etc/letsencrypt/live/www.unit.test/fullchain.pem
+   Your key file has been saved at:
+   /etc/letsencrypt/live/www.unit.test/privkey.pem
+   Your cert will expire on 2027-01-15. To obtain a new or tweaked
+   version of this certificate in the future, simply run certbot
+'''
+
+CERTBOT_0_X_RENEWED = '''Saving debug log to /var/log/letsencrypt/letsencrypt.log
+Renewing an existing certificate
+Performing the following challenges:
+dns-01 challenge for api.unit.test
+
+IMPORTANT NOTES:
+ - Congratulations! Your certificate and chain have been saved at:
+   /etc/letsencrypt/live/api.unit.test/fullchain.pem
+   Your cert will expire on 2027-02-01. To obtain a new or tweaked
+'''
+
+CERTBOT_2_X_NEW = '''Saving debug log to /var/log/letsencrypt/letsencrypt.log
+Requesting a certificate for www.unit.test and api.unit.test
+Waiting 30 seconds for DNS changes to propagate
+
+Successfully received certificate.
+Certificate is saved at: /etc/letsencrypt/live/unit.test/fullchain.pem
+Key is saved at:         /etc/letsencrypt/live/unit.test/privkey.pem
+This certificate expires on 2027-03-10.
+These files will be updated when the certificate renews.
+'''
+
+CERTBOT_NOT_DUE = '''Saving debug log to /var/log/letsencrypt/letsencrypt.log
+Certificate not yet due for renewal
+'''
+
+
+class CertbotOutputParserTest(unittest.TestCase):
+    def _parse(self, output, returncode=0):
+        parser = CertbotOutputParser('www.unit.test', ['www.unit.test'])
+
+        for line in output.splitlines(True):
+            parser.feed(line)
+
+        return parser, parser.result(returncode, duration=1.5)
+
+    def test_new_certificate(self):
+        parser, result = self._parse(CERTBOT_0_X_NEW)
+
+        self.assertEqual(result, 'OK, new certificate')
+        self.assertEqual(result.status, SSLResult.NEW)
+        self.assertEqual(result.certificate, '/etc/letsencrypt/live/www.unit.test/fullchain.pem')
+        self.assertEqual(result.names, ('www.unit.test',))
+        self.assertEqual(result.expiry, datetime(2027, 1, 15))
+        self.assertEqual(result.duration, 1.5)
+        self.assertTrue(parser.finished)
+
+    def test_renewed_certificate(self):
+        _, result = self._parse(CERTBOT_0_X_RENEWED)
+
+        self.assertEqual(result, 'OK, renewed')
+        self.assertEqual(result.status, SSLResult.RENEWED)
+        self.assertEqual(result.expiry, datetime(2027, 2, 1))
+
+    def test_new_output_format(self):
+        _, result = self._parse(CERTBOT_2_X_NEW)
+
+        self.assertEqual(result, 'OK, new certificate')
+        self.assertEqual(result.certificate, '/etc/letsencrypt/live/unit.test/fullchain.pem')
+        self.assertEqual(result.expiry, datetime(2027, 3, 10))
+        self.assertEqual(result.summary(), 'OK, new certificate (expires on 2027-03-10)')
+
+    def test_not_yet_due(self):
+        _, result = self._parse(CERTBOT_NOT_DUE)
+
+        self.assertEqual(result, 'Not yet due for renewal')
+        self.assertEqual(result.status, SSLResult.NOT_DUE)
+        self.assertEqual(result.certificate, 'www.unit.test')
+        self.assertFalse(result.successful)
+
+    def test_successful_without_known_kind(self):
+        _, result = self._parse('Congratulations! It worked!\n')
+
+        self.assertEqual(result, 'OK')
+        self.assertEqual(result.status, SSLResult.UPDATED)
+
+    def test_failure_keeps_recent_lines(self):
+        parser = CertbotOutputParser(history=3)
+
+        for index in range(10):
+            parser.feed('line %d\n' % index)
+
+        result = parser.result(1)
+
+        self.assertEqual(result, 'Failed with exit code: 1')
+        self.assertEqual(result.status, SSLResult.FAILED)
+        self.assertEqual(list(parser.lines), ['line 7', 'line 8', 'line 9'])
+
+    def test_unknown_output(self):
+        _, result = self._parse('Maybe Certbot got updated\n')
+
+        self.assertEqual(result, 'Unknown')
+        self.assertEqual(result.status, SSLResult.UNKNOWN)
@@ -0,0 +1,229 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import factories
+
+from config import Subdomain
+from state.memory import MemoryStateStore
+from ssl_manager.certbot_parallel import ParallelCertbotCloudflareSSLManager
+
+
+class MockCertbot(object):
+    def __init__(self):
+        self.commands = list()
+        self.credentials = list()
+        self.registrations = list()
+        self.running = 0
+        self.peak = 0
+        self.returncode = 0
+        self._lock = threading.Lock()
+
+    def run(self, command, timeout, process_line):
+        with self._lock:
+            self.commands.append(command)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+        try:
+            options = dict(zip(command, command[1:]))
+
+            with open(options['--dns-cloudflare-credentials']) as credentials:
+                self.credentials.append((options['--dns-cloudflare-credentials'], credentials.read()))
+
+            time.sleep(0.02)
+
+            if self.returncode:
+                process_line('An unexpected error occurred\n')
+                return self.returncode
+
+            process_line('Obtaining a new certificate\n')
+
+            self._register(options['--config-dir'], options['--cert-name'])
+            self._issue(options['--config-dir'], options['--cert-name'])
+
+            process_line('Congratulations!\n')
+
+            return 0
+
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def _register(self, config_dir, lineage):
+        accounts = os.path.join(config_dir, 'accounts', 'acme-v02', 'directory')
+
+        if os.path.isdir(accounts) and os.listdir(accounts):
+            return
+
+        account = os.path.join(accounts, 'account-%s' % lineage)
+        os.makedirs(account)
+
+        with open(os.path.join(account, 'regr.json'), 'w') as account_file:
+            account_file.write(lineage)
+
+        with self._lock:
+            self.registrations.append(lineage)
+
+    @staticmethod
+    def _issue(config_dir, lineage):
+        archive = os.path.join(config_dir, 'archive', lineage)
+        live = os.path.join(config_dir, 'live', lineage)
+
+        for folder in (archive, live, os.path.join(config_dir, 'renewal')):
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+
+        version = len(os.listdir(archive)) + 1
+
+        with open(os.path.join(archive, 'cert%d.pem' % version), 'w') as cert_file:
+            cert_file.write('certificate %d' % version)
+
+        link = os.path.join(live, 'cert.pem')
+
+        if os.path.lexists(link):
+            os.remove(link)
+
+        os.symlink(os.path.join('..', '..', 'archive', lineage, 'cert%d.pem' % version), link)
+
+        with open(os.path.join(config_dir, 'renewal', '%s.conf' % lineage), 'w') as renewal_file:
+            renewal_file.write('archive_dir = %s\n' % archive)
+            renewal_file.write('cert = %s\n' % link)
+
+
+class ParallelCertbotTest(unittest.TestCase):
+    def setUp(self):
+        os.environ['CLOUDFLARE_EMAIL'] = 'unittest@cf.com'
+        os.environ['CLOUDFLARE_TOKEN'] = 'cf001234'
+        os.environ['CERTBOT_PARALLEL_RUNS'] = '2'
+
+        self.config_dir = tempfile.mkdtemp()
+        os.environ['CERTBOT_CONFIG_DIR'] = self.config_dir
+
+        self.original_get_state_store = factories.get_state_store
+        factories.get_state_store = lambda: MemoryStateStore()
+
+        self.certbot = MockCertbot()
+
+        self.manager = ParallelCertbotCloudflareSSLManager()
+        self.manager.stream_process = self.certbot.run
+
+    def tearDown(self):
+        for key in ('CLOUDFLARE_EMAIL', 'CLOUDFLARE_TOKEN', 'CERTBOT_PARALLEL_RUNS', 'CERTBOT_CONFIG_DIR'):
+            del os.environ[key]
+
+        shutil.rmtree(self.config_dir)
+
+        factories.get_state_store = self.original_get_state_store
+
+    def _update_all(self, subdomains):
+        results = dict()
+
+        def update(subdomain):
+            results[subdomain.full] = self.manager.update(subdomain)
+
+        threads = [threading.Thread(target=update, args=(subdomain,)) for subdomain in subdomains]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_parallel_runs(self):
+        subdomains = [Subdomain('sub%d' % idx, 'unit.test') for idx in range(6)]
+
+        results = self._update_all(subdomains)
+
+        self.assertEqual(set(results.values()), {'OK, new certificate'})
+        self.assertEqual(self.certbot.peak, 2)
+
+        config_dirs = set(dict(zip(c, c[1:]))['--config-dir'] for c in self.certbot.commands)
+        work_dirs = set(dict(zip(c, c[1:]))['--work-dir'] for c in self.certbot.commands)
+
+        self.assertEqual(len(config_dirs), 6)
+        self.assertEqual(len(work_dirs), 6)
+        self.assertNotIn(self.config_dir, config_dirs)
+
+        self.assertEqual(len(set(path for path, _ in self.certbot.credentials)), 6)
+
+        for _, content in self.certbot.credentials:
+            self.assertIn('dns_cloudflare_api_key = cf001234', content)
+
+        for path in config_dirs | work_dirs:
+            self.assertFalse(os.path.exists(path))
+
+    def test_results_are_merged(self):
+        subdomains = [Subdomain('www', 'unit.test'), Subdomain('api', 'unit.test')]
+
+        self._update_all(subdomains)
+        self._update_all(subdomains[:1])
+
+        for subdomain in subdomains:
+            cert_path = os.path.join(self.config_dir, 'live', subdomain.full, 'cert.pem')
+
+            self.assertTrue(os.path.islink(cert_path))
+
+            with open(os.path.join(self.config_dir, 'renewal', '%s.conf' % subdomain.full)) as renewal:
+                content = renewal.read()
+
+            self.assertIn('archive_dir = %s' % os.path.join(self.config_dir, 'archive', subdomain.full), content)
+            self.assertIn('cert = %s' % cert_path, content)
+
+        self.assertEqual(len(self.certbot.registrations), 1)
+        self.assertEqual(
+            os.listdir(os.path.join(self.config_dir, 'accounts', 'acme-v02', 'directory')),
+            ['account-%s' % self.certbot.registrations[0]]
+        )
+
+        with open(os.path.join(self.config_dir, 'live', 'www.unit.test', 'cert.pem')) as cert_file:
+            self.assertEqual(cert_file.read(), 'certificate 2')
+
+        with open(os.path.join(self.config_dir, 'live', 'api.unit.test', 'cert.pem')) as cert_file:
+            self.assertEqual(cert_file.read(), 'certificate 1')
+
+    def test_single_account_on_cold_start(self):
+        results = self._update_all([Subdomain('sub%d' % idx, 'unit.test') for idx in range(4)])
+
+        self.assertEqual(set(results.values()), {'OK, new certificate'})
+        self.assertEqual(len(self.certbot.registrations), 1)
+
+        self.certbot.peak = 0
+
+        # once the account exists, the runs can go in parallel again
+        results = self._update_all([Subdomain('sub%d' % idx, 'unit.test') for idx in range(4, 8)])
+
+        self.assertEqual(set(results.values()), {'OK, new certificate'})
+        self.assertEqual(len(self.certbot.registrations), 1)
+        self.assertEqual(self.certbot.peak, 2)
+
+        accounts = os.path.join(self.config_dir, 'accounts', 'acme-v02', 'directory')
+
+        self.assertEqual(len(os.listdir(accounts)), 1)
+
+    def test_waiting_runs_continue_in_parallel(self):
+        os.environ['CERTBOT_PARALLEL_RUNS'] = '4'
+
+        self.manager = ParallelCertbotCloudflareSSLManager()
+        self.manager.stream_process = self.certbot.run
+
+        results = self._update_all([Subdomain('sub%d' % idx, 'unit.test') for idx in range(4)])
+
+        self.assertEqual(set(results.values()), {'OK, new certificate'})
+        self.assertEqual(len(self.certbot.registrations), 1)
+
+        # the runs waiting for the first one do not hold the account lock once the account exists
+        self.assertGreater(self.certbot.peak, 1)
+
+    def test_failed_runs_are_not_merged(self):
+        self.certbot.returncode = 1
+
+        result = self.manager.update(Subdomain('failing', 'unit.test'))
+
+        self.assertEqual(result, 'Failed with exit code: 1')
+        self.assertFalse(os.path.exists(os.path.join(self.config_dir, 'live')))
@@ -1,33 +1,59 @@
 import unittest
 
+import cache
+import factories
+
 from config import Subdomain
 from dns_manager import cloudflare_dns as cf_dns
+from state.memory import MemoryStateStore
+
+
+class MockTime(object):
+    def __init__(self, current):
+        self.current = current
+
+    def time(self):
+        return self.current
+
 
+class MockResolver(object):
+    def __init__(self, address):
+        self.address = address
 
-class MockRequests(object):
-    status = 200
-    ip_address = '1.1.1.1'
+    def get_public_ip(self):
+        return self.address
 
-    def get(self, *args):
-        class MockResponse(object):
-            @property
-            def status_code(self):
-                return MockRequests.status
 
-            @property
-            def text(self):
-                return MockRequests.ip_address
+def _paginate(items, params, max_per_page=100):
+    params = dict(params or dict())
 
-        return MockResponse()
+    page = params.pop('page', 1)
+    per_page = min(params.pop('per_page', 20), max_per_page)
+
+    matching = list(
+        item for item in items
+        if all(item.get(key) == value for key, value in params.items())
+    )
+
+    return {
+        'result': matching[(page - 1) * per_page:page * per_page],
+        'result_info': {
+            'page': page, 'per_page': per_page, 'total_count': len(matching),
+            'total_pages': (len(matching) + per_page - 1) // per_page
+        }
+    }
 
 
 class MockDnsRecords(object):
     def __init__(self):
         self.base = 'none'
         self.records = dict()
+        self.listings = 0
+        self.max_per_page = 100
 
-    def get(self, zone_id):
-        return self.records.get(zone_id, list())
+    def get(self, zone_id, params=None):
+        self.listings += 1
+        return _paginate(self.records.get(zone_id, list()), params, self.max_per_page)
 
     def post(self, zone_id, data):
         record = {
@@ -45,6 +71,9 @@ class MockDnsRecords(object):
 
         return record
 
+    def delete(self, zone_id, record_id):
+        self.records[zone_id] = [rec for rec in self.records[zone_id] if rec['id'] != record_id]
+
     def put(self, zone_id, record_id, data):
         record = next(rec for rec in self.records[zone_id] if rec['id'] == record_id)
         record['name'] = data['name']
@@ -53,13 +82,29 @@ class MockDnsRecords(object):
         return record
 
 
+class MockBatch(object):
+    def __init__(self, dns_records):
+        self.dns_records = dns_records
+        self.calls = list()
+
+    def post(self, zone_id, data):
+        self.calls.append((zone_id, data))
+
+        return {
+            'posts': [self.dns_records.post(zone_id, item) for item in data['posts']],
+            'puts': [self.dns_records.put(zone_id, item['id'], item) for item in data['puts']]
+        }
+
+
 class MockZones(object):
     def __init__(self):
         self.items = list()
+        self.listings = 0
         self.dns_records = MockDnsRecords()
 
-    def get(self):
-        return self.items
+    def get(self, params=None):
+        self.listings += 1
+        return _paginate(self.items, params)
 
 
 class MockCloudFlare(object):
@@ -69,14 +114,22 @@ class MockCloudFlare(object):
 
 class CloudflareDNSTest(unittest.TestCase):
     def setUp(self):
+        self.original_get_state_store = factories.get_state_store
+        self.store = MemoryStateStore()
+        factories.get_state_store = lambda: self.store
+
         self.manager = cf_dns.CloudflareDNSManager()
-        cf_dns.requests = MockRequests()
+        self.manager.public_ip_resolver = MockResolver('1.1.1.1')
 
         self.cf = MockCloudFlare()
         self.manager.cloudflare = self.cf
+        self.manager.cloudflare_pages = self.cf
+
+    def tearDown(self):
+        factories.get_state_store = self.original_get_state_store
 
     def test_public_ip(self):
-        MockRequests.ip_address = '5.6.7.8'
+        self.manager.public_ip_resolver.address = '5.6.7.8'
 
         address = self.manager.get_current_public_ip()
 
@@ -110,3 +163,295 @@ class CloudflareDNSTest(unittest.TestCase):
 
         self.assertEqual('OK, updated [8.8.8.8]', result)
 
+
+    def test_reconcile(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'old.sample.com', 'content': '1.1.1.1'
+        }, {
+            'id': 'r-2', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'same.sample.com', 'content': '8.8.8.8'
+        }]
+
+        subdomains = [
+            Subdomain('old', 'sample.com'),
+            Subdomain('same', 'sample.com'),
+            Subdomain('new', 'sample.com'),
+            Subdomain('missing', 'unknown.com')
+        ]
+
+        plan = self.manager.reconcile(subdomains, '8.8.8.8')
+
+        self.assertEqual(list(s.full for s in plan.creates), ['new.sample.com'])
+        self.assertEqual(list(s.full for s in plan.updates), ['old.sample.com'])
+        self.assertEqual(list(s.full for s in plan.unchanged), ['same.sample.com'])
+
+        results = dict((s.full, result) for s, result in plan.results)
+
+        self.assertEqual(results, {
+            'new.sample.com': 'OK, created [8.8.8.8]',
+            'old.sample.com': 'OK, updated [8.8.8.8]',
+            'missing.unknown.com': 'Failed to find zone'
+        })
+
+    def test_reconcile_in_batch(self):
+        batch = MockBatch(self.cf.zones.dns_records)
+        self.cf.zones.dns_records.batch = batch
+
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'old.sample.com', 'content': '1.1.1.1'
+        }]
+
+        plan = self.manager.reconcile(
+            [Subdomain('old', 'sample.com'), Subdomain('new', 'sample.com')], '8.8.8.8'
+        )
+
+        self.assertEqual(len(batch.calls), 1)
+
+        zone_id, data = batch.calls[0]
+
+        self.assertEqual(zone_id, 'abcd1234')
+        self.assertEqual(list(item['name'] for item in data['posts']), ['new.sample.com'])
+        self.assertEqual(list(item['id'] for item in data['puts']), ['r-1'])
+
+        results = dict((s.full, result) for s, result in plan.results)
+
+        self.assertEqual(results, {
+            'new.sample.com': 'OK, created [8.8.8.8]',
+            'old.sample.com': 'OK, updated [8.8.8.8]'
+        })
+
+    def test_reconcile_without_public_ip(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'old.sample.com', 'content': '1.1.1.1'
+        }]
+
+        plan = self.manager.reconcile([Subdomain('old', 'sample.com')], None)
+
+        self.assertEqual(list((s.full, result) for s, result in plan.results), [
+            ('old.sample.com', 'Failed')
+        ])
+
+    def test_cache_is_kept_after_updates(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-%d' % idx, 'zone_id': 'abcd1234', 'type': 'A',
+            'name': 'sub%d.sample.com' % idx, 'content': '1.1.1.1'
+        } for idx in range(5)]
+
+        for idx in range(5):
+            subdomain = Subdomain('sub%d' % idx, 'sample.com')
+
+            self.assertTrue(self.manager.needs_update(subdomain, '2.2.2.2'))
+            self.assertEqual(self.manager.update(subdomain, '2.2.2.2'), 'OK, updated [2.2.2.2]')
+            self.assertFalse(self.manager.needs_update(subdomain, '2.2.2.2'))
+
+        new_subdomain = Subdomain('new', 'sample.com')
+
+        self.assertTrue(self.manager.needs_update(new_subdomain, '2.2.2.2'))
+        self.assertEqual(self.manager.update(new_subdomain, '2.2.2.2'), 'OK, created [2.2.2.2]')
+        self.assertFalse(self.manager.needs_update(new_subdomain, '2.2.2.2'))
+
+        self.assertEqual(self.cf.zones.dns_records.listings, 1)
+
+    def test_updates_persist_single_records(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-%d' % idx, 'zone_id': 'abcd1234', 'type': 'A',
+            'name': 'sub%d.sample.com' % idx, 'content': '1.1.1.1'
+        } for idx in range(50)]
+
+        subdomain = Subdomain('sub7', 'sample.com')
+
+        self.assertTrue(self.manager.needs_update(subdomain, '2.2.2.2'))
+
+        writes = list()
+        original_put = self.store.put
+
+        def tracking_put(namespace, key, value):
+            writes.append((namespace, key))
+            original_put(namespace, key, value)
+
+        self.store.put = tracking_put
+
+        self.assertEqual(self.manager.update(subdomain, '2.2.2.2'), 'OK, updated [2.2.2.2]')
+
+        self.assertEqual(writes, [('cache:cloudflare_dns_records', '["abcd1234", "sub7.sample.com"]')])
+
+        self.assertIsNone(self.manager.get_current_ip(Subdomain('missing', 'sample.com')))
+        self.assertEqual(self.cf.zones.dns_records.listings, 1)
+
+    def test_cache_survives_restarts(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A',
+            'name': 'test.sample.com', 'content': '1.1.1.1'
+        }]
+
+        subdomain = Subdomain('test', 'sample.com')
+
+        self.assertEqual(self.manager.update(subdomain, '2.2.2.2'), 'OK, updated [2.2.2.2]')
+
+        restarted = cf_dns.CloudflareDNSManager()
+        restarted.cloudflare = self.cf
+        restarted.cloudflare_pages = self.cf
+
+        self.assertFalse(restarted.needs_update(subdomain, '2.2.2.2'))
+
+        self.assertEqual(self.cf.zones.listings, 1)
+        self.assertEqual(self.cf.zones.dns_records.listings, 1)
+
+    def test_txt_records(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+
+        subdomain = Subdomain('www', 'sample.com')
+
+        record = self.manager.create_txt_record(subdomain, '_acme-challenge.www.sample.com', 'token')
+
+        self.assertEqual(record['type'], 'TXT')
+        self.assertEqual(record['content'], 'token')
+        self.assertEqual(len(self.cf.zones.dns_records.records['abcd1234']), 1)
+
+        self.assertIsNone(self.manager.get_current_ip(subdomain))
+
+        self.manager.delete_txt_record(subdomain, record)
+
+        self.assertEqual(self.cf.zones.dns_records.records['abcd1234'], [])
+
+        self.assertRaises(
+            Exception, self.manager.create_txt_record, Subdomain('x', 'unknown.com'), '_acme-challenge.x', 'token'
+        )
+
+    def test_failed_update_invalidates_zone(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'test.sample.com', 'content': '1.1.1.1'
+        }]
+
+        def failing_put(*args, **kwargs):
+            raise Exception('oops')
+
+        self.cf.zones.dns_records.put = failing_put
+
+        subdomain = Subdomain('test', 'sample.com')
+
+        self.assertTrue(self.manager.needs_update(subdomain, '2.2.2.2'))
+        self.assertEqual(self.manager.update(subdomain, '2.2.2.2'), 'Failed to update')
+        self.assertEqual(self.cf.zones.dns_records.listings, 1)
+
+        self.assertTrue(self.manager.needs_update(subdomain, '2.2.2.2'))
+        self.assertEqual(self.cf.zones.dns_records.listings, 2)
+
+    def test_paginated_listing(self):
+        self.manager.page_size = 20
+
+        self.cf.zones.items.extend({
+            'id': 'zone-%d' % idx, 'name': 'sample%d.com' % idx
+        } for idx in range(120))
+        self.cf.zones.dns_records.records['zone-77'] = [{
+            'id': 'r-%d' % idx, 'zone_id': 'zone-77', 'type': 'A',
+            'name': 'sub%d.sample77.com' % idx, 'content': '1.1.%d.1' % idx
+        } for idx in range(50)] + [{
+            'id': 'r-txt', 'zone_id': 'zone-77', 'type': 'TXT',
+            'name': 'sub49.sample77.com', 'content': 'text'
+        }]
+
+        self.assertEqual(self.manager.get_current_ip(Subdomain('sub0', 'sample77.com')), '1.1.0.1')
+        self.assertEqual(self.manager.get_current_ip(Subdomain('sub49', 'sample77.com')), '1.1.49.1')
+        self.assertIsNone(self.manager.get_current_ip(Subdomain('sub50', 'sample77.com')))
+
+        self.assertEqual(self.cf.zones.listings, 3)
+        self.assertEqual(self.cf.zones.dns_records.listings, 3)
+
+    def test_capped_page_size(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-%d' % idx, 'zone_id': 'abcd1234', 'type': 'A',
+            'name': 'sub%d.sample.com' % idx, 'content': '1.1.1.1'
+        } for idx in range(150)]
+
+        # fewer records per page than requested must not end the listing
+        self.cf.zones.dns_records.max_per_page = 40
+
+        self.assertEqual(self.manager.get_current_ip(Subdomain('sub149', 'sample.com')), '1.1.1.1')
+        self.assertEqual(self.cf.zones.dns_records.listings, 4)
+
+        self.assertEqual(self.manager.reconcile([Subdomain('sub120', 'sample.com')], '1.1.1.1').results, [])
+        self.assertEqual(len(self.cf.zones.dns_records.records['abcd1234']), 150)
+
+    def test_lookup_by_name(self):
+        self.manager.lookup_by_name = True
+
+        self.cf.zones.items.extend({
+            'id': 'zone-%d' % idx, 'name': 'sample%d.com' % idx
+        } for idx in range(10))
+        self.cf.zones.dns_records.records['zone-7'] = [{
+            'id': 'r-%d' % idx, 'zone_id': 'zone-7', 'type': 'A',
+            'name': 'sub%d.sample7.com' % idx, 'content': '1.1.%d.1' % idx
+        } for idx in range(10)]
+
+        self.assertEqual(self.manager.get_current_ip(Subdomain('sub3', 'sample7.com')), '1.1.3.1')
+        self.assertEqual(self.manager.get_current_ip(Subdomain('sub3', 'sample7.com')), '1.1.3.1')
+        self.assertIsNone(self.manager.get_current_ip(Subdomain('missing', 'sample7.com')))
+        self.assertIsNone(self.manager.get_current_ip(Subdomain('missing', 'sample7.com')))
+
+        self.assertEqual(self.cf.zones.listings, 1)
+        self.assertEqual(self.cf.zones.dns_records.listings, 2)
+
+        result = self.manager.update(Subdomain('missing', 'sample7.com'), '2.2.2.2')
+
+        self.assertEqual(result, 'OK, created [2.2.2.2]')
+        self.assertEqual(self.manager.get_current_ip(Subdomain('missing', 'sample7.com')), '2.2.2.2')
+        self.assertEqual(self.cf.zones.dns_records.listings, 2)
+
+    def test_cache_expiry(self):
+        self.cf.zones.items.append({
+            'id': 'abcd1234', 'name': 'sample.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'test.sample.com', 'content': '1.1.1.1'
+        }]
+
+        subdomain = Subdomain('test', 'sample.com')
+
+        self.assertEqual(self.manager.get_current_ip(subdomain), '1.1.1.1')
+        self.assertIsNone(self.manager.get_current_ip(Subdomain('test', 'added.com')))
+
+        self.cf.zones.items.append({
+            'id': 'efgh5678', 'name': 'added.com'
+        })
+        self.cf.zones.dns_records.records['abcd1234'] = [{
+            'id': 'r-1', 'zone_id': 'abcd1234', 'type': 'A', 'name': 'test.sample.com', 'content': '2.2.2.2'
+        }]
+
+        self.assertEqual(self.manager.get_current_ip(subdomain), '1.1.1.1')
+        self.assertIsNone(self.manager.get_current_ip(Subdomain('test', 'added.com')))
+
+        original_time = cache.time
+        cache.time = MockTime(original_time.time() + self.manager._zones.ttl)
+
+        self.addCleanup(setattr, cache, 'time', original_time)
+
+        self.assertEqual(self.manager.get_current_ip(subdomain), '2.2.2.2')
+        self.assertEqual(self.manager._get_zone(Subdomain('test', 'added.com')), {
+            'id': 'efgh5678', 'name': 'added.com'
+        })
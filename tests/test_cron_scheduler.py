@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from datetime import datetime
+
+from scheduler.cron import CronExpression, CronScheduler
+
+
+class CronExpressionTest(unittest.TestCase):
+    def assertNext(self, expression, moment, expected):
+        self.assertEqual(CronExpression(expression).next_after(moment), expected)
+
+    def test_every_minute(self):
+        self.assertNext('* * * * *', datetime(2026, 3, 1, 10, 15, 30), datetime(2026, 3, 1, 10, 16))
+
+    def test_steps(self):
+        self.assertNext('*/5 * * * *', datetime(2026, 3, 1, 10, 15), datetime(2026, 3, 1, 10, 20))
+        self.assertNext('*/5 * * * *', datetime(2026, 3, 1, 10, 57), datetime(2026, 3, 1, 11, 0))
+        self.assertNext('10-30/10 * * * *', datetime(2026, 3, 1, 10, 31), datetime(2026, 3, 1, 11, 10))
+        self.assertNext('15/20 * * * *', datetime(2026, 3, 1, 10, 40), datetime(2026, 3, 1, 10, 55))
+
+    def test_lists_and_ranges(self):
+        self.assertNext('0 8,12-13 * * *', datetime(2026, 3, 1, 9, 0), datetime(2026, 3, 1, 12, 0))
+        self.assertNext('0 8,12-13 * * *', datetime(2026, 3, 1, 13, 0), datetime(2026, 3, 2, 8, 0))
+
+    def test_months_and_years(self):
+        self.assertNext('30 4 1 1 *', datetime(2026, 3, 1), datetime(2027, 1, 1, 4, 30))
+        self.assertNext('0 0 29 2 *', datetime(2026, 3, 1), datetime(2028, 2, 29, 0, 0))
+
+    def test_day_of_week(self):
+        # 2026-03-01 is a Sunday
+        self.assertNext('0 9 * * 1', datetime(2026, 3, 1, 12, 0), datetime(2026, 3, 2, 9, 0))
+        self.assertNext('0 9 * * 0', datetime(2026, 3, 2, 12, 0), datetime(2026, 3, 8, 9, 0))
+        self.assertNext('0 9 * * 7', datetime(2026, 3, 2, 12, 0), datetime(2026, 3, 8, 9, 0))
+
+    def test_day_of_month_or_week(self):
+        self.assertNext('0 0 15 * 5', datetime(2026, 3, 1), datetime(2026, 3, 6, 0, 0))
+        self.assertNext('0 0 15 * 5', datetime(2026, 3, 13, 1, 0), datetime(2026, 3, 15, 0, 0))
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '*/0 * * * *',
+                           'a * * * *', '5-1 * * * *', '* * * 13 *', '* * * * 8'):
+            self.assertRaises(ValueError, CronExpression, expression)
+
+    def test_never_matches(self):
+        self.assertRaises(ValueError, CronExpression('0 0 31 2 *').next_after, datetime(2026, 3, 1))
+
+
+class CronSchedulerTest(unittest.TestCase):
+    def tearDown(self):
+        os.environ.pop('SCHEDULER_CRON', None)
+
+    def test_interval(self):
+        os.environ['SCHEDULER_CRON'] = '* * * * *'
+
+        interval = CronScheduler().interval
+
+        self.assertGreater(interval, 0)
+        self.assertLessEqual(interval, 61)
+
+    def test_default_expression(self):
+        interval = CronScheduler().interval
+
+        self.assertGreater(interval, 0)
+        self.assertLessEqual(interval, 5 * 60 + 1)
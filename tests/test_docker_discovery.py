@@ -1,10 +1,25 @@
+import time
 import unittest
+import itertools
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from docker.errors import NotFound
 
 from discovery.docker_labels import DockerLabelsDiscovery
+from discovery.docker_events import EventDrivenDockerLabelsDiscovery
+
+
+_ids = itertools.count(1)
 
 
 class MockService(object):
     def __init__(self, as_dict=None, **labels):
+        self.id = 'service-%d' % next(_ids)
+
         if labels:
             self._labels = dict(labels)
         elif as_dict:
@@ -23,6 +38,8 @@ class MockService(object):
 
 class MockContainer(object):
     def __init__(self, as_dict=None, **labels):
+        self.id = 'container-%d' % next(_ids)
+
         if labels:
             self._labels = dict(labels)
         elif as_dict:
@@ -34,13 +51,59 @@ class MockContainer(object):
     def labels(self):
         return dict(self._labels)
 
+    @property
+    def attrs(self):
+        return {'Id': self.id, 'Labels': dict(self._labels)}
+
+
+class MockEventStream(object):
+    def __init__(self, event_queue):
+        self.event_queue = event_queue
+        self.closed = False
+
+    def __iter__(self):
+        while not self.closed:
+            event = self.event_queue.get()
+
+            if isinstance(event, Exception):
+                raise event
+
+            yield event
+
+    def close(self):
+        self.closed = True
+        self.event_queue.put(dict())
+
+
+class MockCollection(object):
+    def __init__(self, items, list_calls):
+        self.items = items
+        self.list_calls = list_calls
+
+    def list(self, filters=None, **kwargs):
+        self.list_calls.append(dict(kwargs, filters=filters))
+
+        if filters and 'label' in filters:
+            return [item for item in self.items if filters['label'] in item._labels]
+
+        return list(self.items)
+
+    def get(self, object_id):
+        for item in self.items:
+            if item.id == object_id:
+                return item
+
+        raise NotFound('%s not found' % object_id)
+
 
 class MockDockerClient(object):
-    def __init__(self, *items):
-        self.items = list(items)
+    def __init__(self):
         self.services_list = list()
         self.containers_list = list()
         self.swarm_mode = True
+        self.list_calls = list()
+        self.event_queue = Queue()
+        self.event_kwargs = None
 
     def add_all(self, items):
         for item in items:
@@ -51,14 +114,15 @@ class MockDockerClient(object):
 
     @property
     def services(self):
-        return MockDockerClient(*self.services_list)
+        return MockCollection(self.services_list, self.list_calls)
 
     @property
     def containers(self):
-        return MockDockerClient(*self.containers_list)
+        return MockCollection(self.containers_list, self.list_calls)
 
-    def list(self):
-        return self.items
+    def events(self, **kwargs):
+        self.event_kwargs = kwargs
+        return MockEventStream(self.event_queue)
 
     @property
     def swarm(self):
@@ -210,3 +274,158 @@ class DockerDiscoveryTest(unittest.TestCase):
         self.assertEqual(subdomains[0].full, 'first.multi.labels')
         self.assertEqual(subdomains[1].name, 'second')
         self.assertEqual(subdomains[1].full, 'second.multi.labels')
+
+    def test_server_side_filters(self):
+        self.discovery.label_names = ['first.label', 'second.label']
+        self.discovery.default_domain = 'filtered.labels'
+
+        self.client.add_all([
+            MockService({'first.label': 'www', 'second.label': 'www2'}),
+            MockService({'unrelated': 'service'}),
+            MockContainer({'second.label': 'api'}),
+            MockContainer({'first.label': 'docs', 'second.label': 'docs'})
+        ])
+
+        subdomains = list(self.discovery.iter_subdomains())
+
+        self.assertEqual(
+            [subdomain.full for subdomain in subdomains],
+            ['www.filtered.labels', 'www2.filtered.labels', 'docs.filtered.labels', 'api.filtered.labels']
+        )
+
+        self.assertEqual(self.client.list_calls, [
+            {'filters': {'label': 'first.label'}},
+            {'filters': {'label': 'second.label'}},
+            {'filters': {'label': 'first.label'}, 'sparse': True},
+            {'filters': {'label': 'second.label'}, 'sparse': True}
+        ])
+
+    def test_certificate_groups(self):
+        self.discovery.default_domain = 'grouped.certs'
+
+        self.client.add_all([
+            MockService({'discovery.domain.name': 'www,api', 'discovery.domain.certificate': 'web'}),
+            MockContainer({'discovery.domain.name': 'test'})
+        ])
+
+        subdomains = list(self.discovery.iter_subdomains())
+
+        self.assertEqual(len(subdomains), 3)
+        self.assertEqual(subdomains[0].group, 'web')
+        self.assertEqual(subdomains[1].group, 'web')
+        self.assertIsNone(subdomains[2].group)
+
+
+class EventDrivenDockerDiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.client = MockDockerClient()
+        self.discovery = EventDrivenDockerLabelsDiscovery()
+        self.discovery.client = self.client
+        self.discovery.default_domain = 'event.driven'
+
+        self.listings = 0
+        original_iter_labelled = self.discovery._iter_labelled
+
+        def iter_labelled():
+            self.listings += 1
+            return original_iter_labelled()
+
+        self.discovery._iter_labelled = iter_labelled
+
+    def tearDown(self):
+        self.discovery.close()
+
+    def _names(self):
+        return [subdomain.full for subdomain in self.discovery.iter_subdomains()]
+
+    def _send_events(self, *events):
+        for event in events:
+            self.client.event_queue.put(event)
+
+        for _ in range(100):
+            if self.client.event_queue.empty():
+                break
+
+            time.sleep(0.01)
+
+        time.sleep(0.05)
+
+    def test_reads_from_the_index(self):
+        self.client.add_all([
+            MockService({'discovery.domain.name': 'www'}),
+            MockContainer({'discovery.domain.name': 'test'}),
+            MockContainer({'unrelated': 'label'})
+        ])
+
+        self.assertEqual(self._names(), ['www.event.driven', 'test.event.driven'])
+        self.assertEqual(self._names(), ['www.event.driven', 'test.event.driven'])
+
+        self.assertEqual(self.listings, 1)
+        self.assertEqual(self.client.event_kwargs['filters'], {'type': ['container', 'service']})
+
+    def test_container_events(self):
+        container = MockContainer({'discovery.domain.name': 'first'})
+        self.client.add_all([container])
+
+        self.assertEqual(self._names(), ['first.event.driven'])
+
+        self._send_events({
+            'Type': 'container', 'Action': 'start',
+            'Actor': {'ID': 'started', 'Attributes': {'name': 'web', 'discovery.domain.name': 'second'}}
+        }, {
+            'Type': 'container', 'Action': 'die',
+            'Actor': {'ID': container.id, 'Attributes': {'discovery.domain.name': 'first'}}
+        }, {
+            'Type': 'container', 'Action': 'start',
+            'Actor': {'ID': 'no-labels', 'Attributes': {'name': 'other'}}
+        })
+
+        self.assertEqual(self._names(), ['second.event.driven'])
+        self.assertEqual(self.listings, 1)
+
+    def test_service_events(self):
+        self.assertEqual(self._names(), [])
+
+        service = MockService({'discovery.domain.name': 'api', 'discovery.domain.certificate': 'web'})
+        self.client.add_all([service])
+
+        self._send_events({'Type': 'service', 'Action': 'create', 'Actor': {'ID': service.id}})
+
+        subdomains = list(self.discovery.iter_subdomains())
+
+        self.assertEqual([s.full for s in subdomains], ['api.event.driven'])
+        self.assertEqual(subdomains[0].group, 'web')
+
+        service._labels = {'discovery.domain.name': 'api,docs'}
+
+        self._send_events({'Type': 'service', 'Action': 'update', 'Actor': {'ID': service.id}})
+
+        self.assertEqual(self._names(), ['api.event.driven', 'docs.event.driven'])
+
+        self._send_events(
+            {'Type': 'service', 'Action': 'update', 'Actor': {'ID': 'already-gone'}},
+            {'Type': 'service', 'Action': 'remove', 'Actor': {'ID': service.id}}
+        )
+
+        self.assertEqual(self._names(), [])
+        self.assertEqual(self.listings, 1)
+
+    def test_resync_after_stream_failure(self):
+        self.client.add_all([MockContainer({'discovery.domain.name': 'www'})])
+
+        self.assertEqual(self._names(), ['www.event.driven'])
+
+        self.client.add_all([MockContainer({'discovery.domain.name': 'missed'})])
+        self._send_events(IOError('Connection lost'))
+
+        self.assertEqual(self._names(), ['www.event.driven', 'missed.event.driven'])
+        self.assertEqual(self.listings, 2)
+
+    def test_periodic_resync(self):
+        self.discovery.resync_interval = 0
+
+        self._names()
+        time.sleep(0.01)
+        self._names()
+
+        self.assertEqual(self.listings, 2)
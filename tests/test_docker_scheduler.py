@@ -1,13 +1,18 @@
 import time
 import unittest
 
-from scheduler.repeat_docker import DockerAwareScheduler
+import factories
+
+from config import Subdomain
+from discovery.docker_labels import DockerLabelsDiscovery
+from scheduler.repeat_docker import DockerAwareScheduler, DebouncedTrigger
 
 
 class DockerAwareSchedulerTest(unittest.TestCase):
     def setUp(self):
         self.scheduler = DockerAwareScheduler()
         self.scheduler.immediate_start = True
+        self.scheduler.trigger.debounce = 0.05
         self.runs = list()
 
     def test_start_stop(self):
@@ -46,9 +51,230 @@ class DockerAwareSchedulerTest(unittest.TestCase):
         finally:
             self.scheduler.client.events = original_events
 
+    def test_burst_of_events(self):
+        original_events = self.scheduler.client.events
+
+        def no_events(*args, **kwargs):
+            yield None
+
+        def mock_events(*args, **kwargs):
+            for index in range(40):
+                yield {
+                    'scope': 'swarm', 'Action': 'create',
+                    'Type': 'service', 'Actor': {'Attributes': {'name': 'service-%d' % index}}
+                }
+
+            self.scheduler.client.events = no_events
+
+        self.scheduler.client.events = mock_events
+
+        try:
+            self.scheduler.schedule(self.signal)
+
+            time.sleep(0.3)
+
+            self.scheduler.cancel()
+
+            self.assert_events(2)
+
+        finally:
+            self.scheduler.client.events = original_events
+
+    def test_resumes_event_stream(self):
+        original_events = self.scheduler.client.events
+        calls = list()
+
+        service_event = {
+            'Action': 'create', 'Type': 'service', 'time': 1000, 'timeNano': 1000000000001,
+            'Actor': {'Attributes': {'name': 'first'}}
+        }
+
+        def mock_events(*args, **kwargs):
+            calls.append(kwargs)
+
+            if len(calls) == 1:
+                yield service_event
+                raise IOError('Connection lost')
+
+            elif len(calls) == 2:
+                yield service_event
+                yield {
+                    'Action': 'start', 'Type': 'container', 'time': 1001, 'timeNano': 1001000000000,
+                    'Actor': {'Attributes': {'name': 'labelled', 'discovery.domain.name': 'www'}}
+                }
+                yield {
+                    'Action': 'start', 'Type': 'container', 'time': 1002, 'timeNano': 1002000000000,
+                    'Actor': {'Attributes': {'name': 'unlabelled'}}
+                }
+
+        self.scheduler.client.events = mock_events
+        self.scheduler.max_backoff = 0.01
+
+        triggers = list()
+        self.scheduler.trigger.trigger = lambda subdomains: triggers.append(subdomains)
+
+        try:
+            self.scheduler.schedule(self.signal)
+
+            time.sleep(0.2)
+
+            self.scheduler.cancel()
+
+        finally:
+            self.scheduler.client.events = original_events
+
+        self.assertGreaterEqual(len(calls), 3)
+        self.assertEqual(calls[0]['filters'], {
+            'type': ['service', 'container'], 'event': ['create', 'update', 'start']
+        })
+        self.assertEqual(calls[1]['since'], 1000)
+        self.assertEqual(calls[2]['since'], 1002)
+
+        self.assertEqual(len(triggers), 2)
+
+    def test_targeted_triggers(self):
+        discovery = DockerLabelsDiscovery()
+        discovery.default_domain = 'targeted.test'
+
+        original_get_discovery = factories.get_discovery
+        factories.get_discovery = lambda: discovery
+        self.addCleanup(setattr, factories, 'get_discovery', original_get_discovery)
+
+        class MockService(object):
+            attrs = {'Spec': {'Labels': {'discovery.domain.name': 'api,docs'}}}
+
+        class MockServices(object):
+            def get(self, service_id):
+                if service_id != 'service-1':
+                    raise Exception('Not found')
+
+                return MockService()
+
+        class MockClient(object):
+            services = MockServices()
+
+        self.scheduler.client = MockClient()
+
+        triggers = list()
+        self.scheduler.trigger.trigger = lambda subdomains: triggers.append(subdomains)
+
+        self.scheduler.process_event({
+            'Action': 'start', 'Type': 'container',
+            'Actor': {'ID': 'container-1', 'Attributes': {'name': 'web', 'discovery.domain.name': 'www'}}
+        })
+        self.scheduler.process_event({
+            'Action': 'create', 'Type': 'service',
+            'Actor': {'ID': 'service-1', 'Attributes': {'name': 'api'}}
+        })
+        self.scheduler.process_event({
+            'Action': 'update', 'Type': 'service',
+            'Actor': {'ID': 'service-2', 'Attributes': {'name': 'missing'}}
+        })
+
+        self.assertEqual(
+            [None if subdomains is None else [s.full for s in subdomains] for subdomains in triggers],
+            [['www.targeted.test'], ['api.targeted.test', 'docs.targeted.test'], None]
+        )
+
+    def test_partial_runs(self):
+        calls = list()
+
+        self.scheduler.immediate_start = False
+        self.scheduler.trigger.debounce = 0.1
+        self.scheduler.schedule(lambda **kwargs: calls.append(kwargs.get('subdomains')))
+
+        self.scheduler.trigger.trigger([Subdomain('www', 'partial.test')])
+        self.scheduler.trigger.trigger([Subdomain('api', 'partial.test'), Subdomain('www', 'partial.test')])
+
+        time.sleep(0.3)
+
+        self.assertEqual([[s.full for s in subdomains] for subdomains in calls], [
+            ['www.partial.test', 'api.partial.test']
+        ])
+
+        self.scheduler.trigger.trigger([Subdomain('www', 'partial.test')])
+        self.scheduler.trigger.trigger(None)
+
+        time.sleep(0.3)
+
+        self.scheduler.cancel()
+
+        self.assertEqual(len(calls), 2)
+        self.assertIsNone(calls[1])
+
+    def test_cancel_during_backoff(self):
+        original_events = self.scheduler.client.events
+
+        def failing_events(*args, **kwargs):
+            raise IOError('Not available')
+
+        self.scheduler.client.events = failing_events
+        self.scheduler.max_backoff = 60
+
+        try:
+            self.scheduler.schedule(self.signal)
+
+            time.sleep(0.1)
+
+            started = time.time()
+            self.scheduler.cancel()
+
+            self.assertLess(time.time() - started, 1)
+            self.assertFalse(self.scheduler.thread.is_alive())
+
+        finally:
+            self.scheduler.client.events = original_events
+
     def signal(self):
         self.runs.append('run')
 
     def assert_events(self, count):
         self.assertEqual(len(self.runs), count)
         self.assertEqual(self.runs, ['run'] * count)
+
+
+class DebouncedTriggerTest(unittest.TestCase):
+    def setUp(self):
+        self.runs = list()
+        self.trigger = DebouncedTrigger(
+            lambda subdomains: self.runs.append(time.time()), debounce=0.1, max_delay=0.25
+        )
+        self.trigger.start()
+
+    def tearDown(self):
+        self.trigger.cancel()
+
+    def test_coalesces_triggers(self):
+        started = time.time()
+
+        for _ in range(5):
+            self.trigger.trigger()
+            time.sleep(0.02)
+
+        time.sleep(0.3)
+
+        self.assertEqual(len(self.runs), 1)
+        self.assertGreaterEqual(self.runs[0] - started, 0.18)
+
+    def test_maximum_delay(self):
+        started = time.time()
+
+        while time.time() - started < 0.4:
+            self.trigger.trigger()
+            time.sleep(0.02)
+
+        time.sleep(0.2)
+
+        self.assertEqual(len(self.runs), 2)
+        self.assertLess(self.runs[0] - started, 0.3)
+
+    def test_trigger_does_not_block(self):
+        self.trigger.func = lambda subdomains: time.sleep(0.3)
+
+        self.trigger.trigger()
+        time.sleep(0.15)
+
+        started = time.time()
+        self.trigger.trigger()
+
+        self.assertLess(time.time() - started, 0.05)
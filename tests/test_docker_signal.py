@@ -170,6 +170,18 @@ class DockerSignalNotificationTest(unittest.TestCase):
         self.assertEqual(self.client.items[0].killed_with, 'TERM')
         self.assertEqual(self.client.items[1].killed_with, 'KILL')
 
+    def test_signal_once_per_certificate(self):
+        signals = list()
+
+        self.client.swarm_mode = False
+        self.manager._signal = lambda result: signals.append(result)
+
+        self.manager.certificate_updated(
+            'unit.test', [Subdomain('www', 'unit.test'), Subdomain('api', 'unit.test')], 'OK'
+        )
+
+        self.assertEqual(signals, ['OK'])
+
     def test_update_swarm_mode(self):
         self.client.swarm_mode = True
 
@@ -0,0 +1,153 @@
+import json
+import threading
+import unittest
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import requests
+import http_session
+
+from metrics import http_requests_in_flight, http_request_duration
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    responses = list()
+    requests = list()
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._respond(json.loads(self.rfile.read(length).decode()))
+
+    def _respond(self, body=None):
+        MockHandler.requests.append((self.command, self.path, dict(self.headers), body))
+
+        status, headers, text = MockHandler.responses.pop(0) if MockHandler.responses else (200, {}, 'OK')
+
+        self.send_response(status)
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpSessionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), MockHandler)
+        cls.url = 'http://127.0.0.1:%d' % cls.server.server_port
+
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        MockHandler.responses = list()
+        MockHandler.requests = list()
+
+        self.session = http_session.create_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_pooled_requests(self):
+        for _ in range(3):
+            response = self.session.get(self.url + '/test')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.text, 'OK')
+
+        self.assertEqual(len(MockHandler.requests), 3)
+
+        self.assertEqual(http_requests_in_flight.labels('127.0.0.1')._value.get(), 0)
+        self.assertGreaterEqual(self._observations('127.0.0.1'), 3)
+
+    def test_retries(self):
+        MockHandler.responses = [
+            (503, {}, 'Unavailable'),
+            (502, {}, 'Bad gateway'),
+            (200, {}, 'Finally')
+        ]
+
+        self.session.mount('http://', http_session.InstrumentedAdapter(
+            default_timeout=5, host_timeouts=dict(),
+            max_retries=http_session.Retry(total=3, backoff_factor=0, status_forcelist=(502, 503))
+        ))
+
+        response = self.session.get(self.url + '/retry')
+
+        self.assertEqual(response.text, 'Finally')
+        self.assertEqual(len(MockHandler.requests), 3)
+
+    def test_timeouts(self):
+        adapter = http_session.InstrumentedAdapter(
+            default_timeout=7, host_timeouts={'127.0.0.1': 2.5}
+        )
+
+        timeouts = list()
+
+        original_send = http_session.HTTPAdapter.send
+        http_session.HTTPAdapter.send = lambda _, request, **kwargs: timeouts.append(kwargs.get('timeout'))
+
+        try:
+            for url, timeout in ((self.url, None), ('http://localhost:1', None), ('http://localhost:1', 1)):
+                adapter.send(requests.Request('GET', url).prepare(), timeout=timeout)
+
+        finally:
+            http_session.HTTPAdapter.send = original_send
+
+        self.assertEqual(timeouts, [2.5, 7, 1])
+
+    def test_host_timeouts_configuration(self):
+        self.assertEqual(
+            http_session._parse_host_timeouts('api.ipify.org=2, slack.com = 10.5,invalid'),
+            {'api.ipify.org': 2.0, 'slack.com': 10.5}
+        )
+        self.assertEqual(http_session._parse_host_timeouts(None), dict())
+
+    def test_shared_session(self):
+        self.assertIs(http_session.get_session(), http_session.get_session())
+
+    def test_borrowed_session(self):
+        closed = list()
+
+        self.session.close = lambda: closed.append(True)
+
+        borrowed = http_session.BorrowedSession(self.session)
+
+        self.assertEqual(borrowed.get(self.url + '/borrowed').text, 'OK')
+
+        borrowed.close()
+        del borrowed
+
+        self.assertEqual(closed, [])
+        self.assertEqual(self.session.get(self.url + '/shared').text, 'OK')
+
+        del self.session.close
+
+        self.assertIsInstance(http_session.borrow_session(), http_session.BorrowedSession)
+
+    @staticmethod
+    def _observations(host):
+        for metric in http_request_duration.collect():
+            for sample in metric.samples:
+                if sample.name.endswith('_count') and sample.labels.get('host') == host:
+                    return sample.value
+
+        return 0
@@ -0,0 +1,220 @@
+import time
+import socket
+import struct
+import threading
+import unittest
+
+from ssl_manager import propagation
+
+
+def _encode_name(name):
+    return b''.join(
+        struct.pack('!B', len(label)) + label.encode('ascii') for label in name.split('.') if label
+    ) + b'\x00'
+
+
+class MockNameServer(object):
+    def __init__(self):
+        self.records = dict()
+        self.queries = list()
+        self.truncated = set()
+        self.silent = False
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.address = self.sock.getsockname()
+
+        self.tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp_sock.bind(self.address)
+        self.tcp_sock.listen(5)
+
+        for target in (self._serve, self._serve_tcp):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def add(self, name, record_type, value):
+        self.records.setdefault((name, record_type), list()).append(value)
+
+    def _serve(self):
+        while True:
+            try:
+                data, client = self.sock.recvfrom(2048)
+
+            except socket.error:
+                break
+
+            if not self.silent:
+                self.sock.sendto(self._respond(data, 'udp'), client)
+
+    def _serve_tcp(self):
+        while True:
+            try:
+                connection, _ = self.tcp_sock.accept()
+
+            except socket.error:
+                break
+
+            try:
+                length, = struct.unpack('!H', propagation._receive(connection, 2))
+                response = self._respond(propagation._receive(connection, length), 'tcp')
+
+                connection.sendall(struct.pack('!H', len(response)) + response)
+
+            finally:
+                connection.close()
+
+    def _respond(self, data, transport):
+        query_id, flags = struct.unpack('!HH', data[:4])
+        name, position = propagation.read_name(data, 12)
+        record_type, = struct.unpack('!H', data[position:position + 2])
+
+        self.queries.append((name, record_type, bool(flags & propagation.FLAG_RECURSION_DESIRED), transport))
+
+        if transport == 'udp' and name in self.truncated:
+            # no answers fit into the truncated response
+            values = None
+            flags = 0x8400 | propagation.FLAG_TRUNCATED
+
+        else:
+            values = self.records.get((name, record_type))
+            flags = 0x8400 | (0 if values else propagation.RCODE_NAME_ERROR)
+
+        answers = b''
+
+        for value in values or list():
+            if record_type == propagation.TYPE_A:
+                rdata = socket.inet_aton(value)
+
+            elif record_type == propagation.TYPE_NS:
+                rdata = _encode_name(value)
+
+            else:
+                # split into two character-strings to check they are joined
+                rdata = b''.join(struct.pack('!B', len(part)) + part.encode() for part in (value[:5], value[5:]))
+
+            # the answer name is a compression pointer to the question
+            answers += struct.pack('!HHHIH', 0xC00C, record_type, propagation.CLASS_IN, 60, len(rdata)) + rdata
+
+        return struct.pack(
+            '!HHHHHH', query_id, flags, 1, len(values or list()), 0, 0
+        ) + data[12:position + 4] + answers
+
+    def close(self):
+        self.sock.close()
+        self.tcp_sock.close()
+
+
+class PropagationCheckerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockNameServer()
+        self.addCleanup(self.server.close)
+
+        self.server.add('unit.test', propagation.TYPE_NS, 'ns1.unit.test')
+        self.server.add('unit.test', propagation.TYPE_NS, 'ns2.unit.test')
+        self.server.add('ns1.unit.test', propagation.TYPE_A, '127.0.0.1')
+        self.server.add('ns2.unit.test', propagation.TYPE_A, '127.0.0.1')
+
+        self.checker = propagation.PropagationChecker(
+            self.server.address, nameserver_port=self.server.address[1],
+            interval=0.05, client=propagation.DNSClient(timeout=0.5)
+        )
+
+    def test_query(self):
+        client = propagation.DNSClient(timeout=0.5)
+
+        self.assertEqual(
+            client.query(self.server.address, 'unit.test', propagation.TYPE_NS),
+            ['ns1.unit.test', 'ns2.unit.test']
+        )
+        self.assertEqual(client.query(self.server.address, 'missing.unit.test', propagation.TYPE_TXT), [])
+
+    def test_nameservers(self):
+        self.assertEqual(
+            self.checker.nameservers('unit.test'),
+            [('127.0.0.1', self.server.address[1])] * 2
+        )
+
+        self.checker.nameservers('unit.test')
+
+        self.assertEqual(len([q for q in self.server.queries if q[1] == propagation.TYPE_NS]), 1)
+
+    def test_visible_record(self):
+        self.server.add('_acme-challenge.www.unit.test', propagation.TYPE_TXT, 'validation-value')
+
+        self.assertTrue(self.checker.wait_for(
+            [('unit.test', '_acme-challenge.www.unit.test', 'validation-value')], timeout=1
+        ))
+
+        txt_queries = [q for q in self.server.queries if q[1] == propagation.TYPE_TXT]
+
+        self.assertEqual(len(txt_queries), 2)
+        self.assertFalse(any(recursive for _, _, recursive, _ in txt_queries))
+
+    def test_waits_for_propagation(self):
+        publisher = threading.Timer(
+            0.2, self.server.add, args=('_acme-challenge.late.unit.test', propagation.TYPE_TXT, 'late-value')
+        )
+        publisher.start()
+        self.addCleanup(publisher.cancel)
+
+        started = time.time()
+
+        self.assertTrue(self.checker.wait_for(
+            [('unit.test', '_acme-challenge.late.unit.test', 'late-value')], timeout=5
+        ))
+
+        self.assertGreaterEqual(time.time() - started, 0.2)
+        self.assertLess(time.time() - started, 2)
+
+    def test_timeout(self):
+        self.server.add('_acme-challenge.stale.unit.test', propagation.TYPE_TXT, 'old-value')
+
+        started = time.time()
+
+        self.assertFalse(self.checker.wait_for(
+            [('unit.test', '_acme-challenge.stale.unit.test', 'new-value')], timeout=0.3
+        ))
+
+        self.assertLess(time.time() - started, 1)
+
+    def test_truncated_response(self):
+        self.server.add('_acme-challenge.large.unit.test', propagation.TYPE_TXT, 'large-value')
+        self.server.truncated.add('_acme-challenge.large.unit.test')
+
+        self.assertTrue(self.checker.wait_for(
+            [('unit.test', '_acme-challenge.large.unit.test', 'large-value')], timeout=1
+        ))
+
+        transports = [q[3] for q in self.server.queries if q[0] == '_acme-challenge.large.unit.test']
+
+        self.assertEqual(transports, ['udp', 'tcp', 'udp', 'tcp'])
+
+    def test_queries_are_limited_by_the_timeout(self):
+        self.checker.nameservers('unit.test')
+
+        self.server.silent = True
+        self.checker.client.timeout = 5
+
+        started = time.time()
+
+        self.assertFalse(self.checker.wait_for(
+            [('unit.test', '_acme-challenge.slow.unit.test', 'value')], timeout=0.3
+        ))
+
+        self.assertLess(time.time() - started, 0.6)
+
+    def test_unknown_zone(self):
+        self.assertFalse(self.checker.is_visible('other.test', '_acme-challenge.other.test', 'value'))
+
+    def test_compressed_names(self):
+        data = b'\x00' * 12 + _encode_name('unit.test') + b'\x03www\xc0\x0c'
+
+        self.assertEqual(propagation.read_name(data, 12), ('unit.test', 23))
+        self.assertEqual(propagation.read_name(data, 23), ('www.unit.test', 29))
+
+    def test_compression_loop(self):
+        data = b'\x00' * 12 + b'\xc0\x0c'
+
+        self.assertRaises(propagation.DNSError, propagation.read_name, data, 12)
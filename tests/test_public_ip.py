@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+
+import factories
+import http_session
+
+from state.memory import MemoryStateStore
+from public_ip import http_lookup, interface, local_source, stun, is_ipv4_address, StalePublicIPError
+
+
+class MockResponse(object):
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+class MockRequests(object):
+    def __init__(self):
+        self.answers = dict()
+        self.calls = list()
+
+    def get(self, url, timeout=None):
+        self.calls.append((url, timeout))
+
+        delay, status, text = self.answers[url]
+
+        time.sleep(delay)
+
+        if isinstance(text, Exception):
+            raise text
+
+        return MockResponse(status, text)
+
+
+class HttpPublicIPResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.original_get_session = http_session.get_session
+        self.requests = MockRequests()
+        http_session.get_session = lambda: self.requests
+
+        self.original_get_state_store = factories.get_state_store
+        self.store = MemoryStateStore()
+        factories.get_state_store = lambda: self.store
+
+    def tearDown(self):
+        http_session.get_session = self.original_get_session
+        factories.get_state_store = self.original_get_state_store
+
+        for key in ('PUBLIC_IP_PROVIDERS', 'PUBLIC_IP_QUORUM', 'PUBLIC_IP_TIMEOUT', 'PUBLIC_IP_CACHE_SECONDS',
+                    'PUBLIC_IP_MAX_STALE_SECONDS'):
+            os.environ.pop(key, None)
+
+    def _resolver(self, providers, quorum=1, timeout=1, freshness=0):
+        os.environ['PUBLIC_IP_PROVIDERS'] = ','.join(providers)
+        os.environ['PUBLIC_IP_QUORUM'] = str(quorum)
+        os.environ['PUBLIC_IP_TIMEOUT'] = str(timeout)
+        os.environ['PUBLIC_IP_CACHE_SECONDS'] = str(freshness)
+
+        return http_lookup.HttpPublicIPResolver()
+
+    def test_default_provider(self):
+        resolver = http_lookup.HttpPublicIPResolver()
+
+        self.assertEqual(resolver.providers, ['https://api.ipify.org'])
+        self.assertEqual(resolver.quorum, 1)
+
+    def test_single_provider(self):
+        self.requests.answers['http://first'] = (0, 200, ' 5.6.7.8\n')
+
+        resolver = self._resolver(['http://first'])
+
+        self.assertEqual(resolver.get_public_ip(), '5.6.7.8')
+        self.assertEqual(self.requests.calls, [('http://first', 1.0)])
+
+    def test_first_answer_wins(self):
+        self.requests.answers['http://slow'] = (0.5, 200, '1.1.1.1')
+        self.requests.answers['http://fast'] = (0, 200, '2.2.2.2')
+
+        resolver = self._resolver(['http://slow', 'http://fast'])
+
+        started = time.time()
+
+        self.assertEqual(resolver.get_public_ip(), '2.2.2.2')
+        self.assertLess(time.time() - started, 0.4)
+
+    def test_quorum(self):
+        self.requests.answers['http://first'] = (0, 200, '1.1.1.1')
+        self.requests.answers['http://second'] = (0.05, 200, '2.2.2.2')
+        self.requests.answers['http://third'] = (0.1, 200, '2.2.2.2')
+
+        resolver = self._resolver(['http://first', 'http://second', 'http://third'], quorum=2)
+
+        self.assertEqual(resolver.get_public_ip(), '2.2.2.2')
+
+    def test_no_quorum(self):
+        self.requests.answers['http://first'] = (0, 200, '1.1.1.1')
+        self.requests.answers['http://second'] = (0, 500, 'error')
+        self.requests.answers['http://third'] = (0, 200, '<html>not an address</html>')
+
+        resolver = self._resolver(['http://first', 'http://second', 'http://third'], quorum=2)
+
+        self.assertIsNone(resolver.get_public_ip())
+
+    def test_timeout(self):
+        self.requests.answers['http://hanging'] = (1, 200, '1.1.1.1')
+        self.requests.answers['http://failing'] = (0, 200, Exception('oops'))
+
+        resolver = self._resolver(['http://hanging', 'http://failing'], timeout=0.1)
+
+        started = time.time()
+
+        self.assertIsNone(resolver.get_public_ip())
+        self.assertLess(time.time() - started, 0.5)
+
+    def test_freshness_window(self):
+        self.requests.answers['http://first'] = (0, 200, '1.1.1.1')
+
+        resolver = self._resolver(['http://first'], freshness=60)
+
+        self.assertEqual(resolver.get_public_ip(), '1.1.1.1')
+
+        self.requests.answers['http://first'] = (0, 200, '2.2.2.2')
+
+        self.assertEqual(resolver.get_public_ip(), '1.1.1.1')
+        self.assertEqual(len(self.requests.calls), 1)
+
+        resolver.freshness = 0
+
+        self.assertEqual(resolver.get_public_ip(), '2.2.2.2')
+        self.assertEqual(len(self.requests.calls), 2)
+
+    def test_state_survives_restarts(self):
+        self.requests.answers['http://first'] = (0, 200, '1.1.1.1')
+
+        self.assertEqual(self._resolver(['http://first'], freshness=60).get_public_ip(), '1.1.1.1')
+
+        self.requests.answers['http://first'] = (0, 503, 'unavailable')
+
+        restarted = self._resolver(['http://first'], freshness=60)
+
+        self.assertEqual(restarted.get_public_ip(), '1.1.1.1')
+        self.assertEqual(len(self.requests.calls), 1)
+
+        restarted.freshness = 0
+
+        self.assertEqual(restarted.get_public_ip(), '1.1.1.1')
+        self.assertEqual(len(self.requests.calls), 2)
+
+    def test_last_known_address_on_failure(self):
+        self.requests.answers['http://first'] = (0, 200, '1.1.1.1')
+
+        resolver = self._resolver(['http://first'])
+
+        self.assertEqual(resolver.get_public_ip(), '1.1.1.1')
+
+        self.requests.answers['http://first'] = (0, 503, 'unavailable')
+
+        self.assertEqual(resolver.get_public_ip(), '1.1.1.1')
+
+    def test_stale_address_on_failure(self):
+        self.store.put('public_ip', 'HttpPublicIPResolver', ['1.1.1.1', time.time() - 7200])
+        self.requests.answers['http://first'] = (0, 503, 'unavailable')
+
+        resolver = self._resolver(['http://first'])
+
+        self.assertRaises(StalePublicIPError, resolver.get_public_ip)
+
+        resolver.max_stale = 86400
+
+        self.assertEqual(resolver.get_public_ip(), '1.1.1.1')
+
+    def test_address_validation(self):
+        self.assertTrue(is_ipv4_address('1.2.3.4'))
+        self.assertFalse(is_ipv4_address('1.2.3'))
+        self.assertFalse(is_ipv4_address('1.2.3.456'))
+        self.assertFalse(is_ipv4_address('::1'))
+        self.assertFalse(is_ipv4_address(None))
+
+
+class MockStunServer(object):
+    def __init__(self, address, xor_mapped=True):
+        self.address = address
+        self.xor_mapped = xor_mapped
+        self.requests = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, client = self.sock.recvfrom(2048)
+
+            except socket.error:
+                break
+
+            self.requests += 1
+
+            transaction_id = data[8:20]
+            packed_address, = struct.unpack('!I', socket.inet_aton(self.address))
+
+            if self.xor_mapped:
+                attribute_type, packed_address = stun.ATTR_XOR_MAPPED_ADDRESS, packed_address ^ stun.MAGIC_COOKIE
+            else:
+                attribute_type = stun.ATTR_MAPPED_ADDRESS
+
+            # an unknown, padded attribute first, then the address
+            attributes = struct.pack('!HH', 0x8022, 5) + b'tests\x00\x00\x00'
+            attributes += struct.pack('!HHxBHI', attribute_type, 8, stun.FAMILY_IPV4, 4321, packed_address)
+
+            response = struct.pack(
+                '!HHI', stun.BINDING_RESPONSE, len(attributes), stun.MAGIC_COOKIE
+            ) + transaction_id + attributes
+
+            self.sock.sendto(response, client)
+
+    def close(self):
+        self.sock.close()
+
+
+class LocalPublicIPResolversTest(unittest.TestCase):
+    def setUp(self):
+        self.original_get_state_store = factories.get_state_store
+        factories.get_state_store = lambda: MemoryStateStore()
+
+    def tearDown(self):
+        factories.get_state_store = self.original_get_state_store
+
+        for key in ('PUBLIC_IP_STUN_SERVER', 'PUBLIC_IP_FILE', 'PUBLIC_IP_COMMAND',
+                    'PUBLIC_IP_INTERFACE', 'PUBLIC_IP_TIMEOUT'):
+            os.environ.pop(key, None)
+
+    def test_stun(self):
+        server = MockStunServer('9.8.7.6')
+        self.addCleanup(server.close)
+
+        os.environ['PUBLIC_IP_STUN_SERVER'] = '127.0.0.1:%d' % server.port
+
+        resolver = stun.StunPublicIPResolver()
+
+        self.assertEqual(resolver.server, ('127.0.0.1', server.port))
+        self.assertEqual(resolver.get_public_ip(), '9.8.7.6')
+        self.assertEqual(server.requests, 1)
+
+    def test_stun_mapped_address(self):
+        server = MockStunServer('5.4.3.2', xor_mapped=False)
+        self.addCleanup(server.close)
+
+        os.environ['PUBLIC_IP_STUN_SERVER'] = '127.0.0.1:%d' % server.port
+
+        self.assertEqual(stun.StunPublicIPResolver().get_public_ip(), '5.4.3.2')
+
+    def test_stun_timeout(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        self.addCleanup(sock.close)
+
+        os.environ['PUBLIC_IP_STUN_SERVER'] = '127.0.0.1:%d' % sock.getsockname()[1]
+        os.environ['PUBLIC_IP_TIMEOUT'] = '0.1'
+
+        self.assertIsNone(stun.StunPublicIPResolver().get_public_ip())
+
+    def test_stun_default_port(self):
+        os.environ['PUBLIC_IP_STUN_SERVER'] = 'stun.example.com'
+
+        self.assertEqual(stun.StunPublicIPResolver().server, ('stun.example.com', 3478))
+
+    def test_file(self):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.ip', delete=False) as target:
+            target.write('\n  4.3.2.1 \n')
+
+        self.addCleanup(os.remove, target.name)
+
+        os.environ['PUBLIC_IP_FILE'] = target.name
+
+        self.assertEqual(local_source.FilePublicIPResolver().get_public_ip(), '4.3.2.1')
+
+    def test_missing_file(self):
+        os.environ['PUBLIC_IP_FILE'] = '/not/existing/public-ip'
+
+        self.assertIsNone(local_source.FilePublicIPResolver().get_public_ip())
+
+    def test_command(self):
+        os.environ['PUBLIC_IP_COMMAND'] = '%s -c "print(\'inet 6.5.4.3/24\')"' % sys.executable
+
+        self.assertEqual(local_source.CommandPublicIPResolver().get_public_ip(), '6.5.4.3')
+
+    def test_failing_command(self):
+        os.environ['PUBLIC_IP_COMMAND'] = '%s -c "exit(1)"' % sys.executable
+
+        self.assertIsNone(local_source.CommandPublicIPResolver().get_public_ip())
+
+    @unittest.skipUnless(interface.fcntl and sys.platform.startswith('linux'), 'Linux only')
+    def test_interface(self):
+        os.environ['PUBLIC_IP_INTERFACE'] = 'lo'
+
+        self.assertEqual(interface.InterfacePublicIPResolver().get_public_ip(), '127.0.0.1')
+
+    @unittest.skipUnless(interface.fcntl and sys.platform.startswith('linux'), 'Linux only')
+    def test_missing_interface(self):
+        os.environ['PUBLIC_IP_INTERFACE'] = 'missing0'
+
+        self.assertIsNone(interface.InterfacePublicIPResolver().get_public_ip())
@@ -2,7 +2,7 @@ import os
 import time
 import unittest
 
-from scheduler.repeat import RepeatingScheduler
+from scheduler.repeat import RepeatingScheduler, IntervalScheduler
 
 
 class MockScheduler(RepeatingScheduler):
@@ -22,6 +22,8 @@ class RepeatingSchedulerTest(unittest.TestCase):
 
     def tearDown(self):
         os.environ.pop('IMMEDIATE_START', None)
+        os.environ.pop('SCHEDULER_INTERVAL', None)
+        os.environ.pop('SCHEDULER_JITTER', None)
         self.scheduler.cancel()
 
     def _invoke(self):
@@ -102,3 +104,53 @@ class RepeatingSchedulerTest(unittest.TestCase):
         self.scheduler.run_now()
 
         self.assertEqual(self.invocations, 1)
+
+    def test_run_partial(self):
+        calls = list()
+
+        self.scheduler.time = 0.2
+        self.scheduler.schedule(lambda *args, **kwargs: calls.append((args, kwargs)), 'job', subdomains=None)
+
+        timer = self.scheduler.timer
+
+        self.scheduler.run_partial(subdomains=['www'])
+
+        self.assertEqual(calls, [(('job',), {'subdomains': ['www']})])
+        self.assertIs(self.scheduler.timer, timer)
+
+        time.sleep(0.3)
+
+        self.assertEqual(calls[1], (('job',), {'subdomains': None}))
+
+    def test_interval_scheduler(self):
+        os.environ['SCHEDULER_INTERVAL'] = '0.05'
+
+        self.scheduler = IntervalScheduler()
+
+        self.assertEqual(self.scheduler.interval, 0.05)
+
+        self.scheduler.schedule(self._invoke)
+
+        time.sleep(0.18)
+
+        self.scheduler.cancel()
+
+        self.assertAlmostEqual(self.invocations, 3, delta=1)
+
+    def test_jitter(self):
+        os.environ['SCHEDULER_JITTER'] = '30'
+
+        self.scheduler = MockScheduler()
+        self.scheduler.time = 60
+
+        delays = set(self.scheduler._next_delay() for _ in range(20))
+
+        self.assertGreater(len(delays), 1)
+
+        for delay in delays:
+            self.assertGreaterEqual(delay, 60)
+            self.assertLessEqual(delay, 90)
+
+        self.scheduler.jitter = 0
+
+        self.assertEqual(self.scheduler._next_delay(), 60)
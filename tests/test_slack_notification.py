@@ -1,7 +1,9 @@
 import unittest
 
+from datetime import datetime
+
 from config import Subdomain
-from ssl_manager import SSLManager
+from ssl_manager import SSLManager, SSLResult
 from notifications import slack_message
 
 
@@ -61,6 +63,74 @@ class MockTimer(object):
         self.function(*self.args, **self.kwargs)
 
 
+class MockSession(object):
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or dict()
+        self.calls = list()
+
+    def post(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+
+        _self = self
+
+        class MockResponse(object):
+            status_code = _self.status_code
+            headers = _self.headers
+            text = str(_self.body)
+
+            def json(self):
+                if isinstance(_self.body, dict):
+                    return dict(_self.body)
+
+                raise ValueError('not JSON')
+
+        return MockResponse()
+
+
+class SlackClientTest(unittest.TestCase):
+    def setUp(self):
+        self.original_get_session = slack_message.http_session.get_session
+
+    def tearDown(self):
+        slack_message.http_session.get_session = self.original_get_session
+
+    def test_post_message(self):
+        session = MockSession(200, {'ok': True}, {'X-Test': 'yes'})
+        slack_message.http_session.get_session = lambda: session
+
+        client = slack_message.SlackClient('xoxb-test')
+        response = client.chat_postMessage(channel='unittest', text='Hello')
+
+        self.assertTrue(response['ok'])
+        self.assertEqual(response['headers'], {'X-Test': 'yes'})
+
+        url, kwargs = session.calls[0]
+
+        self.assertEqual(url, 'https://slack.com/api/chat.postMessage')
+        self.assertEqual(kwargs['json'], {'channel': 'unittest', 'text': 'Hello'})
+        self.assertEqual(kwargs['headers'], {'Authorization': 'Bearer xoxb-test'})
+
+    def test_rate_limited(self):
+        session = MockSession(429, {'ok': False, 'error': 'ratelimited'}, {'Retry-After': '3'})
+        slack_message.http_session.get_session = lambda: session
+
+        response = slack_message.SlackClient('xoxb-test').chat_postMessage(text='Hello')
+
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['headers']['Retry-After'], '3')
+
+    def test_invalid_response(self):
+        session = MockSession(502, 'Bad gateway')
+        slack_message.http_session.get_session = lambda: session
+
+        response = slack_message.SlackClient('xoxb-test').chat_postMessage(text='Hello')
+
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['error'], 'Bad gateway')
+
+
 class SlackNotificationTest(unittest.TestCase):
     def setUp(self):
         self.original_timer = slack_message.threading.Timer
@@ -130,6 +200,17 @@ class SlackNotificationTest(unittest.TestCase):
             'INFO:slack-notification:Slack message sent: %s' % message
         )
 
+    def test_ssl_update_with_expiry(self):
+        self.manager.ssl_updated(
+            Subdomain('expiry', 'update.test'),
+            SSLResult('OK, renewed', status=SSLResult.RENEWED, expiry=datetime(2027, 1, 15))
+        )
+
+        self.assertEqual(
+            self.client.last_call['text'],
+            '`[SSL update]` *expiry.update.test* : OK, renewed (expires on 2027-01-15)'
+        )
+
     def test_skip_ssl_notification(self):
         self.manager.ssl_updated(
             Subdomain('skip', 'cert.renewal'),
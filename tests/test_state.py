@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from state import StateMapping
+from state.memory import MemoryStateStore
+from state.sqlite_store import SqliteStateStore
+
+
+class StateStoreTests(object):
+    def create_store(self):
+        raise NotImplementedError()
+
+    def test_get_and_put(self):
+        store = self.create_store()
+
+        self.assertIsNone(store.get('ns', 'key'))
+        self.assertEqual(store.get('ns', 'key', 'default'), 'default')
+
+        store.put('ns', 'key', {'content': '1.2.3.4', 'ttl': [1, 2]})
+        store.put('other', 'key', 'other')
+
+        self.assertEqual(store.get('ns', 'key'), {'content': '1.2.3.4', 'ttl': [1, 2]})
+        self.assertEqual(store.items('ns'), [('key', {'content': '1.2.3.4', 'ttl': [1, 2]})])
+
+        store.put('ns', 'key', 'replaced')
+
+        self.assertEqual(store.get('ns', 'key'), 'replaced')
+
+        store.delete('ns', 'key')
+        store.delete('ns', 'missing')
+
+        self.assertIsNone(store.get('ns', 'key'))
+        self.assertEqual(store.get('other', 'key'), 'other')
+
+    def test_clear(self):
+        store = self.create_store()
+
+        store.put('ns', 'a', 1)
+        store.put('ns', 'b', 2)
+        store.put('other', 'c', 3)
+
+        store.clear('ns')
+
+        self.assertEqual(store.items('ns'), [])
+        self.assertEqual(store.items('other'), [('c', 3)])
+
+    def test_mapping(self):
+        store = self.create_store()
+
+        mapping = StateMapping(
+            store, 'times',
+            encode=lambda value: value.isoformat(),
+            decode=lambda value: datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+        )
+
+        mapping['first'] = datetime(2018, 1, 2, 3, 4, 5)
+        mapping['second'] = datetime(2018, 2, 3, 4, 5, 6)
+
+        del mapping['second']
+
+        loaded = StateMapping(mapping.store, 'times', decode=mapping._decode)
+
+        self.assertEqual(dict(loaded), {'first': datetime(2018, 1, 2, 3, 4, 5)})
+        self.assertEqual(store.get('times', 'first'), '2018-01-02T03:04:05')
+
+
+class MemoryStateStoreTest(StateStoreTests, unittest.TestCase):
+    def create_store(self):
+        return MemoryStateStore()
+
+
+class SqliteStateStoreTest(StateStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.environ['STATE_DATABASE'] = os.path.join(self.directory, 'nested', 'state.db')
+
+    def tearDown(self):
+        os.environ.pop('STATE_DATABASE')
+        shutil.rmtree(self.directory)
+
+    def create_store(self):
+        store = SqliteStateStore()
+        self.addCleanup(store.close)
+        return store
+
+    def test_persistence(self):
+        store = self.create_store()
+        store.put('ns', 'key', ['1.2.3.4', 1000.5])
+
+        self.assertEqual(self.create_store().get('ns', 'key'), ['1.2.3.4', 1000.5])